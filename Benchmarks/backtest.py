@@ -0,0 +1,68 @@
+"""
+Benchmark for the walk-forward backtester
+Backtests noisy synthetic predictions over a year of 5-minute bars for a grid of parameter sets, and checks the
+vectorized simulation against a straightforward per-bar loop.
+Run from the repository root: python -m Benchmarks.backtest --workers 4
+"""
+import argparse
+import time
+import numpy as np
+
+from Classifier.backtest import parameter_grid, simulate, walk_forward
+
+
+def loop_simulate(predictions, prices, params):
+    """
+    Per-bar reference implementation of simulate for a single parameter set
+    """
+    position, equity, peak = 0.0, 1.0, 1.0
+    returns, drawdown = [], []
+    for i in range(len(prices) - 1):
+        new_position = 0.0
+        if predictions[i] > params['threshold']:
+            new_position = params['leverage']
+        elif predictions[i] < -params['threshold'] and params['allow_short']:
+            new_position = -params['leverage']
+        bar_return = new_position * (prices[i + 1] / prices[i] - 1) - abs(new_position - position) * params['fee']
+        position = new_position
+        equity *= 1 + bar_return
+        peak = max(peak, equity)
+        returns.append(bar_return)
+        drawdown.append(equity / peak - 1)
+    return np.array(returns), np.array(drawdown)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--bars', type=int, default=365 * 24 * 12, help='number of 5-minute bars')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: one per CPU)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(args.seed)
+    market = rng.normal(0, 0.002, args.bars)
+    prices = 1000 * np.cumprod(1 + market)
+    predictions = np.append(market[1:], 0) * 0.1 + rng.normal(0, 0.002, args.bars) # Weakly informative forecasts
+
+    params = parameter_grid(threshold=np.linspace(0, 0.004, 20), allow_short=[True, False], fee=[0.0, 0.001, 0.0026],
+                            leverage=[0.5, 1.0])
+
+    check = params[7]
+    start = time.time()
+    loop_returns, loop_drawdown = loop_simulate(predictions, prices, check)
+    loop_time = time.time() - start
+    start = time.time()
+    result = simulate(predictions, prices, [check])
+    vector_time = time.time() - start
+    assert np.allclose(result['returns'][0], loop_returns) and np.allclose(result['drawdown'][0], loop_drawdown)
+    print("one parameter set: loop {:.3f}s, vectorized {:.4f}s ({:.0f}x)".format(loop_time, vector_time, loop_time / vector_time))
+
+    month = 30 * 24 * 12
+    stats, selected, returns = walk_forward(predictions, prices, params, train_size=3 * month, test_size=month,
+                                            max_workers=args.workers)
+    print(selected[['fold', 'threshold', 'allow_short', 'fee', 'leverage', 'total_return', 'sharpe', 'max_drawdown']].to_string())
+    print("out of sample: {} bars, total return {:.2%}".format(len(returns), np.prod(1 + returns) - 1))
+
+
+if __name__ == '__main__':
+    main()
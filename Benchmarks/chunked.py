@@ -0,0 +1,59 @@
+"""
+Benchmark for the chunked dataset pipeline
+Builds a dataset from synthetic 1-minute candles for 8 pairs with processor.save_dataset on the whole range and with
+chunked.build_dataset block by block, and reports the time and peak traced memory of each. Checks that both datasets
+are the same: exactly without indicators, and to within float32 rounding (relative 1e-6) with them, see build_dataset.
+Run from the repository root: python -m Benchmarks.chunked --days 180 --block-days 7
+"""
+import argparse
+import os
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+
+from Benchmarks.synthetic import PAIRS, measure, synthetic_candles
+from Classifier.chunked import build_dataset
+from Classifier.data_processing import processor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--days', type=int, default=180)
+    parser.add_argument('--block-days', type=int, default=7)
+    parser.add_argument('--indicators', action='store_true')
+    args = parser.parse_args()
+
+    start_time = datetime(2017, 1, 1)
+    end_time = start_time + timedelta(days=args.days)
+    candles = synthetic_candles(args.days * 24 * 60, PAIRS, interval=1, start_time=start_time)
+    times = pd.to_datetime(candles[PAIRS[0]].index.values, unit='s')
+    columns = ['{}_{}'.format(pair, field) for pair in PAIRS for field in ('low', 'high', 'open', 'close', 'vol')]
+    history = pd.DataFrame(np.hstack([candles[pair].values for pair in PAIRS]), index=times, columns=columns)
+    del candles
+
+    def download(start, end, interval, **options):
+        # Stands in for historical_download, returning a copy of the candles strictly between start and end
+        first, last = history.index.searchsorted([start, end], side='right')[0], history.index.searchsorted(end)
+        return history.iloc[first:last].copy()
+
+    directory = tempfile.mkdtemp()
+    try:
+        whole, seconds, peak = measure(lambda: processor.save_dataset(
+            os.path.join(directory, 'whole'), download(start_time, end_time, 1), 1, indicators=args.indicators))
+        print("whole range: {} rows in {:.2f}s, peak {:.0f}MB".format(len(whole), seconds, peak))
+        chunked, seconds, peak = measure(lambda: build_dataset(
+            os.path.join(directory, 'chunked'), start_time, end_time, 1, block=timedelta(days=args.block_days),
+            indicators=args.indicators, download=download))
+        print("{} day blocks: {} rows in {:.2f}s, peak {:.0f}MB".format(args.block_days, len(chunked), seconds, peak))
+        assert np.array_equal(whole.times, chunked.times) and np.array_equal(whole.targets, chunked.targets)
+        print("max feature difference: {:.2e}".format(np.nanmax(np.abs(whole.data - chunked.data))))
+        rtol = 1e-6 if args.indicators else 0
+        assert np.allclose(chunked.data, whole.data, rtol=rtol, atol=0, equal_nan=True), "features differ by more than rtol={}".format(rtol)
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""
+Benchmark for the memory-mapped training dataset
+Compares loading a pickled float64 (data, targets) tuple, as train_script.py used to, against opening a float32
+dataset and reading one epoch of batches from it in chunks. Reports load time and peak traced memory.
+Run from the repository root: python -m Benchmarks.dataset --rows 2000000
+"""
+import argparse
+import os
+import pickle
+import shutil
+import tempfile
+import numpy as np
+
+from Benchmarks.synthetic import measure
+from Classifier.dataset import Dataset, DatasetWriter
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=2000000)
+    parser.add_argument('--features', type=int, default=40)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        rng = np.random.RandomState(0)
+        data = rng.normal(0, 0.01, (args.rows, args.features))
+        targets = data[:, 3].copy()
+        with open(os.path.join(directory, 'training.pickle'), 'wb') as f:
+            pickle.dump((data, targets), f, protocol=pickle.HIGHEST_PROTOCOL)
+        with DatasetWriter(os.path.join(directory, 'train'), ['f{}'.format(i) for i in range(args.features)], 5) as writer:
+            for start in range(0, args.rows, 500000):
+                writer.append(data[start:start + 500000], targets[start:start + 500000])
+        assert np.allclose(Dataset(os.path.join(directory, 'train')).scaler.mean, data.mean(axis=0), atol=1e-6)
+        del data, targets
+
+        def load_pickle():
+            with open(os.path.join(directory, 'training.pickle'), 'rb') as f:
+                return pickle.load(f)
+        _, seconds, peak = measure(load_pickle)
+        print("pickle load: {:.3f}s, peak {:.0f}MB".format(seconds, peak))
+
+        dataset, seconds, peak = measure(lambda: Dataset(os.path.join(directory, 'train')))
+        print("dataset open: {:.4f}s, peak {:.2f}MB".format(seconds, peak))
+
+        def epoch():
+            batches = dataset.batch_generator(batch_size=256)
+            for _ in range(dataset.steps(batch_size=256)):
+                next(batches)
+        _, seconds, peak = measure(epoch)
+        print("dataset epoch of batches: {:.3f}s, peak {:.0f}MB".format(seconds, peak))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
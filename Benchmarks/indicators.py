@@ -0,0 +1,94 @@
+"""
+Validation and benchmark for Classifier.indicators
+Checks the vectorized indicators against pandas reference implementations and the incremental IndicatorState against
+the vectorized values, then times compute() on a large synthetic candle array.
+Run from the repository root: python -m Benchmarks.indicators --rows 10000000
+"""
+import argparse
+import time
+import numpy as np
+import pandas as pd
+
+from Benchmarks.synthetic import synthetic_candles
+from Classifier import indicators
+
+
+def reference(low, high, close, settings=indicators.DEFAULT_SETTINGS):
+    """
+    Indicators for a single pair computed with pandas, in the scaling of indicators.compute
+    """
+    low, high, close = pd.Series(low), pd.Series(high), pd.Series(close)
+    fast, slow, signal = settings['macd']
+    period, deviations = settings['bollinger']
+    line = close.ewm(span=fast, adjust=False).mean() - close.ewm(span=slow, adjust=False).mean()
+    signal_line = line.ewm(span=signal, adjust=False).mean()
+
+    change = close.diff()
+    gains = change.clip(lower=0).ewm(alpha=1.0 / settings['rsi'], adjust=False).mean()
+    losses = (-change).clip(lower=0).ewm(alpha=1.0 / settings['rsi'], adjust=False).mean()
+    previous = close.shift(1)
+    ranges = pd.concat([high - low, (high - previous).abs(), (low - previous).abs()], axis=1).max(axis=1)
+    rolling = close.rolling(period)
+
+    return {
+        'ema': close / close.ewm(span=settings['ema'], adjust=False).mean() - 1,
+        'macd': line / close,
+        'macd_signal': signal_line / close,
+        'macd_hist': (line - signal_line) / close,
+        'rsi': (1 - 1 / (1 + gains / losses)),
+        'atr': ranges.ewm(alpha=1.0 / settings['atr'], adjust=False).mean() / close,
+        'bb_width': 2 * deviations * rolling.std(ddof=0) / rolling.mean(),
+        'spread': (high - low) / close,
+    }
+
+
+def validate(rows=5000, pairs=4):
+    candles = synthetic_candles(rows, ['pair{}'.format(i) for i in range(pairs)])
+    low, high, close = (np.column_stack([frame[field].values for frame in candles.values()]) for field in ('low', 'high', 'close'))
+    batch = indicators.compute(low, high, close)
+
+    for pair in range(pairs):
+        expected = reference(low[:, pair], high[:, pair], close[:, pair])
+        for name in indicators.INDICATORS:
+            assert np.allclose(batch[name][:, pair], expected[name].values, equal_nan=True, rtol=1e-7, atol=1e-10), name
+
+    state = indicators.IndicatorState(pairs)
+    incremental = state.seed(low, high, close)
+    for i, name in enumerate(indicators.INDICATORS):
+        assert np.allclose(incremental[:, i], batch[name], equal_nan=True, rtol=1e-7, atol=1e-10), name
+    print("validated {} indicators on {} rows x {} pairs against pandas and the incremental state".format(len(indicators.INDICATORS), rows, pairs))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=10000000, help='candles to benchmark')
+    parser.add_argument('--pairs', type=int, default=1, help='pairs (columns) to benchmark')
+    args = parser.parse_args()
+
+    validate()
+
+    rng = np.random.RandomState(0)
+    close = 1000 * np.cumprod(1 + rng.normal(0, 0.002, (args.rows, args.pairs)), axis=0)
+    spread = np.abs(rng.normal(0, 0.002, close.shape)) * close
+    low, high = close - spread, close + spread
+
+    start = time.time()
+    indicators.compute(low, high, close)
+    elapsed = time.time() - start
+    print("compute: {} rows x {} pairs in {:.2f}s ({:.1f}M candles/s)".format(args.rows, args.pairs, elapsed, args.rows * args.pairs / elapsed / 1e6))
+
+    if args.pairs == 1:
+        start = time.time()
+        reference(low[:, 0], high[:, 0], close[:, 0])
+        print("pandas reference: {:.2f}s".format(time.time() - start))
+
+    state = indicators.IndicatorState(args.pairs)
+    updates = min(args.rows, 100000)
+    start = time.time()
+    for row in range(updates):
+        state.update(low[row], high[row], close[row])
+    print("incremental update: {:.1f}us per candle".format((time.time() - start) / updates * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""
+Replay harness for the live prediction loop
+Feeds recorded (or synthetic) candles for every pair through a local stub feed and reports latency from candle arrival to
+prediction. Target is under 100ms per tick.
+Run from the repository root: python -m Benchmarks.live_replay --ticks 2000
+"""
+import argparse
+import json
+import numpy as np
+
+from Benchmarks.synthetic import PAIRS, synthetic_candles
+from Classifier.live import LiveFeatures, LivePredictor, ReplayFeed
+
+
+class StubModel:
+    """
+    Stand-in for the Keras model with a comparable amount of arithmetic, so the harness runs without TensorFlow
+    """
+    def __init__(self, lookback, features, seed=0):
+        rng = np.random.RandomState(seed)
+        self.w1 = rng.normal(size=(lookback * features, 64))
+        self.w2 = rng.normal(size=(64, 1))
+
+    def predict(self, x):
+        hidden = np.maximum(x.reshape(len(x), -1).dot(self.w1), 0)
+        return hidden.dot(self.w2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--ticks', type=int, default=2000, help='number of intervals to replay')
+    parser.add_argument('--lookback', type=int, default=5, help='intervals per model input')
+    parser.add_argument('--weights', help='optional Keras weights file for the LSTM, instead of the stub model')
+    args = parser.parse_args()
+
+    candles = synthetic_candles(args.ticks + args.lookback + 1, PAIRS)
+    seed = {pair: frame.iloc[:args.lookback + 1] for pair, frame in candles.items()}
+    replay = {pair: frame.iloc[args.lookback + 1:] for pair, frame in candles.items()}
+
+    if args.weights:
+        from Classifier.prediction_model import Neural_Net
+        network = Neural_Net(len(PAIRS) * 5, 'LSTM', timesteps=args.lookback)
+        network.model.load_weights(args.weights)
+        model = network.model
+    else:
+        model = StubModel(args.lookback, len(PAIRS) * 5)
+
+    features = LiveFeatures(PAIRS, args.lookback)
+    features.seed(seed)
+    predictor = LivePredictor(model, features)
+    predictor.run(ReplayFeed(replay))
+    print(json.dumps(predictor.latency_report(), indent=2))
+
+
+if __name__ == '__main__':
+    main()
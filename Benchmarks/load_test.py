@@ -0,0 +1,134 @@
+"""
+Load test for the model server
+Sends prediction requests from concurrent clients, each over its own keep-alive connection, for a fixed duration and
+reports p50 / p99 latency and throughput. Without --url a server is started in a child process with random LSTM and
+DNN models (see Benchmarks.numpy_runtime), run once with micro-batching and once scoring each request on its own.
+Run from the repository root: python -m Benchmarks.load_test --clients 16 --seconds 5
+"""
+import argparse
+import http.client
+import io
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+from urllib.parse import urlparse
+import numpy as np
+
+from Benchmarks.numpy_runtime import random_model
+from Classifier.model_server import NPY_TYPE, ModelRegistry, ModelServer
+from Classifier.numpy_runtime import save
+
+FEATURES = 40 # 8 pairs x 5 candle fields
+TIMESTEPS = 5
+HORIZONS = [None, 6, 12] # One interval ahead with predict, then 30 and 60 minute forecasts
+
+
+def client(url, models, seconds, binary, seed, latencies, errors):
+    """
+    Sends requests for random models and horizons until :seconds: have passed, appending each latency in seconds
+    """
+    rng = np.random.RandomState(seed)
+    address = urlparse(url)
+    connection = http.client.HTTPConnection(address.hostname, address.port)
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        name = models[rng.randint(len(models))]
+        steps = HORIZONS[rng.randint(len(HORIZONS))]
+        shape = (1, TIMESTEPS, FEATURES) if name.startswith('lstm') else (1, FEATURES)
+        inputs = rng.normal(0, 1, shape).astype(np.float32)
+        target_index = 33 # Btcusd_kraken_close. Sent with every request so that all horizons batch together
+        start = time.perf_counter()
+        if binary:
+            buffer = io.BytesIO()
+            np.save(buffer, inputs)
+            query = '?steps={}&target_index={}'.format(steps or 1, target_index)
+            connection.request('POST', '/predict/{}{}'.format(name, query), buffer.getvalue(), {'Content-Type': NPY_TYPE})
+        else:
+            body = json.dumps({'inputs': inputs.tolist(), 'steps': steps, 'target_index': target_index})
+            connection.request('POST', '/predict/' + name, body, {'Content-Type': 'application/json'})
+        response = connection.getresponse()
+        response.read()
+        if response.status == 200:
+            latencies.append(time.perf_counter() - start)
+        else:
+            errors.append(response.status)
+    connection.close()
+
+
+def serve(directory, max_batch, max_wait, connection):
+    """
+    Runs a server for the models in :directory: in a child process, sending its URL back over :connection:
+    """
+    server = ModelServer(ModelRegistry.load(directory, max_batch=max_batch, max_wait=max_wait), port=0)
+    connection.send(server.url)
+    server.serve_forever()
+
+
+def stats(url):
+    address = urlparse(url)
+    connection = http.client.HTTPConnection(address.hostname, address.port)
+    connection.request('GET', '/stats')
+    return json.loads(connection.getresponse().read().decode())
+
+
+def run(url, models, clients, seconds, binary):
+    """
+    Returns a tuple of (latencies in seconds, error statuses, elapsed seconds)
+    """
+    latencies, errors = [], []
+    threads = [threading.Thread(target=client, args=(url, models, seconds, binary, seed, latencies, errors)) for seed in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return np.array(latencies), errors, time.perf_counter() - start
+
+
+def report(label, latencies, errors, elapsed):
+    print("{}: {} requests, {:.0f} requests/s, p50 {:.2f}ms, p99 {:.2f}ms, {} errors".format(
+        label, len(latencies), len(latencies) / elapsed, np.percentile(latencies, 50) * 1e3,
+        np.percentile(latencies, 99) * 1e3, len(errors)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--url', help="load test a running server, e.g. http://127.0.0.1:8765")
+    parser.add_argument('--models', nargs='*', help="models to request from --url, named lstm* or dnn*")
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--json', action='store_true', help="send JSON rather than .npy request bodies")
+    args = parser.parse_args()
+
+    if args.url:
+        latencies, errors, elapsed = run(args.url, args.models, args.clients, args.seconds, not args.json)
+        report(args.url, latencies, errors, elapsed)
+        return
+
+    directory = tempfile.mkdtemp()
+    try:
+        for name, architecture in (('lstm_btcusd', 'LSTM'), ('lstm_ethusd', 'LSTM'), ('dnn_btcusd', 'DNN')):
+            save(os.path.join(directory, name + '.npz'), *random_model(FEATURES, TIMESTEPS, architecture))
+        models = ['dnn_btcusd', 'lstm_btcusd', 'lstm_ethusd']
+        for label, max_batch, max_wait in (('micro-batched', 256, 0.002), ('unbatched', 1, 0)):
+            parent, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=serve, args=(directory, max_batch, max_wait, child), daemon=True)
+            process.start()
+            url = parent.recv()
+            latencies, errors, elapsed = run(url, models, args.clients, args.seconds, not args.json)
+            report(label, latencies, errors, elapsed)
+            batches = stats(url).values()
+            print("  mean samples per batch: {:.1f}".format(
+                sum(entry['samples'] for entry in batches) / max(sum(entry['batches'] for entry in batches), 1)))
+            process.terminate()
+            process.join()
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+"""
+Benchmark and check for the NumPy inference runtime
+Builds a model with the LSTM architecture of prediction_model.LSTM (or the DNN's) from random weights, checks the
+NumPy forward pass against a straightforward float64 reference that computes each gate separately, and against Keras
+when it is installed, then measures the cold start of a fresh interpreter loading the model and scoring one window.
+Run from the repository root: python -m Benchmarks.numpy_runtime --features 20
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+from Classifier.numpy_runtime import NumpyModel, save
+
+COLD_START = """
+import time
+start = time.time()
+import numpy as np
+from Classifier.numpy_runtime import NumpyModel
+model = NumpyModel.load({path!r})
+model.predict(np.zeros({shape}, dtype=np.float32))
+print(time.time() - start, 'keras' in __import__('sys').modules or 'tensorflow' in __import__('sys').modules)
+"""
+
+
+def random_model(features, timesteps, architecture, seed=0):
+    """
+    Layer specs and weights shaped like the Keras models in prediction_model
+    """
+    rng = np.random.RandomState(seed)
+    weight = lambda *shape: rng.normal(0, 0.3, shape).astype(np.float32)
+    if architecture == 'LSTM':
+        layers = [{'type': 'lstm', 'name': 'layer0', 'units': 64, 'activation': 'tanh',
+                   'recurrent_activation': 'hard_sigmoid', 'return_sequences': True},
+                  {'type': 'lstm', 'name': 'layer2', 'units': 64, 'activation': 'tanh',
+                   'recurrent_activation': 'hard_sigmoid', 'return_sequences': False},
+                  {'type': 'dense', 'name': 'layer4', 'activation': 'linear'}]
+        weights = {'layer0_kernel': weight(features, 256), 'layer0_recurrent_kernel': weight(64, 256), 'layer0_bias': weight(256),
+                   'layer2_kernel': weight(64, 256), 'layer2_recurrent_kernel': weight(64, 256), 'layer2_bias': weight(256),
+                   'layer4_kernel': weight(64, 1), 'layer4_bias': weight(1)}
+    else:
+        layers = [{'type': 'dense', 'name': 'layer{}'.format(i * 2), 'activation': 'relu'} for i in range(3)]
+        layers.append({'type': 'dense', 'name': 'layer6', 'activation': 'linear'})
+        sizes = [features, 32, 64, 128, 1]
+        weights = {}
+        for layer, size_in, size_out in zip(layers, sizes, sizes[1:]):
+            weights[layer['name'] + '_kernel'] = weight(size_in, size_out)
+            weights[layer['name'] + '_bias'] = weight(size_out)
+    return layers, weights
+
+
+def reference(layers, weights, data):
+    """
+    Float64 forward pass, one sample and one gate at a time
+    """
+    hard_sigmoid = lambda x: np.clip(0.2 * x + 0.5, 0, 1)
+    activations = {'linear': lambda x: x, 'relu': lambda x: np.maximum(x, 0), 'tanh': np.tanh, 'hard_sigmoid': hard_sigmoid}
+    outputs = []
+    for sample in data.astype(np.float64):
+        x = sample
+        for layer in layers:
+            w = {key[len(layer['name']) + 1:]: value.astype(np.float64) for key, value in weights.items()
+                 if key.startswith(layer['name'] + '_')}
+            if layer['type'] == 'dense':
+                x = activations[layer['activation']](x.dot(w['kernel']) + w['bias'])
+                continue
+            units = layer['units']
+            gates = {gate: (w['kernel'][:, k * units:(k + 1) * units], w['recurrent_kernel'][:, k * units:(k + 1) * units],
+                            w['bias'][k * units:(k + 1) * units]) for k, gate in enumerate('ifco')}
+            h, c, sequence = np.zeros(units), np.zeros(units), []
+            for row in x:
+                z = {gate: row.dot(kernel) + h.dot(recurrent) + bias for gate, (kernel, recurrent, bias) in gates.items()}
+                c = hard_sigmoid(z['f']) * c + hard_sigmoid(z['i']) * np.tanh(z['c'])
+                h = hard_sigmoid(z['o']) * np.tanh(c)
+                sequence.append(h)
+            x = np.array(sequence) if layer['return_sequences'] else h
+        outputs.append(x)
+    return np.array(outputs).reshape(-1, 1)
+
+
+def keras_predictions(layers, weights, features, timesteps, architecture, data):
+    """
+    Predictions of the equivalent Keras model, or None if Keras isn't installed
+    """
+    try:
+        from Classifier.prediction_model import Neural_Net
+    except ImportError:
+        return None
+    network = Neural_Net(features, architecture, timesteps=timesteps)
+    trainable = [layer for layer in network.model.layers if layer.__class__.__name__ != 'Dropout']
+    for layer, spec in zip(trainable, layers):
+        names = ['kernel', 'recurrent_kernel', 'bias'] if spec['type'] == 'lstm' else ['kernel', 'bias']
+        layer.set_weights([weights['{}_{}'.format(spec['name'], name)] for name in names])
+    return network.model.predict(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--architecture', default='LSTM', choices=['LSTM', 'DNN'])
+    parser.add_argument('--features', type=int, default=20)
+    parser.add_argument('--timesteps', type=int, default=5)
+    parser.add_argument('--samples', type=int, default=20000)
+    args = parser.parse_args()
+
+    layers, weights = random_model(args.features, args.timesteps, args.architecture)
+    shape = (args.samples, args.timesteps, args.features) if args.architecture == 'LSTM' else (args.samples, args.features)
+    data = np.random.RandomState(1).normal(0, 1, shape).astype(np.float32)
+
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'model.npz')
+        save(path, layers, dict(weights))
+        print("model file: {:.0f}KB".format(os.path.getsize(path) / 1e3))
+        model = NumpyModel.load(path)
+
+        start = time.time()
+        predictions = model.predict(data, batch_size=4096)
+        elapsed = time.time() - start
+        print("numpy predict: {} samples in {:.3f}s ({:.0f} samples/s)".format(len(data), elapsed, len(data) / elapsed))
+
+        expected = reference(layers, weights, data[:200])
+        print("max difference from reference: {:.2e}".format(np.abs(predictions[:200] - expected).max()))
+        assert np.allclose(predictions[:200], expected, rtol=1e-4, atol=1e-4)
+
+        keras = keras_predictions(layers, weights, args.features, args.timesteps, args.architecture, data)
+        if keras is None:
+            print("keras not installed, skipped keras comparison")
+        else:
+            print("max difference from keras: {:.2e}".format(np.abs(predictions - keras).max()))
+            assert np.allclose(predictions, keras, rtol=1e-4, atol=1e-4)
+
+        script = COLD_START.format(path=path, shape=(1,) + shape[1:])
+        start = time.time()
+        output = subprocess.check_output([sys.executable, '-c', script], cwd=os.getcwd()).decode().split()
+        print("cold start: {:.3f}s in process, {:.3f}s including interpreter, tensorflow imported: {}".format(
+            float(output[0]), time.time() - start, output[1]))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Benchmark for Kraken.to_ohlc
+Compares the vectorized trade aggregation against the original per-candle scan on synthetic trades. The original took
+open from the last trade of each period and close from the first; the vectorized version takes open from the first and
+close from the last, so those two columns are compared crosswise.
+Run from the repository root: python -m Benchmarks.ohlc --trades 3000000
+"""
+import argparse
+import time
+import numpy as np
+import pandas as pd
+
+from Benchmarks.synthetic import synthetic_trades
+from Preprocessing.helpers import date_to_interval
+from Preprocessing.resample import trades_to_ohlc
+
+
+def legacy_to_ohlc(trades, interval):
+    """
+    Original Kraken.to_ohlc algorithm, unchanged apart from pandas API updates: per-trade period mapping and a full
+    scan of the trades for every candle. Only supports daily candles, as with date_to_interval. Open and close come from
+    idxmax and idxmin of the trade time, i.e. the last and first trades
+    """
+    trades = trades.copy()
+    trades['datetime'] = pd.to_datetime(trades['time'], unit='s')
+    trades['period'] = trades['datetime'].map(lambda x: date_to_interval(x, interval))
+
+    trade_agg = trades.groupby('period')
+    ohlc = pd.DataFrame(index=trade_agg.size().index.values, columns=['low', 'high', 'open', 'close', 'volume'])
+    ohlc['low'] = trade_agg['price'].min()
+    ohlc['high'] = trade_agg['price'].max()
+    ohlc['volume'] = trade_agg['volume'].sum()
+
+    for i, row in ohlc.iterrows():
+        selection = trades.loc[trades['period'] == i]
+        ohlc.at[i, 'open'] = selection.loc[selection['time'].idxmax()]['price']
+        ohlc.at[i, 'close'] = selection.loc[selection['time'].idxmin()]['price']
+    return ohlc
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--trades', type=int, default=3000000, help='number of synthetic trades')
+    parser.add_argument('--days', type=int, default=90, help='days of history the trades are spread over')
+    parser.add_argument('--intervals', type=int, nargs='+', default=[1, 5, 60, 1440], help='candle intervals in minutes')
+    parser.add_argument('--skip-legacy', action='store_true', help='only time the vectorized implementation')
+    args = parser.parse_args()
+
+    trades = synthetic_trades(args.trades, days=args.days)
+    print("{:,} trades over {} days".format(args.trades, args.days))
+
+    for interval in args.intervals:
+        ohlc, elapsed = timed(trades_to_ohlc, trades['time'].values, trades['price'].values, trades['volume'].values, interval)
+        print("vectorized  interval={:>5} min  candles={:>7}  {:8.3f}s".format(interval, len(ohlc), elapsed))
+
+    if not args.skip_legacy:
+        # The original implementation only produces daily candles, so compare on that interval
+        legacy, legacy_elapsed = timed(legacy_to_ohlc, trades, 1440)
+        ohlc, elapsed = timed(trades_to_ohlc, trades['time'].values, trades['price'].values, trades['volume'].values, 1440)
+        print("legacy      interval=  1440 min  candles={:>7}  {:8.3f}s".format(len(legacy), legacy_elapsed))
+        print("speedup x{:.1f}".format(legacy_elapsed / elapsed))
+        assert (ohlc.index == pd.DatetimeIndex(legacy.index)).all()
+        for column, legacy_column in (('low', 'low'), ('high', 'high'), ('volume', 'volume'), ('open', 'close'), ('close', 'open')):
+            assert np.allclose(ohlc[column].values, legacy[legacy_column].values.astype(np.float64)), column
+        print("outputs match, with the original's open and close swapped")
+
+
+if __name__ == '__main__':
+    main()
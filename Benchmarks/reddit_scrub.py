@@ -0,0 +1,53 @@
+"""
+Benchmark for Reddit_Scanner.scrub_reddit_comments
+Compares single-pass regex synonym normalization of the comment text against the original lowercase-everything and
+28 DataFrame.replace passes, on synthetic comments.
+Run from the repository root: python -m Benchmarks.reddit_scrub --comments 1000000
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+
+from Benchmarks.synthetic import synthetic_comments
+from Preprocessing.reddit import Reddit_Scanner, DEFAULT_SYNONYMS
+
+
+def legacy_normalize(raw_comments):
+    """
+    Original synonym replacement: stringify and lowercase every column, then one whole-frame replace per synonym
+    """
+    raw_comments = raw_comments.apply(lambda x: x.astype(str).str.lower())
+    for ticker, aliases in DEFAULT_SYNONYMS.items():
+        for alias in aliases:
+            raw_comments = raw_comments.replace(alias, ticker)
+    return raw_comments
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--comments', type=int, default=1000000, help='number of synthetic comments')
+    parser.add_argument('--legacy-comments', type=int, default=100000, help='comments to run the original implementation on')
+    args = parser.parse_args()
+
+    start_time = datetime(2017, 1, 1)
+    scanner = Reddit_Scanner(60, start_time, start_time + timedelta(days=30))
+    start_timestamp = (start_time - datetime(1970, 1, 1)).total_seconds()
+    end_timestamp = start_timestamp + 30 * 86400
+
+    comments = synthetic_comments(args.comments, start_time=start_time)
+    start = time.perf_counter()
+    scrubbed = scanner.scrub_reddit_comments(comments, start_timestamp, end_timestamp)
+    elapsed = time.perf_counter() - start
+    print("scrub_reddit_comments  {:>9,} comments  {:8.3f}s  {:>10,.0f} comments/s".format(len(comments), elapsed, len(comments) / elapsed))
+    print("numeric dtypes kept: {}".format(scrubbed['Comment_Score'].dtype))
+
+    legacy_input = comments.iloc[:args.legacy_comments]
+    start = time.perf_counter()
+    legacy_normalize(legacy_input)
+    legacy_elapsed = time.perf_counter() - start
+    print("legacy normalization   {:>9,} comments  {:8.3f}s  {:>10,.0f} comments/s".format(len(legacy_input), legacy_elapsed, len(legacy_input) / legacy_elapsed))
+    print("per-comment speedup x{:.1f}".format((legacy_elapsed / len(legacy_input)) / (elapsed / len(comments))))
+
+
+if __name__ == '__main__':
+    main()
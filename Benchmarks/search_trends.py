@@ -0,0 +1,52 @@
+"""
+Benchmark for the Google search trends download
+Runs Searchtrends.get_training_data against the stub pytrends client of Benchmarks.synthetic, which answers
+after a fixed latency, comparing one request at a time with concurrent region requests, then a second run served from
+the response cache. Checks that all runs return the same data.
+Run from the repository root: python -m Benchmarks.search_trends --days 720 --latency 0.2
+"""
+import argparse
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+import numpy as np
+
+from Benchmarks.synthetic import stub_factory
+from Preprocessing.google_search import Searchtrends
+from Preprocessing.rate_limit import TokenBucket
+
+
+def download(days, latency, max_workers, cache_directory):
+    client_factory, calls = stub_factory(latency)
+    trends = Searchtrends(5, datetime(2017, 1, 1), datetime(2017, 1, 1) + timedelta(days=days), client_factory=client_factory,
+                          rate_limiter=TokenBucket(rate=100, capacity=10), max_workers=max_workers, cache_directory=cache_directory)
+    start = time.time()
+    data = trends.get_training_data('Bitcoin')
+    return data, time.time() - start, len(calls)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--days', type=int, default=720)
+    parser.add_argument('--latency', type=float, default=0.2)
+    parser.add_argument('--workers', type=int, default=7)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        sequential, seconds, requests = download(args.days, args.latency, 1, None)
+        print("one request at a time: {} requests in {:.2f}s".format(requests, seconds))
+        concurrent, seconds, requests = download(args.days, args.latency, args.workers, directory)
+        print("{} concurrent requests: {} requests in {:.2f}s".format(args.workers, requests, seconds))
+        cached, seconds, requests = download(args.days, args.latency, args.workers, directory)
+        print("from cache: {} requests in {:.2f}s".format(requests, seconds))
+        assert sequential.equals(concurrent) and np.allclose(concurrent.values, cached.values)
+        assert (concurrent.index == cached.index).all() and list(concurrent.columns) == list(cached.columns)
+        print("{} rows x {} regions match".format(*concurrent.shape))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
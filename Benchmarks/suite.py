@@ -0,0 +1,196 @@
+"""
+Benchmark suite for the preprocessing and training pipeline
+Times and memory-profiles each stage at several data sizes on seeded synthetic data (see Benchmarks.synthetic), with
+no network use, and writes the results as JSON. Pass an earlier results file as --baseline to flag stages that got
+slower or use more memory than the baseline by more than --threshold; the exit status is 1 if any did.
+Run from the repository root:
+    python -m Benchmarks.suite --output reports/benchmarks.json
+    python -m Benchmarks.suite --baseline reports/benchmarks.json --output reports/benchmarks_new.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+
+import config
+from Benchmarks.synthetic import PAIRS, measure, synthetic_candles, synthetic_comments, synthetic_trades
+from Classifier.data_processing import processor
+from Preprocessing.candle_store import datetime_to_epoch
+from Preprocessing.gdax import GDAX
+from Preprocessing.kraken import Kraken
+from Preprocessing.reddit import Reddit_Scanner
+
+START_TIME = datetime(2017, 1, 1)
+
+
+def candle_features(candles, seed):
+    """
+    Feature frames for the synthetic candles of every pair in PAIRS, as returned by each source's to_features
+    :candles: 5 minute candles per pair
+    """
+    sources = {'gdax': GDAX, 'kraken': Kraken}
+    frames = synthetic_candles(candles, PAIRS, interval=5, start_time=START_TIME, seed=seed)
+    end_time = START_TIME + timedelta(minutes=5 * (candles + 1))
+    return [sources[pair.split('_')[1]](5, START_TIME, end_time).to_features(frames[pair], pair.split('_')[0])
+            for pair in PAIRS], end_time
+
+
+def stage_to_ohlc(size, seed):
+    """
+    Kraken.to_ohlc on :size: trades
+    """
+    trades = synthetic_trades(size, start_time=START_TIME, days=90, seed=seed)
+    kraken = Kraken(5, START_TIME, START_TIME + timedelta(days=90))
+    return lambda: kraken.to_ohlc(trades)
+
+
+def stage_scrub_comments(size, seed):
+    """
+    Reddit_Scanner.scrub_reddit_comments on :size: comments
+    """
+    comments = synthetic_comments(size, start_time=START_TIME, days=30, seed=seed)
+    scanner = Reddit_Scanner(60, START_TIME, START_TIME + timedelta(days=30))
+    start = datetime_to_epoch(START_TIME)
+    return lambda: scanner.scrub_reddit_comments(comments, start, start + 30 * 86400)
+
+
+def stage_align_features(size, seed):
+    """
+    The joining step of historical_download: aligning 8 pairs of :size: candles onto the candle grid
+    """
+    frames, end_time = candle_features(size, seed)
+    return lambda: processor.align_features(frames, START_TIME, end_time, 5, fill_limits=[config.MAX_FILL_MINUTES] * len(frames))
+
+
+def stage_generate_x_y(size, seed):
+    """
+    processor.generate_x_y with indicators on 8 pairs of :size: candles
+    """
+    frames, end_time = candle_features(size, seed)
+    data = processor.align_features(frames, START_TIME, end_time, 5)
+    return lambda: processor.generate_x_y(data, indicators=True)
+
+
+def stage_train(size, seed):
+    """
+    One epoch of Neural_Net.train for the DNN on :size: samples of 40 features. Needs Keras
+    """
+    from Classifier.prediction_model import Neural_Net
+    rng = np.random.RandomState(seed)
+    data = rng.normal(0, 1, (size, 40)).astype(np.float32)
+    targets = data[:, 33] * 0.5 + rng.normal(0, 0.1, size)
+    valid = size // 5
+    network = Neural_Net(40, 'DNN')
+
+    def train():
+        # Checkpoint to a scratch directory rather than over the trained weights in ./saved_models
+        directory = tempfile.mkdtemp()
+        try:
+            network.train(data[valid:], targets[valid:], 0.0, 1.0, data[:valid], targets[:valid], epochs=1, batch_size=256,
+                          weights_file=os.path.join(directory, 'weights.hdf5'))
+        finally:
+            shutil.rmtree(directory)
+    return train
+
+
+# (name, function returning the callable to measure for a data size, data sizes)
+STAGES = [
+    ('kraken.to_ohlc', stage_to_ohlc, [100000, 1000000, 3000000]),
+    ('reddit.scrub_reddit_comments', stage_scrub_comments, [10000, 100000, 300000]),
+    ('processor.align_features', stage_align_features, [10000, 100000, 300000]),
+    ('processor.generate_x_y', stage_generate_x_y, [10000, 100000, 300000]),
+    ('model.train', stage_train, [10000, 100000]),
+]
+
+
+def run(stages, scale, repeat, seed):
+    """
+    Runs the selected stages at every size
+    Returns a dict of {stage: {size: results}}
+    """
+    results = {}
+    for name, stage, sizes in STAGES:
+        if stages and name not in stages:
+            continue
+        results[name] = {}
+        for size in sizes:
+            size = max(int(size * scale), 1)
+            try:
+                function = stage(size, seed)
+            except ImportError as error:
+                print("{:<30} skipped: {}".format(name, error))
+                break
+            _, seconds, peak = measure(function, repeat)
+            result = {'seconds': seconds, 'peak_mb': peak}
+            results[name][str(size)] = result
+            print("{:<30} {:>10,}  {:8.3f}s  {:8.1f}MB".format(name, size, result['seconds'], result['peak_mb']))
+    return results
+
+
+def compare(results, baseline, threshold, floors={'seconds': 0.01, 'peak_mb': 1.0}):
+    """
+    Flags stage sizes whose best time or peak memory exceeds the baseline's by more than :threshold: (a fraction)
+    :floors: smallest absolute increase flagged per metric, so timer noise on millisecond stages isn't reported
+    Returns a list of regression descriptions
+    """
+    regressions = []
+    for name, sizes in results.items():
+        for size, result in sizes.items():
+            previous = baseline.get(name, {}).get(size)
+            if previous is None:
+                continue
+            for metric in ('seconds', 'peak_mb'):
+                change = result[metric] / max(previous[metric], 1e-9) - 1
+                if change > threshold and result[metric] - previous[metric] > floors[metric]:
+                    regressions.append("{} at {} rows: {} {:.3f} -> {:.3f} (+{:.0%})".format(
+                        name, size, metric, previous[metric], result[metric], change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--stages', nargs='*', help="stages to run, e.g. kraken.to_ohlc. Defaults to all")
+    parser.add_argument('--scale', type=float, default=1.0, help="multiplies every data size, e.g. 0.1 for a quick run")
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per size; the best is kept")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=os.path.join(config.PROFILE_DIRECTORY, 'benchmarks.json'))
+    parser.add_argument('--baseline', help="earlier results file to compare against")
+    parser.add_argument('--threshold', type=float, default=0.25, help="allowed slowdown or memory growth, as a fraction")
+    args = parser.parse_args()
+
+    results = run(args.stages, args.scale, args.repeat, args.seed)
+    report = {
+        'created': datetime.utcnow().isoformat(),
+        'settings': {'scale': args.scale, 'repeat': args.repeat, 'seed': args.seed},
+        'environment': {'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__,
+                        'platform': platform.platform(), 'processor': platform.processor()},
+        'results': results,
+    }
+    directory = os.path.dirname(args.output)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print("results written to {}".format(args.output))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('settings') != report['settings']:
+            print("warning: baseline was run with different settings {}".format(baseline.get('settings')))
+        regressions = compare(results, baseline['results'], args.threshold)
+        for regression in regressions:
+            print("REGRESSION " + regression)
+        if regressions:
+            sys.exit(1)
+        print("no regressions beyond {:.0%}".format(args.threshold))
+
+
+if __name__ == '__main__':
+    main()
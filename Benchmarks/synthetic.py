@@ -0,0 +1,150 @@
+"""
+Synthetic data generators
+Seeded, network-free stand-ins for the API data and clients used by the preprocessors so that benchmarks and tests are
+reproducible, and the timing helper the benchmarks share
+"""
+import threading
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from datetime import datetime
+
+# The 8 exchange pairs the model is trained on, as {prefix}_{source}
+PAIRS = ['Ethusd_gdax', 'Etheur_gdax', 'Ethusd_kraken', 'Etheur_kraken', 'Btcusd_gdax', 'Btceur_gdax', 'Btcusd_kraken', 'Btceur_kraken']
+
+
+def measure(function, repeat=0):
+    """
+    Runs :function: under tracemalloc and returns (result, seconds, peak traced megabytes)
+    :repeat: untraced runs to make first. seconds is then the best of their wall times, as tracing slows the function down
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] / 1e6
+    tracemalloc.stop()
+    return result, min(times) if times else elapsed, peak
+
+
+def synthetic_trades(n_trades, start_time=datetime(2017, 1, 1), days=90, seed=0):
+    """
+    Generates a Kraken style trades dataframe as returned by Kraken.request_trade_slice
+    :n_trades: number of trades to generate
+    :start_time: datetime of the first trade
+    :days: length of the period the trades are spread over
+    :seed: random seed
+    Returns a dataframe with columns ['price', 'volume', 'time'] where time is a unix timestamp in seconds
+    """
+    rng = np.random.RandomState(seed)
+    start = (start_time - datetime(1970, 1, 1)).total_seconds()
+    times = start + np.sort(rng.uniform(0, days * 86400, n_trades))
+    prices = 1000 * np.exp(np.cumsum(rng.normal(0, 0.0005, n_trades)))
+    volumes = rng.exponential(0.5, n_trades)
+    return pd.DataFrame({'price': prices, 'volume': volumes, 'time': times}, columns=['price', 'volume', 'time'])
+
+
+def synthetic_candles(n_candles, pairs, interval=5, start_time=datetime(2017, 1, 1), seed=0):
+    """
+    Generates OHLCV candles for several pairs as returned by GDAX.get_training_data
+    :n_candles: number of candles per pair
+    :pairs: list of pair names
+    :interval: candle interval in minutes
+    Returns a dict of {pair: dataframe} with columns ['low', 'high', 'open', 'close', 'volume'] indexed by unix seconds
+    """
+    rng = np.random.RandomState(seed)
+    start = int((start_time - datetime(1970, 1, 1)).total_seconds())
+    times = start + np.arange(n_candles, dtype=np.int64) * interval * 60
+    candles = {}
+    for pair in pairs:
+        close = 1000 * np.exp(np.cumsum(rng.normal(0, 0.002, n_candles)))
+        open_ = np.r_[close[0], close[:-1]]
+        spread = close * rng.uniform(0, 0.003, n_candles)
+        candles[pair] = pd.DataFrame({
+            'low': np.minimum(open_, close) - spread,
+            'high': np.maximum(open_, close) + spread,
+            'open': open_,
+            'close': close,
+            'volume': rng.exponential(10, n_candles),
+        }, index=times, columns=['low', 'high', 'open', 'close', 'volume'])
+    return candles
+
+
+COMMENT_WORDS = ['the', 'a', 'to', 'and', 'of', 'is', 'it', 'that', 'in', 'for', 'you', 'this', 'price', 'market', 'I',
+                 'just', 'be', 'not', 'on', 'are', 'with', 'have', 'but', 'so', 'my', 'will', 'buy', 'sell', 'Moon', 'hodl',
+                 'exchange', 'fees', 'wallet', 'network', 'bullish', 'bearish', 'today', 'going', 'etherscan', 'bitcoincash']
+COIN_WORDS = ['ethereum', 'Bitcoin', 'litecoin', "ether's", 'btc/usd', 'bitcoins', 'Ether', 'eth', 'BTC', 'ltc/eur']
+
+
+def synthetic_comments(n_comments, start_time=datetime(2017, 1, 1), days=30, words=40, mention_rate=0.05, seed=0):
+    """
+    Generates a dataframe of reddit comments as returned by Reddit_Scanner.get_raw_comments
+    :n_comments: number of comments
+    :words: number of words per comment
+    :mention_rate: fraction of words that are coin names or synonyms
+    Returns a dataframe with the raw comment columns, numeric columns as floats
+    """
+    rng = np.random.RandomState(seed)
+    start = (start_time - datetime(1970, 1, 1)).total_seconds()
+    vocabulary = np.array(COMMENT_WORDS + COIN_WORDS)
+    common = rng.randint(0, len(COMMENT_WORDS), (n_comments, words))
+    coins = len(COMMENT_WORDS) + rng.randint(0, len(COIN_WORDS), (n_comments, words))
+    text = [' '.join(row) for row in vocabulary[np.where(rng.rand(n_comments, words) < mention_rate, coins, common)]]
+    comment_dates = start + rng.uniform(0, days * 86400, n_comments)
+    zeros = np.zeros(n_comments)
+    return pd.DataFrame({
+        'Post_ID': rng.randint(0, 5000, n_comments).astype(str), 'Post_Date': comment_dates - 3600,
+        'Post_Score': rng.randint(0, 1000, n_comments).astype(float),
+        'Comment_ID': np.arange(n_comments).astype(str), 'Comment_Text': text, 'Comment_Date': comment_dates,
+        'Comment_Score': rng.randint(-10, 100, n_comments).astype(float), 'Replying_to_ID': np.arange(n_comments).astype(str),
+        'Sentiment_Score': zeros, 'Sentiment_Magnitude': zeros, 'ETH_Score': zeros, 'ETH_Magnitude': zeros,
+        'BTC_Score': zeros, 'BTC_Magnitude': zeros, 'LTC_Score': zeros, 'LTC_Magnitude': zeros,
+    }, columns=['Post_ID', 'Post_Date', 'Post_Score', 'Comment_ID', 'Comment_Text', 'Comment_Date', 'Comment_Score',
+                'Replying_to_ID', 'Sentiment_Score', 'Sentiment_Magnitude', 'ETH_Score', 'ETH_Magnitude',
+                'BTC_Score', 'BTC_Magnitude', 'LTC_Score', 'LTC_Magnitude'])
+
+
+def synthetic_interest(topic, geo, dates):
+    """
+    Daily search interest StubTrends returns for a topic and region
+    """
+    seed = sum(map(ord, topic + geo))
+    return (np.arange(len(dates)) * 7 + dates.dayofyear.values * 3 + seed) % 101
+
+
+class StubTrends:
+    """
+    Stands in for pytrends' TrendReq, returning synthetic_interest for each payload after :latency: seconds. Requests are
+    logged to :calls: as (arrival time, topic, geo, timeframe)
+    """
+    def __init__(self, latency=0.0, calls=None, lock=None):
+        self.latency = latency
+        self.calls = calls if calls is not None else []
+        self.lock = lock or threading.Lock()
+
+    def build_payload(self, kw_list, cat=0, timeframe='', geo='', gprop=''):
+        self.payload = (kw_list, timeframe, geo)
+
+    def interest_over_time(self):
+        kw_list, timeframe, geo = self.payload
+        with self.lock:
+            self.calls.append((time.monotonic(), kw_list[0], geo, timeframe))
+        time.sleep(self.latency)
+        start, end = timeframe.split(' ')
+        dates = pd.date_range(start, end, freq='D')
+        values = synthetic_interest(kw_list[0], geo, dates)
+        return pd.DataFrame({kw_list[0]: values, 'isPartial': False}, index=dates, columns=[kw_list[0], 'isPartial'])
+
+
+def stub_factory(latency=0.0):
+    """
+    Returns (client factory, shared call log) for Searchtrends. Each download thread gets its own stub client
+    """
+    calls, lock = [], threading.Lock()
+    return (lambda: StubTrends(latency, calls, lock)), calls
@@ -0,0 +1,189 @@
+"""
+Backtesting
+Vectorized walk-forward backtester for model predictions. Predictions are turned into positions, PnL, fees and drawdown
+with whole-array numpy operations (no per-bar Python loops), and walk-forward folds and parameter sets are spread
+across a process pool.
+
+Predictions and prices are aligned as returned by processor.generate_x_y: prediction i is the forecast % change of the
+target from prices[i] to prices[i + 1], so the position taken on bar i earns the return of the following bar.
+"""
+import itertools
+import time
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Parameters of a strategy, with their defaults
+DEFAULT_PARAMETERS = {
+    'threshold': 0.0, # Minimum absolute predicted % change before a position is taken
+    'allow_short': True, # Go short on predicted falls, otherwise stay flat
+    'fee': 0.0026, # Fee per unit of turnover, e.g. Kraken's 0.26% taker fee
+    'leverage': 1.0, # Position size as a multiple of equity
+}
+
+
+def parameter_grid(**options):
+    """
+    Every combination of the given strategy parameter values, e.g. parameter_grid(threshold=[0, 0.001], fee=[0.0026])
+    Parameters not given take their value from DEFAULT_PARAMETERS
+    Returns a list of parameter dicts
+    """
+    unknown = set(options) - set(DEFAULT_PARAMETERS)
+    if unknown:
+        raise ValueError("unknown backtest parameters {}".format(sorted(unknown)))
+    names = sorted(options)
+    grid = []
+    for values in itertools.product(*(options[name] for name in names)):
+        params = dict(DEFAULT_PARAMETERS)
+        params.update(zip(names, values))
+        grid.append(params)
+    return grid
+
+
+def simulate(predictions, prices, params):
+    """
+    Simulates a batch of parameter sets over the same bars at once, as (parameter sets, bars) arrays
+    :predictions: 1D numpy array of predicted % changes, aligned with :prices:
+    :prices: 1D numpy array of target prices. The last prediction has no realised return and is ignored
+    :params: list of parameter dicts, see parameter_grid
+    Returns a dict of 2D arrays: positions, returns (per bar, after fees), fees, turnover, equity and drawdown
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    market = prices[1:] / prices[:-1] - 1
+    signal = np.asarray(predictions, dtype=np.float64)[:len(market)]
+
+    column = lambda name: np.array([p.get(name, DEFAULT_PARAMETERS[name]) for p in params], dtype=np.float64)[:, None]
+    threshold, allow_short, fee, leverage = column('threshold'), column('allow_short'), column('fee'), column('leverage')
+
+    positions = (signal > threshold).astype(np.float64)
+    positions -= (signal < -threshold) * allow_short
+    positions *= leverage
+
+    # Turnover from the previous bar's position, starting flat
+    turnover = np.empty_like(positions)
+    turnover[:, 0] = np.abs(positions[:, 0])
+    np.abs(np.diff(positions, axis=1), out=turnover[:, 1:])
+
+    fees = turnover * fee
+    returns = positions * market - fees
+    equity = np.cumprod(1 + returns, axis=1)
+    # Drawdown from the running peak, which starts at the initial capital of 1
+    drawdown = equity / np.maximum.accumulate(np.maximum(equity, 1.0), axis=1) - 1
+    return {'positions': positions, 'returns': returns, 'fees': fees, 'turnover': turnover,
+            'equity': equity, 'drawdown': drawdown}
+
+
+def summarize(result, interval=5):
+    """
+    Summary statistics for each parameter set of a simulate result
+    :interval: bar length in minutes, used to annualise the Sharpe ratio
+    Returns a dataframe with one row per parameter set
+    """
+    returns = result['returns']
+    periods_per_year = 365 * 24 * 60 / float(interval)
+    std = returns.std(axis=1)
+    in_market = result['positions'] != 0
+    exposure = in_market.mean(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sharpe = np.where(std > 0, returns.mean(axis=1) / std * np.sqrt(periods_per_year), 0.0)
+        hit_rate = np.where(in_market.any(axis=1), (in_market & (returns > 0)).sum(axis=1) / in_market.sum(axis=1).astype(float), np.nan)
+
+    return pd.DataFrame({
+        'total_return': result['equity'][:, -1] - 1,
+        'sharpe': sharpe,
+        'max_drawdown': result['drawdown'].min(axis=1),
+        'fees': result['fees'].sum(axis=1),
+        'trades': (result['turnover'] > 0).sum(axis=1),
+        'exposure': exposure,
+        'hit_rate': hit_rate,
+    }, columns=['total_return', 'sharpe', 'max_drawdown', 'fees', 'trades', 'exposure', 'hit_rate'])
+
+
+def walk_forward_folds(bars, train_size, test_size, step=None, anchored=False):
+    """
+    Consecutive (train, test) windows over :bars: bars, each test window directly following its train window
+    :step: bars between the start of each fold. Defaults to :test_size:, so test windows tile the data without overlap
+    :anchored: if True every train window starts at bar 0 and grows, otherwise it slides along with the test window
+    Returns a list of ((train_start, train_end), (test_start, test_end)) half-open bar ranges
+    """
+    step = step or test_size
+    folds = []
+    start = 0
+    while start + train_size + test_size <= bars:
+        train_start = 0 if anchored else start
+        folds.append(((train_start, start + train_size), (start + train_size, start + train_size + test_size)))
+        start += step
+    return folds
+
+
+def evaluate_fold(task):
+    """
+    Process pool worker: simulates one chunk of parameter sets on one fold's train and test windows
+    :task: tuple of (fold number, first parameter index, parameter dicts, interval, train predictions, train prices,
+    test predictions, test prices)
+    Returns a dataframe of summary statistics with fold, param and sample ('train' or 'test') columns
+    """
+    fold, first_param, params, interval, train_predictions, train_prices, test_predictions, test_prices = task
+    stats = []
+    for sample, predictions, prices in (('train', train_predictions, train_prices), ('test', test_predictions, test_prices)):
+        summary = summarize(simulate(predictions, prices, params), interval)
+        summary.insert(0, 'sample', sample)
+        summary.insert(0, 'param', np.arange(first_param, first_param + len(params)))
+        summary.insert(0, 'fold', fold)
+        stats.append(summary)
+    return pd.concat(stats, ignore_index=True)
+
+
+def walk_forward(predictions, prices, params, train_size, test_size, step=None, anchored=False, interval=5,
+                 metric='sharpe', max_workers=None, chunk_size=16):
+    """
+    Walk-forward backtest. Every parameter set is run on every fold's train window, the best by :metric: is selected
+    and its result on the following test window is kept, so the selected results are all out of sample.
+    (fold, parameter chunk) tasks run in a process pool; call from under `if __name__ == '__main__':` on platforms
+    that spawn worker processes
+    :predictions: 1D numpy array of predicted % changes, e.g. Neural_Net.predict de-normalised with the training mean/std
+    :prices: 1D numpy array of target prices aligned with :predictions:, e.g. target_actuals from generate_x_y
+    :params: list of parameter dicts, see parameter_grid
+    :train_size: :test_size: :step: :anchored: fold layout in bars, see walk_forward_folds
+    :interval: bar length in minutes
+    :metric: summary column used to select parameters on each train window (higher is better)
+    :max_workers: number of worker processes. 1 runs everything in this process
+    :chunk_size: parameter sets simulated together in one task
+    Returns a tuple of (stats, selected, returns) where stats has every fold, parameter set and sample, selected has
+    the chosen parameters and their test statistics for each fold, and returns is the stitched out-of-sample return
+    series of the selected parameters
+    """
+    predictions = np.asarray(predictions, dtype=np.float64)
+    prices = np.asarray(prices, dtype=np.float64)
+    folds = walk_forward_folds(len(prices) - 1, train_size, test_size, step, anchored)
+    if not folds:
+        raise ValueError("{} bars is not enough for a train window of {} and test window of {}".format(len(prices) - 1, train_size, test_size))
+
+    # Each task carries only its own fold's windows. Prices run one bar past the window for the last bar's return
+    tasks = []
+    for fold, ((train_start, train_end), (test_start, test_end)) in enumerate(folds):
+        for first_param in range(0, len(params), chunk_size):
+            tasks.append((fold, first_param, params[first_param:first_param + chunk_size], interval,
+                          predictions[train_start:train_end], prices[train_start:train_end + 1],
+                          predictions[test_start:test_end], prices[test_start:test_end + 1]))
+
+    start = time.time()
+    if max_workers == 1:
+        stats = [evaluate_fold(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            stats = [future.result() for future in as_completed([executor.submit(evaluate_fold, task) for task in tasks])]
+    stats = pd.concat(stats, ignore_index=True).sort_values(['fold', 'sample', 'param']).reset_index(drop=True)
+    print("backtested {} parameter sets over {} folds in {:.2f}s".format(len(params), len(folds), time.time() - start))
+
+    # Select on the train window, report on the test window
+    train = stats[stats['sample'] == 'train']
+    best = train.loc[train.groupby('fold')[metric].idxmax(), ['fold', 'param']]
+    selected = best.merge(stats[stats['sample'] == 'test'], on=['fold', 'param']).drop('sample', axis=1)
+    selected = pd.concat([selected, pd.DataFrame([params[i] for i in selected['param']])], axis=1)
+
+    returns = []
+    for fold, param in zip(selected['fold'], selected['param']):
+        test_start, test_end = folds[fold][1]
+        returns.append(simulate(predictions[test_start:test_end], prices[test_start:test_end + 1], [params[param]])['returns'][0])
+    return stats, selected, np.concatenate(returns)
@@ -0,0 +1,105 @@
+"""
+Chunked Pipeline
+Builds a training dataset for a long time range one block at a time, so that peak memory depends on the block size
+rather than the length of the history. Each block is downloaded, converted with processor.generate_x_y and appended
+straight to a memory-mapped Dataset (see Classifier.dataset). The last rows of each block are carried over to the
+next one, so % changes, indicators and targets are computed across block boundaries as if the whole range had been
+processed at once. Without indicators the rows are identical to processor.save_dataset's; with indicators they match to
+within float32 rounding, see build_dataset
+"""
+import numpy as np
+import pandas as pd
+from datetime import timedelta
+
+from Classifier.data_processing import processor
+from Classifier.dataset import Dataset, DatasetWriter
+from Classifier.indicators import DEFAULT_SETTINGS, warmup as indicator_warmup
+from Preprocessing.profiling import profiler
+
+
+def time_blocks(start_time, end_time, block):
+    """
+    Splits [start_time, end_time) into consecutive blocks
+    :block: block length as a timedelta
+    Returns a list of (block start, block end) datetimes
+    """
+    blocks = []
+    block_start = start_time
+    while block_start < end_time:
+        block_end = min(block_start + block, end_time)
+        blocks.append((block_start, block_end))
+        block_start = block_end
+    return blocks
+
+
+def overlap_rows(indicators=None, tolerance=1e-9):
+    """
+    Number of rows of history carried into each block. Without indicators only the previous row is needed for %
+    changes. The exponential indicators depend on all earlier rows, so enough rows are carried for the influence of
+    anything older to decay below :tolerance:
+    :indicators: True or a dict of indicator settings, as for generate_x_y
+    """
+    if not indicators:
+        return 1
+    settings = dict(DEFAULT_SETTINGS, **(indicators if isinstance(indicators, dict) else {}))
+    alphas = [2.0 / (settings['ema'] + 1), 2.0 / (settings['macd'][1] + 1), 2.0 / (settings['macd'][2] + 1),
+              1.0 / settings['rsi'], 1.0 / settings['atr']]
+    decay = int(np.ceil(np.log(tolerance) / np.log(1 - min(alphas))))
+    return max(indicator_warmup(settings), 2 * decay) # MACD's signal line is an EMA of EMAs, so allow for both
+
+
+@profiler.profiled('chunked.build_dataset', rows=True)
+def build_dataset(path, start_time, end_time, interval, block=timedelta(days=30), target="Btcusd_kraken_close",
+                  forecast_range=1, indicators=None, download=None, tolerance=1e-9, **download_options):
+    """
+    Downloads and converts [start_time, end_time) block by block, appending each block's rows to the dataset at :path:
+    (created if needed). Produces the same rows as processor.save_dataset on the whole range. With indicators, feature
+    values can differ from save_dataset's by about one float32 rounding step (relative 1e-7, absolute about 1e-9 for
+    Bollinger width): the exponential indicators only see the carried rows of history, enough for anything older to
+    decay below :tolerance:, and rolling windows are summed from a different first row, which changes float rounding
+    :interval: candle interval in minutes
+    :block: length of each block as a timedelta. Peak memory is roughly that of save_dataset on one block
+    :target: :forecast_range: :indicators: see processor.generate_x_y
+    :download: function with the signature of processor.historical_download returning one block's data. Defaults to
+    processor.historical_download
+    :tolerance: largest influence on the exponential indicators that history older than the carried rows may have,
+    see overlap_rows
+    :download_options: passed on to :download:, e.g. store=CandleStore('./candles')
+    Returns the Dataset
+    """
+    download = download or processor.historical_download
+    overlap = overlap_rows(indicators, tolerance)
+    step = timedelta(minutes=interval)
+    # First row of a block's frame with features: % changes need the previous row, indicators their warm-up rows
+    start = 1
+    if indicators:
+        start = max(start, indicator_warmup(indicators if isinstance(indicators, dict) else None))
+
+    writer = None
+    tail = None # Last rows of the previous block
+    pending = 0 # Rows at the end of the frame that haven't been written yet, e.g. rows whose targets are in the next block
+    for block_start, block_end in time_blocks(start_time, end_time, block):
+        with profiler.span('chunked.block'):
+            # Downloads only include candles after their start time, so start one interval early to include the
+            # candle at the block boundary
+            frame = download(block_start if tail is None else block_start - step, block_end, interval, **download_options)
+            pending += len(frame)
+            if tail is not None:
+                frame = pd.concat([tail, frame])
+            if len(frame) <= start + forecast_range:
+                # Too short to produce any rows yet, e.g. an outage. Carry all of it into the next block
+                tail = frame
+                continue
+
+            data, targets, actuals = processor.generate_x_y(frame, target, forecast_range, indicators)
+            first = len(frame) - forecast_range - len(data) # Row of :frame: that data[0] was computed for
+            skip = max(0, len(frame) - pending - first) # Rows already written with the previous block
+            if skip < len(data):
+                if writer is None:
+                    writer = DatasetWriter(path, processor.feature_columns(frame.columns, indicators), interval, target)
+                writer.append(data[skip:], targets[skip:], actuals[skip:len(data)], frame.index[first + skip:first + len(data)])
+                profiler.count('chunked.rows', len(data) - skip)
+            tail, pending = frame.iloc[-(overlap + forecast_range):], forecast_range
+    if writer is not None:
+        writer.write_meta()
+    return Dataset(path)
@@ -3,143 +3,97 @@ Data Processing
 Functions to download, consolidate, and process data from the various sources
 """
 import numpy as np
+from numpy.lib.stride_tricks import as_strided
 import pandas as pd
 import sys
+import time
 from datetime import datetime
 sys.path.append('../..')
 import pickle
 
-from Preprocessing import kraken, gdax, reddit, google_search, blockchain_stat_importer
+import config
+from Classifier import indicators
+from Classifier.dataset import Dataset, DatasetWriter
+from Classifier.indicators import warmup as indicator_warmup
+from Preprocessing import kraken, gdax, reddit, google_search, blockchain_stat_importer, resample
+from Preprocessing.candle_store import datetime_to_epoch, index_to_epoch
+from Preprocessing.profiling import profiler
+from Preprocessing.rate_limit import TokenBucket
+from Preprocessing.scheduler import DownloadScheduler
+from Preprocessing.transport import HTTPTransport
+
+# Preprocessors that can be used as feature sources, keyed by the source name used in config.FEATURE_SOURCES
+SOURCE_TYPES = {source.source_name: source for source in (
+    gdax.GDAX, kraken.Kraken, reddit.Reddit_Scanner, google_search.Searchtrends, blockchain_stat_importer.Blockchain_Stats)}
 
 class processor:
     """
     Downloads training and live data for deep learning and prediction. Also includes data processor helper functions
     """
-    def historical_download(start_time, end_time, interval, include_sentiment_analysis=False):
+    @profiler.profiled('processor.historical_download', rows=True, capture=True)
+    def historical_download(start_time, end_time, interval, include_sentiment_analysis=False, max_workers=8, store=None,
+                            sources=None, reddit_credentials=None, max_fill=None, gap_masks=False, drop_gaps=False, replay=None):
         """
         Downloads and aggregates historical data for training
-        :config: config file if needed
         :start_time: beginning of download period in Datetime format
         :end_time: end of download period in Datetime format
         :interval: time interval at which the training data will be collected and batched, in minutes
-        Returns a dataframe
-        """
-        # Get Kraken USD market data
-        K = kraken.Kraken(interval, start_time, end_time)
-        K_ETH_USD = K.get_training_data('XETHZUSD')
-        K_BTC_USD = K.get_training_data('XXBTZUSD')
-        #K_LTC_USD = K.get_training_data('XLTCZUSD')
-
-        # Get Kraken EUR market data
-        K_ETH_EUR = K.get_training_data('XETHZEUR')
-        K_BTC_EUR = K.get_training_data('XXBTZEUR')
-        #K_LTC_EUR = K.get_training_data('XLTCZEUR')
-
-        # Get GDAX USD market data
-        G = gdax.GDAX(interval, start_time, end_time)
-        G_ETH_USD = G.get_training_data('ETH-USD')
-        G_BTC_USD = G.get_training_data('BTC-USD')
-        #G_LTC_USD = G.get_training_data('LTC-USD')
-
-        # Get GDAX EUR market data
-        G_ETH_EUR = G.get_training_data('ETH-EUR')
-        G_BTC_EUR = G.get_training_data('BTC-EUR')
-        #G_LTC_EUR = G.get_training_data('LTC-EUR')
-
-        # Get Reddit data
-        #client_ID='GK8bm-Gl2VD5SA'
-        #client_secret='pHtlAyxKuYt1JAGir_Gn9XOXlJc'
-        #reddit = reddit.Reddit_Scanner(interval, start_time, end_time)
-        #reddit.authenticate(client_ID, client_secret, include_sentiment_analysis=False)
-        #ETH_reddit =reddit.get_training_data('Ethereum')
-        #BTC_reddit =reddit.get_training_data('Bitcoin')
-        #LTC_reddit =reddit.get_training_data('Litecoin')
-        #with open('reddit_data.pickle', 'a') as f:
-        #    pickle.dump((ETH_reddit, BTC_reddit, LTC_reddit), f)
-
-        # Get Google search data
-        #Search = google_search.Searchtrends(interval, start_time, end_time)
-        #ETH_trends = Search.get_training_data('Ethereum')
-        #BTC_trends = Search.get_training_data('Bitcoin')
-        #LTC_trends = Search.get_training_data('Litecoin')
-        #with open('google_data.pickle', 'wb') as f:
-        #    pickle.dump((ETH_trends, BTC_trends, LTC_trends), f)
-
-        # Get Blockchain stats
-        #Blockchain = blockchain_stat_importer.Blockchain_Stats(interval, start_time, end_time)
-        #ETH_Blockchain = Blockchain.get_training_data('../Blockchain_Data/Blockchain Stats - ETH_Clean.csv')
-        #BTC_Blockchain = Blockchain.get_training_data('../Blockchain_Data/Blockchain Stats - BTC_Clean.csv')
-        #LTC_Blockchain = Blockchain.get_training_data('../Blockchain_Data/ltc_blockchain.csv')
-        #with open('blockchain_data.pickle', 'wb') as f:
-        #    pickle.dump((ETH_Blockchain, BTC_Blockchain), f)
-
-        # Convert GDAX timestamps to datetimes
-        G_ETH_USD = G_ETH_USD.rename(index=lambda x:x*1000000000).rename(index=pd.to_datetime)
-        G_BTC_USD = G_BTC_USD.rename(index=lambda x:x*1000000000).rename(index=pd.to_datetime)
-        #G_LTC_USD = G_LTC_USD.rename(index=lambda x:x*1000000000).rename(index=pd.to_datetime)
-        G_ETH_EUR = G_ETH_EUR.rename(index=lambda x:x*1000000000).rename(index=pd.to_datetime)
-        G_BTC_EUR = G_BTC_EUR.rename(index=lambda x:x*1000000000).rename(index=pd.to_datetime)
-        #G_LTC_EUR = G_LTC_EUR.rename(index=lambda x:x*1000000000).rename(index=pd.to_datetime)
-
-        # Set blockchain data index to timestamp (datetime format)
-        #ETH_blockchain = ETH_blockchain.set_index('Timestamp')
-        #BTC_blockchain = BTC_blockchain.set_index('Timestamp')
-        #LTC_blockchain = LTC_blockchain.set_index('Timestamp')
-
-        # Renaming to ensure unique column names. TODO: Make renaming programmatic
-        G_ETH_USD = G_ETH_USD.rename(columns={"low": "Ethusd_gdax_low", "high": "Ethusd_gdax_high", "open": "Ethusd_gdax_open", "close": "Ethusd_gdax_close", "volume": "Ethusd_gdax_vol"})
-        G_BTC_USD = G_BTC_USD.rename(columns={"low": "Btcusd_gdax_low", "high": "Btcusd_gdax_high", "open": "Btcusd_gdax_open", "close": "Btcusd_gdax_close", "volume": "Btcusd_gdax_vol"})
-        #G_LTC_USD = G_LTC_USD.rename(columns={"low": "Ltcusd_gdax_low", "high": "Ltcusd_gdax_high", "open": "Ltcusd_gdax_open", "close": "Ltcusd_gdax_close", "volume": "Ltcusd_gdax_vol"})
-        K_ETH_USD = K_ETH_USD.rename(columns={"low": "Ethusd_kraken_low", "high": "Ethusd_kraken_high", "open": "Ethusd_kraken_open", "close": "Ethusd_kraken_close", "volume": "Ethusd_kraken_vol"})
-        K_BTC_USD = K_BTC_USD.rename(columns={"low": "Btcusd_kraken_low", "high": "Btcusd_kraken_high", "open": "Btcusd_kraken_open", "close": "Btcusd_kraken_close", "volume": "Btcusd_kraken_vol"})
-        #K_LTC_USD = K_LTC_USD.rename(columns={"low": "Ltcusd_kraken_low", "high": "Ltcusd_kraken_high", "open": "Ltcusd_kraken_open", "close": "Ltcusd_kraken_close", "volume": "Ltcusd_kraken_vol"})
-        G_ETH_EUR = G_ETH_EUR.rename(columns={"low": "Etheur_gdax_low", "high": "Etheur_gdax_high", "open": "Etheur_gdax_open", "close": "Etheur_gdax_close", "volume": "Etheur_gdax_vol"})
-        G_BTC_EUR = G_BTC_EUR.rename(columns={"low": "Btceur_gdax_low", "high": "Btceur_gdax_high", "open": "Btceur_gdax_open", "close": "Btceur_gdax_close", "volume": "Btceur_gdax_vol"})
-        #G_LTC_EUR = G_LTC_EUR.rename(columns={"low": "Ltceur_gdax_low", "high": "Ltceur_gdax_high", "open": "Ltceur_gdax_open", "close": "Ltceur_gdax_close", "volume": "Ltceur_gdax_vol"})
-        K_ETH_EUR = K_ETH_EUR.rename(columns={"low": "Etheur_kraken_low", "high": "Etheur_kraken_high", "open": "Etheur_kraken_open", "close": "Etheur_kraken_close", "volume": "Etheur_kraken_vol"})
-        K_BTC_EUR = K_BTC_EUR.rename(columns={"low": "Btceur_kraken_low", "high": "Btceur_kraken_high", "open": "Btceur_kraken_open", "close": "Btceur_kraken_close", "volume": "Btceur_kraken_vol"})
-        #K_LTC_EUR = K_LTC_EUR.rename(columns={"low": "Ltceur_kraken_low", "high": "Ltceur_kraken_high", "open": "Ltceur_kraken_open", "close": "Ltceur_kraken_close", "volume": "Ltceur_kraken_vol"})
-        #ETH_trends = ETH_trends.rename(columns={"Worldwide": "Eth_search_worldwide", "US": "Eth_search_US", "GB": "Eth_search_GB", "FR": "Eth_search_FR", "DE": "Eth_search_DE", "RU": "Eth_search_RU", "KR": "Eth_search_KR"})
-        #BTC_trends = BTC_trends.rename(columns={"Worldwide": "Btc_search_worldwide", "US": "Btc_search_US", "GB": "Btc_search_GB", "FR": "Btc_search_FR", "DE": "Btc_search_DE", "RU": "Btc_search_RU", "KR": "Btc_search_KR"})
-        #LTC_trends = LTC_trends.rename(columns={"Worldwide": "Ltc_search_worldwide", "US": "Ltc_search_US", "GB": "Ltc_search_GB", "FR": "Ltc_search_FR", "DE": "Ltc_search_DE", "RU": "Ltc_search_RU", "KR": "Ltc_search_KR"})
-        #ETH_blockchain = ETH_blockchain.rename(columns={"Hashrate": "Eth_hashrate", "Addresses": "Eth_addresses", "Supply": "Eth_supply", "Trx_Fee": "Eth_trx_fee", "Daily_Trx": "Eth_daily_trx"})
-        #BTC_blockchain = BTC_blockchain.rename(columns={"Hashrate": "Btc_hashrate", "Addresses": "Btc_addresses", "Supply": "Btc_supply", "Trx_Fee": "Btc_trx_fee", "Daily_Trx": "Btc_daily_trx"})
-        #LTC_blockchain = LTC_blockchain.rename(columns={"Hashrate": "Ltc_hashrate", "Addresses": "Ltc_addresses", "Supply": "Ltc_supply", "Trx_Fee": "Ltc_trx_fee", "Daily_Trx": "Ltc_daily_trx"})
-        # Join dataframes together
-        input_data = None
-        input_data = G_ETH_USD
-        input_data = input_data.join(G_ETH_EUR)
-        input_data = input_data.join(K_ETH_USD)
-        input_data = input_data.join(K_ETH_EUR)
-        #input_data = input_data.join(ETH_reddit)
-        #input_data = input_data.join(ETH_trends)
-        #input_data = input_data.join(ETH_blockchain)
-
-        input_data = input_data.join(G_BTC_USD)
-        input_data = input_data.join(G_BTC_EUR)
-        input_data = input_data.join(K_BTC_USD)
-        input_data = input_data.join(K_BTC_EUR)
-
-        #input_data = input_data.join(BTC_reddit)
-        #input_data = input_data.join(BTC_trends)
-        #input_data = input_data.join(BTC_blockchain)
-
-        #input_data = input_data.join(G_LTC_USD)
-        #input_data = input_data.join(G_LTC_EUR)
-        #input_data = input_data.join(K_LTC_USD)
-        #input_data = input_data.join(K_LTC_EUR)
-        #input_data = input_data.join(LTC_reddit)
-        #input_data = input_data.join(LTC_trends)
-        #input_data = input_data.join(LTC_blockchain)
-
-        # Do interpolation for any blank cells
-        input_data = input_data.interpolate()
-        # Remove any data from outside correct time period
-        #print("slicing by dates")
-        input_data = input_data[input_data.index > start_time]
-        input_data = input_data[input_data.index < end_time]
-
-        # Create new fee per transaction column
+        :max_workers: number of downloads to run concurrently
+        :store: optional CandleStore so that only candles not downloaded by a previous run are fetched. Ignored with
+        :replay:
+        :sources: list of (feature prefix, source name, topic) feature sources. Defaults to config.FEATURE_SOURCES
+        :reddit_credentials: (client ID, client secret) tuple, needed if any reddit sources are used
+        :max_fill: longest gap in minutes to forward fill, for sources without their own fill_limit. Defaults to
+        config.MAX_FILL_MINUTES
+        :gap_masks: add a 0 / 1 {prefix}_{source}_gap feature per source marking the intervals it had no data for
+        :drop_gaps: drop intervals where any source is still missing after filling, e.g. during a long exchange outage.
+        By default they are linearly interpolated instead, as they were before gaps were forward filled. Either way the
+        number of intervals affected is printed
+        :replay: optional Preprocessing.replay.Replay, to record everything downloaded into its archive or to serve
+        the download from it without network access
+        Returns a dataframe indexed by candle start time, one row per interval
+        """
+        if replay is not None and store is not None:
+            # With a store, sources only request the ranges it is missing, so a recording could leave out stored ranges
+            # and a replay could ask for ranges split differently. Record and replay the whole period instead
+            print("ignoring the candle store while recording or replaying {}".format(replay.archive.path))
+            store = None
+
+        # Each exchange gets one rate limiter shared by all of its pairs, so pairs and exchanges download in parallel.
+        # All downloads share one pooled HTTP transport
+        resources = {
+            'store': store,
+            'transport': HTTPTransport(pool_size=max_workers) if replay is None else replay.transport(pool_size=max_workers),
+            'rate_limiters': {'kraken': TokenBucket(rate=1), 'gdax': TokenBucket(rate=2), 'search': TokenBucket(rate=1)},
+            'reddit_credentials': reddit_credentials,
+            'include_sentiment_analysis': include_sentiment_analysis,
+        }
+        feature_sources = processor.build_sources(sources or config.FEATURE_SOURCES, interval, start_time, end_time, resources, replay)
+
+        scheduler = DownloadScheduler(max_workers=max_workers)
+        for name, prefix, source, topic in feature_sources:
+            scheduler.add(name, source, topic)
+        with profiler.span('processor.download'):
+            downloads = scheduler.run()
+        print("request metrics: {}".format(resources['transport'].report()))
+
+        # Give every source unique column names, then align them all onto one candle grid covering the period
+        max_fill = config.MAX_FILL_MINUTES if max_fill is None else max_fill
+        input_data = processor.align_features(
+            [source.to_features(downloads[name], prefix) for name, prefix, source, topic in feature_sources],
+            start_time, end_time, interval,
+            fill_limits=[max_fill if source.fill_limit is None else source.fill_limit for name, prefix, source, topic in feature_sources],
+            gap_features=[source.gap_feature(prefix) for name, prefix, source, topic in feature_sources] if gap_masks else None)
+        missing = input_data.isnull().any(axis=1).values
+        if missing.any() and drop_gaps:
+            print("dropped {} intervals with gaps longer than the fill limit".format(missing.sum()))
+            input_data = input_data[~missing]
+        elif missing.any():
+            print("interpolated {} intervals with gaps longer than the fill limit".format(missing.sum()))
+            with profiler.span('processor.interpolate'):
+                input_data = input_data.interpolate()
+
+        # Create new fee per transaction column (needs the blockchain sources)
         #input_data['Eth_fee_per_trx'] = input_data['Eth_trx_fee'] / input_data['Eth_daily_trx']
         #input_data['Btc_fee_per_trx'] = input_data['Btc_trx_fee'] / input_data['Btc_daily_trx']
         #input_data['Ltc_fee_per_trx'] = input_data['Ltc_trx_fee'] / input_data['Ltc_daily_trx']
@@ -153,22 +107,165 @@ class processor:
 
         return input_data
 
-    def live_download(config, window = 1):
-        # Similar to historical_download but downloads for the most recent {window} intervals
-        # Returns dataframe in format XXX
-        pass
+    def build_sources(sources, interval, start_time, end_time, resources, replay=None):
+        """
+        Instantiates the preprocessors for a list of feature sources
+        :sources: list of (feature prefix, source name, topic), see config.FEATURE_SOURCES
+        :resources: shared objects passed to each Preprocessor subclass's create()
+        :replay: optional Preprocessing.replay.Replay that creates the preprocessors instead, see historical_download
+        Returns a list of (name, feature prefix, preprocessor, topic) tuples
+        """
+        feature_sources = []
+        for prefix, source_name, topic in sources:
+            if source_name not in SOURCE_TYPES:
+                raise ValueError("unknown feature source {}. Registered sources are {}".format(source_name, sorted(SOURCE_TYPES)))
+            if replay is None:
+                source = SOURCE_TYPES[source_name].create(interval, start_time, end_time, resources)
+            else:
+                source = replay.create(SOURCE_TYPES[source_name], interval, start_time, end_time, resources)
+            feature_sources.append(('{}_{}_{}'.format(prefix, source_name, topic), prefix, source, topic))
+        return feature_sources
+
+    @profiler.profiled('processor.align_features', rows=True)
+    def align_features(frames, start_time, end_time, interval, fill_limits=None, gap_features=None):
+        """
+        Aligns feature frames onto the common grid of candle start times strictly between :start_time: and :end_time:
+        (see Preprocessing.resample.align_to_grid). Every frame is snapped to the grid as int64 unix seconds and written
+        into its own columns of one pre-allocated array, so sources with different or irregular timestamps can't be
+        misaligned. Gaps are forward filled up to a limit rather than interpolated
+        :frames: list of dataframes indexed by datetime or unix seconds, with unique column names
+        :fill_limits: longest gap in minutes to forward fill for each frame. None fills gaps of any length
+        :gap_features: optional list of gap mask column names, one per frame, appended after the feature columns
+        Returns one dataframe indexed by candle start time with every frame's columns, in order
+        """
+        grid = resample.candle_grid(datetime_to_epoch(start_time), datetime_to_epoch(end_time), interval)
+        fill_limits = fill_limits or [None] * len(frames)
+        columns = [column for frame in frames for column in frame.columns]
+
+        values = np.empty((len(grid), len(columns) + (len(frames) if gap_features else 0)))
+        column = 0
+        for index, (frame, max_fill) in enumerate(zip(frames, fill_limits)):
+            width = frame.shape[1]
+            values[:, column:column + width], gaps = resample.align_to_grid(index_to_epoch(frame.index), frame.values, grid,
+                                                                            interval, max_fill)
+            if gap_features:
+                values[:, len(columns) + index] = gaps
+            column += width
+        return pd.DataFrame(values, index=pd.to_datetime(grid, unit='s'), columns=columns + list(gap_features or []))
 
-    def generate_x_y(data, target="Kraken_BTC_USD_Close", forecast_range=1 ):
+    def live_sources(interval, start_time=None, end_time=None, sources=None):
+        """
+        Market data sources used for live prediction, in the column order of historical_download. Only exchange sources
+        (those that can download individual candles) are used
+        :sources: list of (feature prefix, source name, topic). Defaults to config.FEATURE_SOURCES
+        Returns a list of (pair, preprocessor, topic) tuples, where pair is e.g. 'Ethusd_gdax'
+        """
+        start_time = start_time or datetime.utcnow()
+        end_time = end_time or start_time
+        resources = {
+            'transport': HTTPTransport(),
+            'rate_limiters': {'kraken': TokenBucket(rate=1), 'gdax': TokenBucket(rate=2)},
+        }
+        market_sources = [(prefix, source_name, topic) for prefix, source_name, topic in sources or config.FEATURE_SOURCES
+                          if hasattr(SOURCE_TYPES[source_name], 'download')]
+        return [('{}_{}'.format(prefix, source.source_name), source, topic)
+                for name, prefix, source, topic in processor.build_sources(market_sources, interval, start_time, end_time, resources)]
+
+    @profiler.profiled('processor.live_download')
+    def live_download(interval, window=1):
+        """
+        Downloads candles for the most recent {window} closed intervals, plus one more so that % changes can be calculated,
+        for every live source. Used to seed Classifier.live.LiveFeatures
+        :interval: candle interval in minutes
+        :window: number of intervals the model sees per prediction
+        Returns a dict of {pair: dataframe} indexed by unix timestamp in seconds
+        """
+        step = interval * 60
+        end = int(time.time()) // step * step
+        end_time = datetime.utcfromtimestamp(end)
+        start_time = datetime.utcfromtimestamp(end - (window + 1) * step)
+
+        scheduler = DownloadScheduler()
+        for pair, preprocessor, topic in processor.live_sources(interval, start_time, end_time):
+            scheduler.add(pair, preprocessor, topic)
+        candles = scheduler.run()
+        for pair, frame in candles.items():
+            frame.index = index_to_epoch(frame.index)
+        return candles
+
+    @profiler.profiled('processor.add_indicators')
+    def add_indicators(data, settings=None):
+        """
+        Indicator pipeline stage. Adds EMA, MACD, RSI, ATR, Bollinger width and high-low spread columns for every pair
+        in :data: (any column prefix with _low, _high and _close columns), computed for all pairs at once
+        :data: dataframe of raw prices as returned by historical_download
+        :settings: dict overriding indicators.DEFAULT_SETTINGS
+        Returns the dataframe with {pair}_{indicator} columns appended, grouped by indicator in the order of
+        indicators.INDICATORS, and a list of the added column names
+        """
+        pairs = processor.indicator_pairs(data.columns)
+        values = indicators.compute(*(data[[pair + field for pair in pairs]].values for field in ('_low', '_high', '_close')),
+                                    settings=settings)
+        columns = processor.indicator_columns(data.columns)
+        added = pd.DataFrame(np.hstack([values[name] for name in indicators.INDICATORS]), index=data.index, columns=columns)
+        return pd.concat([data, added], axis=1), columns
+
+    def indicator_pairs(columns):
+        """
+        Column prefixes of the pairs that add_indicators computes indicators for
+        """
+        names = set(columns)
+        return [column[:-len('_close')] for column in columns
+                if column.endswith('_close') and column[:-len('_close')] + '_low' in names and column[:-len('_close')] + '_high' in names]
+
+    def indicator_columns(columns):
+        """
+        Names of the columns add_indicators appends for a frame with :columns:
+        """
+        pairs = processor.indicator_pairs(columns)
+        return ['{}_{}'.format(pair, name) for name in indicators.INDICATORS for pair in pairs]
+
+    def gap_columns(columns):
+        """
+        Gap mask columns added by historical_download with gap_masks=True
+        """
+        return [column for column in columns if column.endswith('_gap')]
+
+    def feature_columns(columns, indicators=None):
+        """
+        Names of the feature columns generate_x_y produces for a frame with :columns:, in order: the % change columns,
+        then gap masks, then indicators
+        """
+        gaps = processor.gap_columns(columns)
+        return ([column for column in columns if column not in gaps] + gaps +
+                (processor.indicator_columns(columns) if indicators else []))
+
+    @profiler.profiled('processor.generate_x_y')
+    def generate_x_y(data, target="Btcusd_kraken_close", forecast_range=1, indicators=None):
         """
         Converts training data into training data and labels, with label currently fixed at 1 interval in the future.
+        :indicators: True or a dict of indicator settings to add technical indicator features (see add_indicators).
+        Indicators are kept as they are rather than converted to % change, and rows before they are warmed up are dropped
+        Gap mask columns are also kept as they are, and moved after the other columns (see feature_columns)
         Returns a numpy array tuple of (train_data, training_target, target_actuals) where target actuals was the $ or EUR value
         """
         # Save target actuals for later comparison
         target_actuals = data[target]
         target_actuals = np.array(target_actuals)
 
-        # Convert everything except trx_fee / trx, reddit sentiment to % change
-        data = data.pct_change()
+        # Convert everything except trx_fee / trx, reddit sentiment, gap masks and indicators to % change
+        start = 1
+        unchanged = processor.gap_columns(data.columns)
+        if indicators:
+            settings = indicators if isinstance(indicators, dict) else None
+            data, indicator_columns = processor.add_indicators(data, settings)
+            unchanged += indicator_columns
+            start = max(start, indicator_warmup(settings))
+        if unchanged:
+            changes = data.drop(unchanged, axis=1).pct_change()
+            data = pd.concat([changes, data[unchanged]], axis=1)
+        else:
+            data = data.pct_change()
         #data[['Eth_fee_per_trx', 'Btc_fee_per_trx', 'Ltc_fee_per_trx']] = data[['Eth_fee_per_trx', 'Btc_fee_per_trx', 'Ltc_fee_per_trx']]
 
         # Splits dataset into data and targets
@@ -176,4 +273,68 @@ class processor:
         target_df = data[target].shift(-forecast_range)
         target_data = np.array(target_df)
 
-        return train_data[1:], target_data[1:-forecast_range], target_actuals[1:-1] # Remove first line since for % growth it will be NaN. Remove last line for target since it's also NaN because of shifting
+        return train_data[start:], target_data[start:-forecast_range], target_actuals[start:-1] # Remove first line since for % growth it will be NaN. Remove last line for target since it's also NaN because of shifting
+
+    @profiler.profiled('processor.save_dataset', rows=True)
+    def save_dataset(path, data, interval, target="Btcusd_kraken_close", forecast_range=1, indicators=None):
+        """
+        Converts downloaded data with generate_x_y and appends it to a float32 memory-mapped dataset (see
+        Classifier.dataset), creating the dataset if needed
+        :path: dataset directory
+        :data: dataframe as returned by historical_download
+        :interval: candle interval in minutes, recorded in the dataset header
+        Returns the Dataset
+        """
+        train_data, targets, actuals = processor.generate_x_y(data, target, forecast_range, indicators)
+        columns = processor.feature_columns(data.columns, indicators)
+        end = len(data) - forecast_range
+        with DatasetWriter(path, columns, interval, target) as writer:
+            writer.append(train_data, targets, actuals[:len(train_data)], data.index[end - len(train_data):end])
+        return Dataset(path)
+
+    def generate_sequences(data, targets, lookback, forecast_range=1):
+        """
+        Converts 2D time-ordered data into (samples, timesteps, features) sequences for the LSTM model without copying.
+        Each sample is a read-only strided view of :lookback: consecutive rows of :data:
+        :data: 2D numpy array of features, one row per interval (e.g. the % change data before shifting)
+        :targets: 1D numpy array of target values aligned row for row with :data:
+        :lookback: number of intervals in each input sequence
+        :forecast_range: how many intervals after the last row of a sequence its label is taken from
+        Returns a tuple of (sequences, labels). Sequence i covers rows i to i + lookback - 1 and its label is
+        targets[i + lookback - 1 + forecast_range]
+        """
+        data = np.ascontiguousarray(data)
+        samples = len(data) - lookback - forecast_range + 1
+        if samples <= 0:
+            raise ValueError("Need more than {} rows for lookback {} and forecast range {}".format(lookback + forecast_range - 1, lookback, forecast_range))
+
+        row_stride, feature_stride = data.strides
+        sequences = as_strided(data, shape=(samples, lookback, data.shape[1]),
+                               strides=(row_stride, row_stride, feature_stride), writeable=False)
+        labels = np.asarray(targets)[lookback - 1 + forecast_range:]
+        return sequences, labels
+
+    def sequence_generator(data, targets, lookback, forecast_range=1, batch_size=64, shuffle=True, seed=None):
+        """
+        Endless generator of (sequences, labels) batches for Keras fit_generator. Only one batch is materialised at a time,
+        so memory use stays flat however long the dataset is. Use processor.sequence_steps for steps_per_epoch
+        :data: 2D numpy array of features (can be a memory-mapped array)
+        :targets: 1D numpy array of targets aligned with :data:
+        :shuffle: shuffle the order of samples every epoch
+        """
+        sequences, labels = processor.generate_sequences(data, targets, lookback, forecast_range)
+        random = np.random.RandomState(seed)
+        while True:
+            order = random.permutation(len(labels)) if shuffle else np.arange(len(labels))
+            for batch_start in range(0, len(order), batch_size):
+                batch = order[batch_start:batch_start + batch_size]
+                if not shuffle:
+                    batch = slice(batch[0], batch[-1] + 1)
+                yield np.ascontiguousarray(sequences[batch]), labels[batch]
+
+    def sequence_steps(data, lookback, forecast_range=1, batch_size=64):
+        """
+        Number of batches per epoch produced by processor.sequence_generator
+        """
+        samples = len(data) - lookback - forecast_range + 1
+        return int(np.ceil(samples / float(batch_size)))
@@ -0,0 +1,216 @@
+"""
+Dataset
+On-disk training dataset format. Features, targets and target actuals are kept as flat float32 binary files that are
+appended to in place and memory-mapped read-only on load, alongside a small JSON header with the column names,
+interval, time range and normalisation statistics. Opening a dataset reads only the header, and training reads it
+lazily in chunks, so nothing is materialised in RAM up front
+"""
+import json
+import os
+import numpy as np
+import pandas as pd
+
+from Classifier.scaler import Scaler
+from Preprocessing.candle_store import epoch_to_datetime, index_to_epoch
+
+FILES = {'data': 'data.f4', 'targets': 'targets.f4', 'actuals': 'actuals.f4', 'times': 'times.i8'}
+
+
+def read_meta(path):
+    """
+    Reads a dataset's header, or returns None if there is no dataset at :path:
+    """
+    meta_path = os.path.join(path, 'meta.json')
+    if not os.path.isfile(meta_path):
+        return None
+    with open(meta_path) as f:
+        return json.load(f)
+
+
+def scalers(meta):
+    """
+    Feature and target Scalers from a dataset header's statistics
+    """
+    stats = meta['stats']
+    if stats is None:
+        return Scaler(), Scaler()
+    return (Scaler(stats['count'], stats['mean'], stats['m2']),
+            Scaler([stats['target_count']], [stats['target_mean']], [stats['target_m2']]))
+
+
+class DatasetWriter:
+    """
+    Appends rows to a dataset, creating it if needed. Can be reopened later to append more rows, e.g. as new candles
+    are downloaded
+    """
+    def __init__(self, path, columns=None, interval=None, target=None):
+        """
+        :path: dataset directory. Created if needed
+        :columns: feature column names. Required for a new dataset, checked against an existing one
+        :interval: candle interval in minutes
+        :target: name of the target column
+        """
+        self.path = path
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        self.meta = read_meta(path)
+        if self.meta is None:
+            if columns is None:
+                raise ValueError("columns are needed to create a new dataset at {}".format(path))
+            self.meta = {'columns': list(columns), 'interval': interval, 'target': target, 'rows': 0,
+                         'start_time': None, 'end_time': None, 'stats': None}
+        elif columns is not None and list(columns) != self.meta['columns']:
+            raise ValueError("columns don't match the existing dataset at {}".format(path))
+
+        # Normalisation statistics are accumulated as rows are appended, so no separate pass over the data is needed
+        self.scaler, self.target_scaler = scalers(self.meta)
+
+    def append(self, data, targets, actuals=None, times=None):
+        """
+        Appends rows to the dataset files
+        :data: 2D array of (rows, features)
+        :targets: 1D array of targets, one per row
+        :actuals: optional 1D array of target actual values (e.g. prices), one per row
+        :times: optional row times, as datetimes or unix seconds
+        """
+        data = np.asarray(data, dtype=np.float32)
+        if data.ndim != 2 or data.shape[1] != len(self.meta['columns']):
+            raise ValueError("expected {} feature columns, got data of shape {}".format(len(self.meta['columns']), data.shape))
+        rows = len(data)
+        if times is None:
+            times = np.zeros(rows, dtype=np.int64)
+        else:
+            times = index_to_epoch(pd.Index(times))
+        columns = {'data': data, 'targets': np.asarray(targets, dtype=np.float32),
+                   'actuals': np.full(rows, np.nan, dtype=np.float32) if actuals is None else np.asarray(actuals, dtype=np.float32),
+                   'times': times}
+        for name, values in columns.items():
+            if len(values) != rows:
+                raise ValueError("{} has {} rows, data has {}".format(name, len(values), rows))
+            with open(os.path.join(self.path, FILES[name]), 'ab') as f:
+                f.write(np.ascontiguousarray(values).tobytes())
+
+        self.scaler.partial_fit(data)
+        self.target_scaler.partial_fit(columns['targets'])
+        self.meta['rows'] += rows
+        if times.any():
+            start, end = epoch_to_datetime(int(times.min())), epoch_to_datetime(int(times.max()))
+            self.meta['start_time'] = min(filter(None, [self.meta['start_time'], str(start)]))
+            self.meta['end_time'] = max(filter(None, [self.meta['end_time'], str(end)]))
+        self.write_meta()
+
+    def write_meta(self):
+        """
+        Writes the header, including normalisation statistics, so readers see the rows appended so far
+        """
+        if self.scaler.count is not None:
+            self.meta['stats'] = {
+                'count': self.scaler.count.tolist(), 'mean': self.scaler.mean.tolist(), 'm2': self.scaler.m2.tolist(),
+                'std': self.scaler.std.tolist(),
+                'target_count': float(self.target_scaler.count[0]), 'target_mean': float(self.target_scaler.mean[0]),
+                'target_m2': float(self.target_scaler.m2[0]), 'target_std': float(self.target_scaler.std[0]),
+            }
+        tmp_path = os.path.join(self.path, 'meta.json.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(self.meta, f)
+        os.replace(tmp_path, os.path.join(self.path, 'meta.json'))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.write_meta()
+
+
+class Dataset:
+    """
+    Read-only, memory-mapped view of a dataset written by DatasetWriter
+    """
+    def __init__(self, path):
+        """
+        :path: dataset directory
+        """
+        self.path = path
+        self.meta = read_meta(path)
+        if self.meta is None:
+            raise IOError("no dataset at {}".format(path))
+        self.columns = self.meta['columns']
+        self.interval = self.meta['interval']
+        self.rows = self.meta['rows']
+        # Feature and target scalers with the statistics of every row in the dataset
+        self.scaler, self.target_scaler = scalers(self.meta)
+        self.target_mean = float(self.target_scaler.mean[0]) if self.rows else 0.0
+        self.target_std = float(self.target_scaler.std[0]) if self.rows else 1.0
+        self.arrays = {}
+
+    def __len__(self):
+        return self.rows
+
+    def array(self, name):
+        """
+        Memory-maps one of the dataset files on first use. Only the header's row count is mapped, so rows appended
+        while the dataset is open are not seen until it is reopened
+        """
+        if name not in self.arrays:
+            dtype = np.int64 if name == 'times' else np.float32
+            shape = (self.rows, len(self.columns)) if name == 'data' else (self.rows,)
+            if self.rows == 0:
+                self.arrays[name] = np.zeros(shape, dtype=dtype)
+            else:
+                self.arrays[name] = np.memmap(os.path.join(self.path, FILES[name]), dtype=dtype, mode='r', shape=shape)
+        return self.arrays[name]
+
+    @property
+    def data(self):
+        return self.array('data')
+
+    @property
+    def targets(self):
+        return self.array('targets')
+
+    @property
+    def actuals(self):
+        return self.array('actuals')
+
+    @property
+    def times(self):
+        return self.array('times')
+
+    def chunks(self, chunk_size=65536, start=0, end=None):
+        """
+        Yields (start row, data, targets) chunks of consecutive rows. Each chunk is a view on the mapped files, so only the
+        pages touched are read from disk
+        """
+        end = self.rows if end is None else end
+        for chunk_start in range(start, end, chunk_size):
+            chunk_end = min(chunk_start + chunk_size, end)
+            yield chunk_start, self.data[chunk_start:chunk_end], self.targets[chunk_start:chunk_end]
+
+    def batch_generator(self, batch_size=64, chunk_size=65536, shuffle=True, seed=None, normalize_targets=True, scaler=None):
+        """
+        Endless (data, targets) batch generator for Keras fit_generator, reading one chunk at a time. With :shuffle:
+        the chunk order and the rows within each chunk are shuffled every epoch. Use steps() for steps_per_epoch
+        :normalize_targets: scale targets with the dataset's target mean and standard deviation
+        :scaler: optional feature Scaler, applied in place to each chunk as it is read, e.g. self.scaler
+        """
+        random = np.random.RandomState(seed)
+        starts = np.arange(0, self.rows, chunk_size)
+        while True:
+            for chunk_start in (random.permutation(starts) if shuffle else starts):
+                data = np.array(self.data[chunk_start:chunk_start + chunk_size])
+                if scaler is not None:
+                    scaler.transform(data, out=data)
+                targets = np.array(self.targets[chunk_start:chunk_start + chunk_size])
+                if normalize_targets:
+                    targets = (targets - self.target_mean) / self.target_std
+                order = random.permutation(len(data)) if shuffle else np.arange(len(data))
+                for batch_start in range(0, len(order), batch_size):
+                    batch = order[batch_start:batch_start + batch_size]
+                    yield data[batch], targets[batch]
+
+    def steps(self, batch_size=64, chunk_size=65536):
+        """
+        Number of batches per epoch produced by batch_generator
+        """
+        full_chunks, remainder = divmod(self.rows, chunk_size)
+        return full_chunks * int(np.ceil(chunk_size / float(batch_size))) + int(np.ceil(remainder / float(batch_size)))
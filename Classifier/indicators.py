@@ -0,0 +1,275 @@
+"""
+Technical Indicators
+EMA, MACD, RSI, ATR, Bollinger band width and high-low spread for many pairs at once. Inputs are 2D arrays with one
+row per candle and one column per pair (1D arrays are treated as a single pair). The exponential averages are computed
+as first-order recursive filters with scipy.signal.lfilter over the whole array, so there are no per-candle Python
+loops. IndicatorState gives the same values incrementally, in O(1) per candle, for live prediction.
+
+Gaps (NaN) are forward filled before filtering. Rows before a column's first value are NaN in the output.
+"""
+import numpy as np
+from scipy.signal import lfilter
+
+# Feature names in the order compute() and IndicatorState.update return them
+INDICATORS = ['ema', 'macd', 'macd_signal', 'macd_hist', 'rsi', 'atr', 'bb_width', 'spread']
+
+DEFAULT_SETTINGS = {
+    'ema': 20, # span
+    'macd': (12, 26, 9), # fast span, slow span, signal span
+    'rsi': 14, # period
+    'atr': 14, # period
+    'bollinger': (20, 2.0), # period, number of standard deviations
+}
+
+
+def as_columns(x):
+    """
+    Returns :x: as a float 2D (rows, columns) array, and whether it was 1D
+    """
+    x = np.asarray(x, dtype=np.float64)
+    return x.reshape(len(x), -1), x.ndim == 1
+
+
+def fill_gaps(x):
+    """
+    Forward fills NaNs in each column of a 2D array, and fills each column's leading NaNs with its first value so that
+    recursive filters start cleanly
+    Returns a tuple of (filled array, boolean mask of the leading rows that had no value yet)
+    """
+    valid = ~np.isnan(x)
+    if valid.all():
+        return x, np.zeros(x.shape, dtype=bool)
+    rows = np.where(valid, np.arange(len(x))[:, None], 0)
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    columns = np.arange(x.shape[1])
+    filled = x[rows, columns]
+    first = valid.argmax(axis=0)
+    leading = np.arange(len(x))[:, None] < first
+    filled = np.where(leading, x[first, columns], filled)
+    return filled, leading
+
+
+def ema(x, span=None, alpha=None):
+    """
+    Exponential moving average, y[t] = alpha * x[t] + (1 - alpha) * y[t - 1] starting from y[0] = x[0]. Matches pandas
+    ewm(adjust=False)
+    :span: sets alpha = 2 / (span + 1)
+    :alpha: smoothing factor, e.g. 1 / period for Wilder's smoothing
+    """
+    x, one_d = as_columns(x)
+    if alpha is None:
+        alpha = 2.0 / (span + 1)
+    filled, leading = fill_gaps(x)
+    y, _ = lfilter([alpha], [1, alpha - 1], filled, axis=0, zi=(1 - alpha) * filled[:1])
+    y[leading] = np.nan
+    return y.ravel() if one_d else y
+
+
+def rolling_mean(x, period):
+    """
+    Simple moving average over :period: rows, as an FIR filter. The first period - 1 rows are NaN
+    """
+    x, one_d = as_columns(x)
+    filled, leading = fill_gaps(x)
+    y = lfilter(np.full(period, 1.0 / period), [1], filled, axis=0)
+    y[:period - 1] = np.nan
+    y[leading] = np.nan
+    return y.ravel() if one_d else y
+
+
+def macd(close, fast=12, slow=26, signal=9):
+    """
+    Moving average convergence divergence
+    Returns a tuple of (macd line, signal line, histogram)
+    """
+    line = ema(close, fast) - ema(close, slow)
+    signal_line = ema(line, signal)
+    return line, signal_line, line - signal_line
+
+
+def rsi(close, period=14):
+    """
+    Relative strength index (0 to 100) with Wilder's smoothing of average gains and losses. The first row is NaN
+    """
+    close, one_d = as_columns(close)
+    close, leading = fill_gaps(close)
+    change = np.diff(close, axis=0)
+    gains = ema(np.maximum(change, 0), alpha=1.0 / period)
+    losses = ema(np.maximum(-change, 0), alpha=1.0 / period)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        index = np.where(losses == 0, 100.0, 100 - 100 / (1 + gains / losses))
+    index[np.isnan(gains)] = np.nan
+    index = np.vstack([np.full((1, close.shape[1]), np.nan), index])
+    index[leading] = np.nan
+    return index.ravel() if one_d else index
+
+
+def true_range(high, low, close):
+    """
+    Largest of high - low and the distances from the previous close to the high and low. The first row is high - low
+    """
+    high, one_d = as_columns(high)
+    low, close = as_columns(low)[0], as_columns(close)[0]
+    close, leading = fill_gaps(close)
+    previous = np.vstack([close[:1], close[:-1]])
+    ranges = np.maximum(high - low, np.maximum(np.abs(high - previous), np.abs(low - previous)))
+    ranges[0] = high[0] - low[0]
+    ranges[leading] = np.nan
+    return ranges.ravel() if one_d else ranges
+
+
+def atr(high, low, close, period=14):
+    """
+    Average true range with Wilder's smoothing
+    """
+    return ema(true_range(high, low, close), alpha=1.0 / period)
+
+
+def bollinger_width(close, period=20, deviations=2.0):
+    """
+    Bollinger band width relative to the moving average, 2 * deviations * std / mean, using the population standard
+    deviation over :period: rows. Values are offset by each column's first value before squaring to avoid cancellation
+    """
+    close, one_d = as_columns(close)
+    filled, leading = fill_gaps(close)
+    offset = filled - filled[:1]
+    mean = rolling_mean(offset, period)
+    variance = np.maximum(rolling_mean(offset ** 2, period) - mean ** 2, 0)
+    width = 2 * deviations * np.sqrt(variance) / (mean + filled[:1])
+    width[leading] = np.nan
+    return width.ravel() if one_d else width
+
+
+def spread(high, low, close):
+    """
+    High-low range relative to the close
+    """
+    return (np.asarray(high, dtype=np.float64) - low) / close
+
+
+def compute(low, high, close, settings=None):
+    """
+    Computes every indicator in INDICATORS for all pairs at once, scaled so that they are comparable across pairs and
+    price levels: ema as close / ema - 1, macd lines and atr as a fraction of the close, rsi from 0 to 1
+    :low: :high: :close: 2D arrays of (candles, pairs)
+    :settings: dict overriding DEFAULT_SETTINGS
+    Returns a dict of {indicator name: 2D array of (candles, pairs)}
+    """
+    settings = dict(DEFAULT_SETTINGS, **(settings or {}))
+    close = as_columns(close)[0]
+    low, high = as_columns(low)[0], as_columns(high)[0]
+
+    line, signal_line, histogram = macd(close, *settings['macd'])
+    return {
+        'ema': close / ema(close, settings['ema']) - 1,
+        'macd': line / close,
+        'macd_signal': signal_line / close,
+        'macd_hist': histogram / close,
+        'rsi': rsi(close, settings['rsi']) / 100,
+        'atr': atr(high, low, close, settings['atr']) / close,
+        'bb_width': bollinger_width(close, *settings['bollinger']),
+        'spread': spread(high, low, close),
+    }
+
+
+def warmup(settings=None):
+    """
+    Number of leading rows of compute() output that are NaN
+    """
+    settings = dict(DEFAULT_SETTINGS, **(settings or {}))
+    return max(settings['bollinger'][0] - 1, 1)
+
+
+class IndicatorState:
+    """
+    Incremental version of compute() for live prediction. Each update takes one candle per pair and returns the next
+    row of every indicator in O(1), vectorized across pairs
+    """
+    def __init__(self, pairs, settings=None):
+        """
+        :pairs: number of pairs
+        :settings: dict overriding DEFAULT_SETTINGS
+        """
+        self.settings = dict(DEFAULT_SETTINGS, **(settings or {}))
+        fast, slow, signal = self.settings['macd']
+        self.alpha = {'ema': 2.0 / (self.settings['ema'] + 1), 'fast': 2.0 / (fast + 1), 'slow': 2.0 / (slow + 1),
+                      'signal': 2.0 / (signal + 1), 'rsi': 1.0 / self.settings['rsi'], 'atr': 1.0 / self.settings['atr']}
+        self.period, self.deviations = self.settings['bollinger']
+
+        self.count = 0
+        self.values = np.full((len(INDICATORS), pairs), np.nan)
+        self.close = np.full(pairs, np.nan) # Previous close
+        self.averages = {name: np.full(pairs, np.nan) for name in ('ema', 'fast', 'slow', 'signal', 'gain', 'loss', 'atr')}
+        # Bollinger window, kept as offsets from the first close with running sums
+        self.window = np.zeros((self.period, pairs))
+        self.window_sum = np.zeros(pairs)
+        self.window_squares = np.zeros(pairs)
+        self.offset = None
+
+    def smooth(self, name, value, alpha):
+        """
+        One step of an exponential average, starting from the first value
+        """
+        average = self.averages[name]
+        if self.count == 0 or (name in ('gain', 'loss') and self.count == 1):
+            average[:] = value
+        else:
+            average += alpha * (value - average)
+        return average
+
+    def seed(self, low, high, close):
+        """
+        Runs the state through historical candles so the indicators are warmed up
+        :low: :high: :close: 2D arrays of (candles, pairs)
+        Returns a 3D array of (candles, indicators, pairs) with the indicator rows for the history
+        """
+        return np.array([self.update(*row).copy() for row in zip(as_columns(low)[0], as_columns(high)[0], as_columns(close)[0])])
+
+    def update(self, low, high, close):
+        """
+        Adds one candle for each pair
+        :low: :high: :close: 1D arrays with one value per pair
+        Returns a 2D array of (indicators, pairs) in the order of INDICATORS, scaled as in compute()
+        """
+        low, high, close = (np.asarray(value, dtype=np.float64) for value in (low, high, close))
+        alpha = self.alpha
+        values = self.values
+
+        if self.count == 0:
+            ranges = high - low
+            self.offset = close.copy()
+        else:
+            change = close - self.close
+            gain = self.smooth('gain', np.maximum(change, 0), alpha['rsi'])
+            loss = self.smooth('loss', np.maximum(-change, 0), alpha['rsi'])
+            with np.errstate(divide='ignore', invalid='ignore'):
+                values[4] = np.where(loss == 0, 1.0, 1 - 1 / (1 + gain / loss))
+            ranges = np.maximum(high - low, np.maximum(np.abs(high - self.close), np.abs(low - self.close)))
+
+        values[0] = close / self.smooth('ema', close, alpha['ema']) - 1
+        line = self.smooth('fast', close, alpha['fast']) - self.smooth('slow', close, alpha['slow'])
+        signal_line = self.smooth('signal', line, alpha['signal'])
+        values[1] = line / close
+        values[2] = signal_line / close
+        values[3] = (line - signal_line) / close
+        values[5] = self.smooth('atr', ranges, alpha['atr']) / close
+        values[7] = (high - low) / close
+
+        # Bollinger width from running sums over a ring buffer. The sums are recomputed exactly each time the buffer
+        # wraps so rounding errors cannot accumulate
+        position = self.count % self.period
+        deviation = close - self.offset
+        self.window_sum += deviation - self.window[position]
+        self.window_squares += deviation ** 2 - self.window[position] ** 2
+        self.window[position] = deviation
+        if position == self.period - 1:
+            self.window_sum = self.window.sum(axis=0)
+            self.window_squares = (self.window ** 2).sum(axis=0)
+        if self.count >= self.period - 1:
+            mean = self.window_sum / self.period
+            variance = np.maximum(self.window_squares / self.period - mean ** 2, 0)
+            values[6] = 2 * self.deviations * np.sqrt(variance) / (mean + self.offset)
+
+        self.close = close
+        self.count += 1
+        return values
@@ -0,0 +1,268 @@
+"""
+Live Prediction
+Streaming components for running a trained model on live candles. Keeps a ring buffer of the most recent candles for each
+pair, updates the % change features incrementally as each candle closes and calls the model once per interval on a
+pre-allocated input tensor, instead of re-downloading and re-processing the whole window every tick
+"""
+import time
+import numpy as np
+from datetime import datetime, timedelta
+
+from Classifier.indicators import INDICATORS, IndicatorState
+from Preprocessing.candle_store import index_to_epoch
+
+
+class CandleBuffer:
+    """
+    Fixed size ring buffer of the last :size: candles for one pair, holding both the raw candles and their % change
+    from the previous candle
+    """
+    def __init__(self, size, fields=5):
+        """
+        :size: number of candles to keep
+        :fields: values per candle, [low, high, open, close, volume] by default
+        """
+        self.size = size
+        self.raw = np.full((size, fields), np.nan)
+        self.pct = np.full((size, fields), np.nan)
+        self.times = np.zeros(size, dtype=np.int64)
+        self.head = 0 # Index the next candle is written to
+        self.count = 0 # Total candles pushed
+
+    def push(self, timestamp, candle):
+        """
+        Adds a closed candle and computes its % change against the previous one in O(1)
+        :timestamp: candle period start, in unix seconds
+        :candle: array-like of [low, high, open, close, volume]
+        """
+        previous = self.raw[self.head - 1]
+        self.raw[self.head] = candle
+        np.divide(self.raw[self.head], previous, out=self.pct[self.head])
+        self.pct[self.head] -= 1
+        self.times[self.head] = timestamp
+        self.head = (self.head + 1) % self.size
+        self.count += 1
+
+    @property
+    def last_time(self):
+        return self.times[self.head - 1] if self.count else None
+
+    def copy_pct_to(self, out):
+        """
+        Writes the % change rows in chronological order into :out:, an array of shape (size, fields), without allocating
+        """
+        tail = self.size - self.head
+        out[:tail] = self.pct[self.head:]
+        out[tail:] = self.pct[:self.head]
+
+
+class LiveFeatures:
+    """
+    Incrementally maintained model input for a fixed, ordered set of pairs. The feature order is the column order of
+    processor.historical_download, i.e. [low, high, open, close, volume] for each pair in turn, followed by the
+    indicator columns of processor.add_indicators if :indicators: is set
+    """
+    def __init__(self, pairs, lookback, sequence=True, fields=5, indicators=None, scaler=None):
+        """
+        :pairs: ordered list of pair names, matching the column order the model was trained on
+        :lookback: number of intervals the model sees per prediction
+        :sequence: build (1, lookback, features) input for the LSTM. If False, input is the latest (1, features) row for the
+        DNN, which scores one interval at a time
+        :indicators: True or a dict of indicator settings, as passed to processor.generate_x_y for training
+        :scaler: optional feature Scaler the model was trained with, e.g. Neural_Net.feature_scaler. Applied to the
+        window in place after each update
+        """
+        self.pairs = list(pairs)
+        self.lookback = lookback
+        self.fields = fields
+        self.buffers = {pair: CandleBuffer(lookback, fields) for pair in self.pairs}
+        self.offsets = {pair: i * fields for i, pair in enumerate(self.pairs)}
+        self.indicators = None
+        if indicators:
+            # Indicator rows for the window, as a ring buffer like the candles
+            self.indicators = IndicatorState(len(self.pairs), indicators if isinstance(indicators, dict) else None)
+            self.indicator_rows = np.full((lookback, len(INDICATORS) * len(self.pairs)), np.nan)
+            self.indicator_head = 0
+        indicator_columns = len(INDICATORS) * len(self.pairs) if indicators else 0
+        self.window = np.zeros((lookback, len(self.pairs) * fields + indicator_columns))
+        self.input = self.window[np.newaxis] if sequence else self.window[-1:] # View, so filling window fills input
+        self.pending = {} # timestamp -> number of pairs whose candle has arrived
+        self.scaler = scaler
+
+    def seed(self, candles):
+        """
+        Primes the buffers from historical candles so that predictions can start on the first live tick
+        :candles: dict of {pair: dataframe} with columns ['low', 'high', 'open', 'close', 'volume'] indexed by unix seconds
+        """
+        for pair in self.pairs:
+            frame = candles[pair]
+            for timestamp, row in zip(frame.index[-self.lookback - 1:], frame.values[-self.lookback - 1:]):
+                self.buffers[pair].push(int(timestamp), row)
+        if self.indicators is not None:
+            # Indicators warm up on all of the history given, so seed with more candles than the lookback
+            rows = min(len(candles[pair]) for pair in self.pairs)
+            history = np.stack([candles[pair].values[-rows:] for pair in self.pairs], axis=2)
+            for values in self.indicators.seed(history[:, 0], history[:, 1], history[:, 3])[-self.lookback:]:
+                self.push_indicators(values)
+            self.copy_indicators()
+
+    def push_indicators(self, values):
+        """
+        Adds one (indicators, pairs) row of indicator values to the ring buffer
+        """
+        self.indicator_rows[self.indicator_head] = values.ravel()
+        self.indicator_head = (self.indicator_head + 1) % self.lookback
+
+    def copy_indicators(self):
+        """
+        Writes the indicator rows in chronological order into the window, after the candle columns
+        """
+        start = len(self.pairs) * self.fields
+        tail = self.lookback - self.indicator_head
+        self.window[:tail, start:] = self.indicator_rows[self.indicator_head:]
+        self.window[tail:, start:] = self.indicator_rows[:self.indicator_head]
+
+    def update(self, pair, timestamp, candle):
+        """
+        Adds a closed candle for :pair:. Returns True once every pair has a candle for :timestamp:, at which point
+        self.input holds the up to date model input
+        """
+        buffer = self.buffers[pair]
+        if buffer.last_time is not None and timestamp <= buffer.last_time:
+            return False # Duplicate or late candle
+        buffer.push(timestamp, candle)
+        self.pending[timestamp] = self.pending.get(timestamp, 0) + 1
+        if self.pending[timestamp] < len(self.pairs):
+            return False
+
+        del self.pending[timestamp]
+        for pair in self.pairs:
+            offset = self.offsets[pair]
+            self.buffers[pair].copy_pct_to(self.window[:, offset:offset + self.fields])
+        if self.indicators is not None:
+            latest = np.array([self.buffers[pair].raw[self.buffers[pair].head - 1] for pair in self.pairs])
+            self.push_indicators(self.indicators.update(latest[:, 0], latest[:, 1], latest[:, 3]))
+            self.copy_indicators()
+        if self.scaler is not None:
+            # The whole window is rewritten every update, so it can be scaled in place
+            self.scaler.transform(self.window, out=self.window)
+        return True
+
+    @property
+    def ready(self):
+        # The first candle of each pair has no % change, so one extra candle is needed to fill the window
+        return all(buffer.count > self.lookback for buffer in self.buffers.values())
+
+
+class LivePredictor:
+    """
+    Runs a model against a candle feed, predicting once per completed interval and recording latency from candle
+    arrival to prediction
+    """
+    def __init__(self, model, features, on_prediction=None, steps=1, target_index=None):
+        """
+        :model: any object with a predict(array) method, e.g. a Keras model. For :steps: > 1 it must also provide
+        forecast(array, steps, target_index), as Neural_Net does
+        :features: LiveFeatures instance, optionally seeded with history
+        :on_prediction: optional callback f(timestamp, prediction)
+        :steps: number of intervals to forecast each tick
+        :target_index: feature column of the predicted target, needed when :steps: > 1
+        """
+        self.model = model
+        self.features = features
+        self.on_prediction = on_prediction
+        self.steps = steps
+        self.target_index = target_index
+        self.latencies = []
+
+    def run(self, feed, max_ticks=None):
+        """
+        Consumes (pair, timestamp, candle) events from :feed: until it is exhausted or :max_ticks: predictions are made
+        Returns a list of (timestamp, prediction) tuples
+        """
+        predictions = []
+        for pair, timestamp, candle in feed:
+            received = time.perf_counter()
+            if not self.features.update(pair, timestamp, candle) or not self.features.ready:
+                continue
+            if self.steps > 1:
+                prediction = self.model.forecast(self.features.input, self.steps, self.target_index)
+            else:
+                prediction = self.model.predict(self.features.input)
+            self.latencies.append(time.perf_counter() - received)
+            predictions.append((timestamp, prediction))
+            if self.on_prediction is not None:
+                self.on_prediction(timestamp, prediction)
+            if max_ticks is not None and len(predictions) >= max_ticks:
+                break
+        return predictions
+
+    def latency_report(self):
+        """
+        Returns a dict of latency statistics in milliseconds
+        """
+        latencies = np.array(self.latencies) * 1000
+        if len(latencies) == 0:
+            return {'ticks': 0}
+        return {
+            'ticks': len(latencies),
+            'p50_ms': float(np.percentile(latencies, 50)),
+            'p99_ms': float(np.percentile(latencies, 99)),
+            'max_ms': float(latencies.max()),
+        }
+
+
+class ReplayFeed:
+    """
+    Stub feed replaying recorded candles in time order, optionally paced in real time
+    """
+    def __init__(self, candles, pace=None):
+        """
+        :candles: dict of {pair: dataframe} with columns ['low', 'high', 'open', 'close', 'volume'] indexed by unix seconds
+        :pace: seconds to wait between intervals, or None to replay as fast as possible
+        """
+        self.candles = candles
+        self.pace = pace
+
+    def __iter__(self):
+        events = []
+        for pair, frame in self.candles.items():
+            events += [(int(timestamp), pair, row) for timestamp, row in zip(frame.index, frame.values)]
+        events.sort(key=lambda event: event[0])
+        last_timestamp = None
+        for timestamp, pair, row in events:
+            if self.pace and last_timestamp is not None and timestamp != last_timestamp:
+                time.sleep(self.pace)
+            last_timestamp = timestamp
+            yield pair, timestamp, row
+
+
+class PollingFeed:
+    """
+    Live feed that waits for each interval to close and then downloads the closed candle for every pair
+    """
+    def __init__(self, sources, interval, delay=5):
+        """
+        :sources: list of (pair, preprocessor, topic). Preprocessors must provide download(topic, start_time, end_time)
+        as GDAX and Kraken do
+        :interval: candle interval in minutes
+        :delay: seconds to wait after the interval closes, to give the exchange time to publish the candle
+        """
+        self.sources = sources
+        self.interval = interval
+        self.delay = delay
+
+    def __iter__(self):
+        step = self.interval * 60
+        while True:
+            now = time.time()
+            close = (int(now) // step + 1) * step
+            time.sleep(close - now + self.delay)
+            start = datetime.utcfromtimestamp(close - step)
+            end = datetime.utcfromtimestamp(close)
+            timestamp = close - step
+            for pair, preprocessor, topic in self.sources:
+                candles = preprocessor.download(topic, start, end)
+                closed = np.flatnonzero(index_to_epoch(candles.index) == timestamp)
+                if len(closed):
+                    yield pair, timestamp, candles[['low', 'high', 'open', 'close', 'volume']].values[closed[0]]
@@ -0,0 +1,303 @@
+"""
+Model Server
+Long lived local inference server. Models are loaded once and kept in memory, and concurrent requests for the same
+model are micro-batched: requests arriving within a short time budget are stacked and scored with one predict or
+forecast call, which costs little more than scoring a single request. Requests for different horizons share a batch,
+since a forecast over the longest horizon includes the shorter ones.
+
+HTTP API:
+    GET  /models                    loaded models and their input shapes
+    GET  /stats                     request and batch counts per model
+    POST /predict/{model}           score inputs, see ModelHandler.do_POST
+"""
+import glob
+import io
+import json
+import os
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+import numpy as np
+
+from Classifier.numpy_runtime import NumpyModel
+from Preprocessing.profiling import profiler
+
+NPY_TYPE = 'application/x-npy'
+
+
+class PendingRequest:
+    """
+    One request waiting in a MicroBatcher queue
+    """
+    def __init__(self, inputs, steps=1):
+        self.inputs = inputs
+        self.steps = steps
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+    def wait(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class MicroBatcher:
+    """
+    Collects concurrent requests for one model and scores them together on a worker thread. A batch is scored once it
+    holds :max_batch: samples, or :max_wait: seconds after its first request arrived
+    """
+    def __init__(self, score, max_batch=256, max_wait=0.002):
+        """
+        :score: function scoring a stacked array of inputs over a number of steps, score(inputs, steps), returning an
+        array of (samples, steps)
+        :max_batch: maximum samples per batch
+        :max_wait: time budget in seconds a request waits for others to batch with
+        """
+        self.score = score
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'samples': 0, 'batches': 0, 'score_seconds': 0.0}
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, inputs, steps=1):
+        """
+        Queues :inputs: (samples, ...) and blocks until they have been scored
+        Returns the results for these samples, of shape (samples, steps)
+        """
+        request = PendingRequest(inputs, steps)
+        self.queue.put(request)
+        return request.wait()
+
+    def run(self):
+        while True:
+            batch = [self.queue.get()]
+            samples = len(batch[0].inputs)
+            deadline = time.perf_counter() + self.max_wait
+            while samples < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                try:
+                    request = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(request)
+                samples += len(request.inputs)
+            self.score_batch(batch)
+
+    def score_batch(self, batch):
+        start = time.perf_counter()
+        try:
+            inputs = batch[0].inputs if len(batch) == 1 else np.concatenate([request.inputs for request in batch])
+            results = np.asarray(self.score(inputs, max(request.steps for request in batch))).reshape(len(inputs), -1)
+            offset = 0
+            for request in batch:
+                request.result = results[offset:offset + len(request.inputs), :request.steps]
+                offset += len(request.inputs)
+        except Exception as error:
+            for request in batch:
+                request.error = error
+        elapsed = time.perf_counter() - start
+        with self.lock:
+            self.stats['requests'] += len(batch)
+            self.stats['samples'] += sum(len(request.inputs) for request in batch)
+            self.stats['batches'] += 1
+            self.stats['score_seconds'] += elapsed
+        profiler.record('model_server.batch', elapsed)
+        for request in batch:
+            request.done.set()
+
+
+class ModelRegistry:
+    """
+    Loaded models and one MicroBatcher per (model, target index, input shape), created on first use
+    """
+    def __init__(self, models, max_batch=256, max_wait=0.002, max_batchers=64):
+        """
+        :models: dict of {name: model}, where each model has predict(inputs) and, for horizons over 1 interval,
+        forecast(inputs, steps, target_index), e.g. NumpyModel or Neural_Net. Models with an input_shape attribute
+        (per sample, None for any length) have requests checked against it
+        :max_batchers: limit on batcher threads, since sequence models can take inputs of any length
+        """
+        self.models = models
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.max_batchers = max_batchers
+        self.batchers = {}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def load(cls, directory='./saved_models', **options):
+        """
+        Loads every model exported with Neural_Net.export (*.npz) in :directory:, named after its file
+        """
+        models = {os.path.splitext(os.path.basename(path))[0]: NumpyModel.load(path)
+                  for path in sorted(glob.glob(os.path.join(directory, '*.npz'))) if not path.endswith('_scaler.npz')}
+        return cls(models, **options)
+
+    def batcher(self, name, target_index=None, shape=()):
+        """
+        Returns the MicroBatcher for a model. Forecasts feed predictions back into the :target_index: feature, so each
+        target index is batched separately, as is each input :shape: (per sample) so that a malformed request can't
+        break a batch. Requests without a target index can only be scored one step ahead
+        """
+        key = (name, target_index, shape)
+        with self.lock:
+            if key not in self.batchers:
+                if len(self.batchers) >= self.max_batchers:
+                    raise ValueError("too many distinct input shapes or target indices, at most {} are batched".format(self.max_batchers))
+                model = self.models[name]
+                def score(inputs, steps):
+                    if steps == 1:
+                        return model.predict(inputs)
+                    return model.forecast(inputs, steps, target_index)
+                self.batchers[key] = MicroBatcher(score, self.max_batch, self.max_wait)
+            return self.batchers[key]
+
+    def predict(self, name, inputs, steps=None, target_index=None):
+        """
+        Scores :inputs: with model :name:, batched with any concurrent requests for the same model
+        :steps: number of intervals to forecast. None or 1 predicts the next interval
+        :target_index: column of the predicted target within the feature rows, needed for forecasts
+        Returns an array of shape (samples, steps)
+        """
+        if name not in self.models:
+            raise KeyError(name)
+        steps = steps or 1
+        if steps > 1 and target_index is None:
+            raise ValueError("target_index is needed to forecast more than one step")
+        inputs = np.asarray(inputs, dtype=np.float32)
+        if inputs.ndim < 2 or not len(inputs):
+            raise ValueError("inputs must be a non-empty array of samples, got shape {}".format(inputs.shape))
+        expected = getattr(self.models[name], 'input_shape', None)
+        if expected is not None:
+            if len(expected) != inputs.ndim - 1 or any(size is not None and size != actual for size, actual in zip(expected, inputs.shape[1:])):
+                raise ValueError("model {} takes samples of shape {}, got {}".format(name, tuple(expected), inputs.shape[1:]))
+        if target_index is not None and not 0 <= target_index < inputs.shape[-1]:
+            raise ValueError("target_index {} is out of range for {} features".format(target_index, inputs.shape[-1]))
+        return self.batcher(name, target_index, inputs.shape[1:]).submit(inputs, steps)
+
+    def describe(self):
+        """
+        Input layout of each loaded NumPy model
+        """
+        description = {}
+        for name, model in self.models.items():
+            if isinstance(model, NumpyModel):
+                description[name] = {'sequence': model.sequence, 'features': model.input_shape[-1],
+                                     'input_shape': model.input_shape, 'scaled_targets': model.target_scaler is not None}
+            else:
+                description[name] = {}
+        return description
+
+    def stats(self):
+        """
+        Batching statistics keyed by model name, or {model}/{target index} for forecasts
+        """
+        with self.lock:
+            batchers = dict(self.batchers)
+        stats = {}
+        for (name, target_index, shape), batcher in batchers.items():
+            entry = stats.setdefault(name if target_index is None else '{}/{}'.format(name, target_index),
+                                     {'requests': 0, 'samples': 0, 'batches': 0, 'score_seconds': 0.0})
+            with batcher.lock:
+                for field, value in batcher.stats.items():
+                    entry[field] += value
+        for entry in stats.values():
+            entry['mean_batch_samples'] = entry['samples'] / max(entry['batches'], 1)
+        return stats
+
+
+class ModelHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1' # Keep-alive, so clients reuse one connection
+    disable_nagle_algorithm = True # Otherwise small responses wait on the client's delayed ACK
+
+    def do_GET(self):
+        if self.path == '/models':
+            self.send_json(200, self.server.registry.describe())
+        elif self.path == '/stats':
+            self.send_json(200, self.server.registry.stats())
+        else:
+            self.send_json(404, {'error': 'unknown path {}'.format(self.path)})
+
+    def do_POST(self):
+        """
+        POST /predict/{model}. The body is either JSON, {"inputs": [...], "steps": 6, "target_index": 38}, or a .npy
+        array of inputs with Content-Type application/x-npy and steps / target_index as query parameters. Inputs are
+        (samples, features) or (samples, timesteps, features), scaled as the model expects. Without steps the next
+        interval is predicted. The response is in the same format as the request: {"predictions": [...]} or a .npy
+        array of (samples, steps)
+        """
+        path, _, query = self.path.partition('?')
+        if not path.startswith('/predict/'):
+            return self.send_json(404, {'error': 'unknown path {}'.format(path)})
+        name = path[len('/predict/'):]
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if name not in self.server.registry.models:
+            return self.send_json(404, {'error': 'unknown model {}'.format(name)})
+        binary = self.headers.get('Content-Type') == NPY_TYPE
+        try:
+            if binary:
+                try:
+                    inputs = np.load(io.BytesIO(body), allow_pickle=False) # Never unpickle request bodies
+                except (OSError, EOFError) as error:
+                    raise ValueError("body is not a .npy array: {}".format(error))
+                options = dict(part.split('=', 1) for part in query.split('&') if part)
+            else:
+                options = json.loads(body.decode())
+                if not isinstance(options, dict):
+                    raise ValueError("request body must be a JSON object")
+                inputs = options.get('inputs')
+                if inputs is None:
+                    raise ValueError("request has no inputs")
+            steps = int(options['steps']) if options.get('steps') else None
+            target_index = int(options['target_index']) if options.get('target_index') is not None else None
+            predictions = self.server.registry.predict(name, inputs, steps, target_index)
+        except (ValueError, TypeError) as error:
+            return self.send_json(400, {'error': str(error)})
+        profiler.count('model_server.requests')
+
+        if binary:
+            buffer = io.BytesIO()
+            np.save(buffer, np.asarray(predictions, dtype=np.float32))
+            self.send_body(200, buffer.getvalue(), NPY_TYPE)
+        else:
+            self.send_json(200, {'predictions': np.asarray(predictions).tolist()})
+
+    def send_json(self, code, data):
+        self.send_body(code, json.dumps(data).encode(), 'application/json')
+
+    def send_body(self, code, body, content_type):
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass # Don't print a line per request
+
+
+class ModelServer(ThreadingMixIn, HTTPServer):
+    """
+    HTTP server handling each connection on its own thread, so concurrent requests can be batched together
+    """
+    daemon_threads = True
+    request_queue_size = 128 # Listen backlog, so bursts of new client connections aren't refused
+
+    def __init__(self, registry, host='127.0.0.1', port=8765):
+        """
+        :registry: ModelRegistry of the models to serve
+        :port: 0 picks a free port, see self.url
+        """
+        HTTPServer.__init__(self, (host, port), ModelHandler)
+        self.registry = registry
+
+    @property
+    def url(self):
+        return 'http://{}:{}'.format(*self.server_address[:2])
@@ -0,0 +1,203 @@
+"""
+NumPy Runtime
+Lightweight inference for trained models without Keras or TensorFlow. Neural_Net.export() writes the layer weights
+and configuration (and the scalers, if any) to a compact .npz file, and NumpyModel runs the forward pass with NumPy
+alone, so a prediction script starts in a fraction of a second.
+
+Supports the layers used by the DNN and LSTM models: Dense, LSTM (Keras gate order i, f, c, o) and Dropout, which is a
+no-op at inference
+"""
+import json
+import time
+import numpy as np
+
+from Classifier.scaler import Scaler
+
+ACTIVATIONS = {
+    'linear': lambda x: x,
+    'relu': lambda x: np.maximum(x, 0, out=x),
+    'tanh': lambda x: np.tanh(x, out=x),
+    'sigmoid': lambda x: np.divide(1, 1 + np.exp(-x, out=x), out=x),
+    'hard_sigmoid': lambda x: np.clip(x * 0.2 + 0.5, 0, 1), # Keras' piecewise linear sigmoid
+}
+
+
+def export_keras(model, path, feature_scaler=None, target_scaler=None):
+    """
+    Writes a Keras Sequential model's weights and layer configuration to an .npz file for NumpyModel
+    :model: compiled Keras model made of Dense, LSTM and Dropout layers
+    :feature_scaler: :target_scaler: optional Scalers the model was trained with, bundled into the file
+    """
+    layers = []
+    arrays = {}
+    for index, layer in enumerate(model.layers):
+        kind = layer.__class__.__name__
+        config = layer.get_config()
+        if kind == 'Dropout':
+            continue
+        if kind == 'Dense':
+            spec = {'type': 'dense', 'activation': config['activation']}
+            names = ['kernel', 'bias'] if config.get('use_bias', True) else ['kernel']
+        elif kind == 'LSTM':
+            spec = {'type': 'lstm', 'units': config['units'], 'activation': config['activation'],
+                    'recurrent_activation': config['recurrent_activation'], 'return_sequences': config['return_sequences']}
+            names = ['kernel', 'recurrent_kernel', 'bias'] if config.get('use_bias', True) else ['kernel', 'recurrent_kernel']
+        else:
+            raise ValueError("layer type {} is not supported by the NumPy runtime".format(kind))
+        spec['name'] = 'layer{}'.format(index)
+        if not layers:
+            spec['input_shape'] = list(model.input_shape[1:]) # Per sample, with None for sequences of any length
+        for name, weights in zip(names, layer.get_weights()):
+            arrays['{}_{}'.format(spec['name'], name)] = np.asarray(weights, dtype=np.float32)
+        layers.append(spec)
+    save(path, layers, arrays, feature_scaler, target_scaler)
+
+
+def save(path, layers, arrays, feature_scaler=None, target_scaler=None):
+    """
+    Writes layer specs and weight arrays to :path:, e.g. from export_keras
+    """
+    for name, scaler in (('features', feature_scaler), ('targets', target_scaler)):
+        if scaler is not None:
+            for key, value in scaler.state().items():
+                arrays['scaler_{}_{}'.format(name, key)] = value
+    np.savez(path, layers=np.array(json.dumps(layers)), **arrays)
+
+
+class NumpyModel:
+    """
+    Forward pass of an exported model. Has the same predict and forecast interface as Neural_Net, so it can be used by
+    LivePredictor in its place
+    """
+    def __init__(self, layers, weights, feature_scaler=None, target_scaler=None):
+        """
+        :layers: list of layer spec dicts as written by export_keras
+        :weights: dict of {'{layer name}_{weight name}': array}
+        """
+        self.layers = layers
+        self.weights = weights
+        self.feature_scaler = feature_scaler
+        self.target_scaler = target_scaler
+        self.sequence = layers[0]['type'] == 'lstm'
+        features = int(weights[layers[0]['name'] + '_kernel'].shape[0])
+        # Per-sample input shape, with None for any length. Exports without one take sequences of any length
+        self.input_shape = tuple(layers[0].get('input_shape') or ([None, features] if self.sequence else [features]))
+        self.throughput = None
+
+    @classmethod
+    def load(cls, path):
+        """
+        Loads a model written by export_keras / Neural_Net.export
+        """
+        with np.load(path) as arrays:
+            layers = json.loads(str(arrays['layers']))
+            weights = {key: arrays[key] for key in arrays.files if key != 'layers' and not key.startswith('scaler_')}
+            scalers = {}
+            for name in ('features', 'targets'):
+                if 'scaler_{}_mean'.format(name) in arrays.files:
+                    scalers[name] = Scaler(*(arrays['scaler_{}_{}'.format(name, key)] for key in ('count', 'mean', 'm2')))
+        return cls(layers, weights, scalers.get('features'), scalers.get('targets'))
+
+    def dense(self, layer, x):
+        x = x.dot(self.weights[layer['name'] + '_kernel'])
+        if layer['name'] + '_bias' in self.weights:
+            x += self.weights[layer['name'] + '_bias']
+        return ACTIVATIONS[layer['activation']](x)
+
+    def lstm(self, layer, x):
+        """
+        LSTM forward pass over (samples, timesteps, features). The input projection for every timestep is one matrix
+        product, leaving only the recurrent product inside the loop over timesteps
+        """
+        name, units = layer['name'], layer['units']
+        activation, recurrent_activation = ACTIVATIONS[layer['activation']], ACTIVATIONS[layer['recurrent_activation']]
+        recurrent_kernel = self.weights[name + '_recurrent_kernel']
+        samples, timesteps = x.shape[:2]
+
+        inputs = x.reshape(samples * timesteps, -1).dot(self.weights[name + '_kernel']).reshape(samples, timesteps, 4 * units)
+        if name + '_bias' in self.weights:
+            inputs += self.weights[name + '_bias']
+        h = np.zeros((samples, units), dtype=inputs.dtype)
+        c = np.zeros((samples, units), dtype=inputs.dtype)
+        outputs = np.empty((samples, timesteps, units), dtype=inputs.dtype) if layer['return_sequences'] else None
+        for t in range(timesteps):
+            z = inputs[:, t] + h.dot(recurrent_kernel)
+            i = recurrent_activation(z[:, :units])
+            f = recurrent_activation(z[:, units:2 * units])
+            o = recurrent_activation(z[:, 3 * units:])
+            c = f * c + i * activation(z[:, 2 * units:3 * units])
+            h = o * activation(c.copy())
+            if outputs is not None:
+                outputs[:, t] = h
+        return outputs if outputs is not None else h
+
+    def predict(self, data, batch_size=None):
+        """
+        Scores samples in one pass, or in batches of :batch_size: to bound memory
+        :data: (samples, features) for a DNN, (samples, timesteps, features) for an LSTM
+        Returns an array of shape (samples, 1), as Keras does
+        """
+        data = np.asarray(data, dtype=np.float32)
+        if batch_size is not None and len(data) > batch_size:
+            return np.concatenate([self.predict(data[start:start + batch_size]) for start in range(0, len(data), batch_size)])
+        x = data
+        for layer in self.layers:
+            x = self.lstm(layer, x) if layer['type'] == 'lstm' else self.dense(layer, x)
+        return x
+
+    def forecast(self, seed_data, steps, target_index, batch_size=1024):
+        """
+        Autoregressive forecast of the next :steps: intervals, see Neural_Net.forecast
+        Returns a numpy array of shape (samples, steps)
+        """
+        start = time.time()
+        forecasts = rolling_forecast(lambda window: self.predict(window, batch_size), seed_data, steps, target_index,
+                                     self.sequence, self.feature_scaler, self.target_scaler)
+        self.throughput = forecasts.size / max(time.time() - start, 1e-9)
+        return forecasts
+
+
+def rolling_forecast(predict, seed_data, steps, target_index, sequence, feature_scaler=None, target_scaler=None):
+    """
+    Predicts the next :steps: intervals by feeding each step's prediction back as the target feature of a new input row,
+    with the other features carried forward from the last known row. All seeds are forecast together
+    :predict: function scoring a batch of model inputs
+    :seed_data: the most recent input for one or more forecasts. For sequence models, (timesteps, features) or
+    (samples, timesteps, features); otherwise (features,) or (samples, features)
+    :target_index: column of the predicted target within the feature rows
+    :sequence: whether the model takes sequences
+    :feature_scaler: :target_scaler: if both are given, each prediction is converted from target scaling to the target
+    column's feature scaling before it is fed back
+    Returns a numpy array of shape (samples, steps)
+    """
+    seed_data = np.asarray(seed_data, dtype=np.float64)
+    if seed_data.ndim == (2 if sequence else 1):
+        seed_data = seed_data[np.newaxis]
+    samples = len(seed_data)
+
+    # Pre-allocate the rolling input so each step is a view rather than a concatenation
+    if sequence:
+        timesteps = seed_data.shape[1]
+        rows = np.empty((samples, timesteps + steps, seed_data.shape[2]))
+        rows[:, :timesteps] = seed_data
+    else:
+        rows = np.empty((samples, steps + 1, seed_data.shape[1]))
+        rows[:, 0] = seed_data
+
+    forecasts = np.empty((samples, steps))
+    for step in range(steps):
+        if sequence:
+            window = rows[:, step:step + timesteps]
+            next_row = step + timesteps
+        else:
+            window = rows[:, step]
+            next_row = step + 1
+        forecasts[:, step] = np.asarray(predict(window)).ravel()
+        rows[:, next_row] = rows[:, next_row - 1]
+        rows[:, next_row, target_index] = forecasts[:, step]
+        if feature_scaler is not None and target_scaler is not None:
+            feedback = rows[:, next_row, target_index]
+            target_scaler.inverse_transform(feedback, out=feedback)
+            feedback -= feature_scaler.mean[target_index]
+            feedback /= feature_scaler.std[target_index]
+    return forecasts
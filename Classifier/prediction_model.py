@@ -3,37 +3,89 @@ Classifier Neural Network
 Defines the model structure and key functions
 """
 
+import os
+import time
+import numpy as np
 import h5py
+import keras
+from keras import optimizers
 from keras.models import Sequential
-from keras.layers import Dense, Dropout, LSTM, MaxPooling2D, Conv2D
+from keras.layers import Dense, Dropout, MaxPooling2D, Conv2D
+from keras.layers import LSTM as LSTM_layer # Aliased so it isn't shadowed by the LSTM model class below
 from keras.callbacks import ModelCheckpoint, Callback
 import matplotlib.pyplot as plt
 
+import config
+from Classifier.numpy_runtime import export_keras, rolling_forecast
+from Classifier.scaler import load_scalers, save_scalers, scaler_path
+from Preprocessing.profiling import profiler
+
 class Neural_Net:
     """
     Class to build and train neural net
     """
 
-    def __init__(self, input_size, architecture, activation='relu', learning_rate=0.001):
-        # Sets up the network in Keras, including optimisers
+    def __init__(self, input_size, architecture, activation='relu', learning_rate=0.001, timesteps=None):
+        """
+        Sets up the network in Keras, including optimisers
+        :input_size: number of features per interval
+        :timesteps: sequence length for the LSTM architecture, i.e. the lookback used in processor.generate_sequences
+        """
         if architecture == 'DNN':
-            self.model = LSTM(input_size, learning_rate, activation)
-        if architecture == 'LSTM':
-            self.model = LSTM(input_size, learning_rate)
+            self.network = DNN(input_size, learning_rate, activation)
+        elif architecture == 'LSTM':
+            self.network = LSTM(input_size, learning_rate, timesteps)
         else:
-            print("model architecture not recognised or defined")
+            raise ValueError("model architecture {} not recognised or defined".format(architecture))
+        self.model = self.network.model
+        self.input_shape = tuple(self.model.input_shape[1:]) # Per sample, with None for sequences of any length
+        self.feature_scaler = None
+        self.target_scaler = None
 
-    def train(self, train_data, train_targets, train_mean, train_std, valid_data, valid_labels, epochs, batch_size=64):
+    def load(self, weights_file):
+        """
+        Loads model weights, and the feature and target scalers saved next to them (see Classifier.scaler) if present
+        """
+        self.model.load_weights(weights_file)
+        if os.path.isfile(scaler_path(weights_file)):
+            scalers = load_scalers(scaler_path(weights_file))
+            self.feature_scaler, self.target_scaler = scalers['features'], scalers['targets']
+
+    def export(self, path):
+        """
+        Exports the model and its scalers to an .npz file for Classifier.numpy_runtime.NumpyModel, which predicts
+        without importing Keras or TensorFlow
+        """
+        self.network.export(path, self.feature_scaler, self.target_scaler)
+
+    def save_scalers(self, weights_file, feature_scaler, target_scaler):
+        """
+        Saves the scalers the model was trained with next to its weights, for load()
+        """
+        self.feature_scaler, self.target_scaler = feature_scaler, target_scaler
+        save_scalers(scaler_path(weights_file), features=feature_scaler, targets=target_scaler)
+
+    @profiler.profiled('model.train', capture=True)
+    def train(self, train_data, train_targets, train_mean, train_std, valid_data, valid_labels, epochs, batch_size=64, steps_per_epoch=None,
+              weights_file=None):
         """
         Function to train the model, including logging and weight saving callbacks and results plotting
-        :train_data: 2D numpy array of training samples
+        :train_data: 2D numpy array of training samples (3D sequences for the LSTM), or a batch generator such as
+        processor.sequence_generator, in which case :train_targets: is ignored and :steps_per_epoch: must be set
         :train_targets: 1D numpy array of training targets (prices). Should be time-offset against get_training_data
         :train_mean: the mean of the target series in the training dataset
         :train_std: standard deviation of the target in the training dataset
+        :steps_per_epoch: number of generator batches per epoch, see processor.sequence_steps
+        :weights_file: where the best weights are checkpointed, next to the scalers saved with save_scalers. Defaults
+        to config.WEIGHTS_FILE
         """
 
         # Define weight saving callback
-        checkpointer = ModelCheckpoint(filepath='./saved_models/weights1.hdf5',
+        weights_file = weights_file or config.WEIGHTS_FILE
+        directory = os.path.dirname(weights_file)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        checkpointer = ModelCheckpoint(filepath=weights_file,
                                verbose=1, save_best_only=True)
 
         # Define logging callback
@@ -41,61 +93,103 @@ class Neural_Net:
             def on_train_begin(self, logs={}):
                 self.losses = {'train':[], 'validation':[]}
 
-            def on_epoch_end(self, logs={}):
+            def on_epoch_end(self, epoch, logs={}):
                 self.losses['train'].append(logs.get('loss'))
                 self.losses['validation'].append(logs.get('val_loss'))
 
-            def on_train_end(self, batch, logs={}):
-                plt.plot(losses['train'], label='Training loss')
-                plt.plot(losses['validation'], label='Validation loss')
+            def on_train_end(self, logs={}):
+                plt.plot(self.losses['train'], label='Training loss')
+                plt.plot(self.losses['validation'], label='Validation loss')
                 plt.legend()
                 _ = plt.ylim()
 
         # Call model train function and initiate data logging and weight saving
-        self.model.fit(train_data, train_targets,
-                       batch_size=batch_size, epochs=epochs,
-                       callbacks=[checkpointer, train_log],
-                       validation_data=(valid_data, valid_targets))
-
-        # Plot price prediction chart
-        prediction = []
-        for ii in range(len(valid_data)):
-            input_data = valid_data[ii]
-            model_output = self.model.predict(input_data)
-            prediction.append(model_output * train_std + train_mean)
+        with profiler.span('model.fit'):
+            if steps_per_epoch is not None:
+                # Generator mode: Keras pulls one batch at a time so memory stays flat with dataset size
+                self.model.fit_generator(train_data, steps_per_epoch=steps_per_epoch, epochs=epochs,
+                                         callbacks=[checkpointer, train_log()],
+                                         validation_data=(valid_data, valid_labels))
+            else:
+                self.model.fit(train_data, train_targets,
+                               batch_size=batch_size, epochs=epochs,
+                               callbacks=[checkpointer, train_log()],
+                               validation_data=(valid_data, valid_labels))
+
+        # Plot price prediction chart, scoring the whole validation set in large batches
+        prediction = self.predict(valid_data) * train_std + train_mean
 
         plt.plot(prediction, label='Predicted price')
         plt.plot(valid_labels * train_std + train_mean)
         plt.legend()
         _ = plt.ylim()
 
+    @profiler.profiled('model.predict', rows=True)
+    def predict(self, data, batch_size=1024, steps=None):
+        """
+        Scores many samples at once in large batches rather than one model call per sample
+        :data: numpy array of samples (2D for the DNN, 3D sequences for the LSTM), or a batch generator such as
+        processor.sequence_generator with shuffle=False, in which case :steps: must be set
+        :batch_size: number of samples per model call
+        :steps: number of generator batches to score
+        Returns a 1D numpy array of predictions. Throughput is kept in self.throughput (samples per second); timings are
+        also recorded by the profiler
+        """
+        start = time.time()
+        if steps is not None:
+            prediction = self.model.predict_generator(data, steps=steps)
+        else:
+            prediction = self.model.predict(data, batch_size=batch_size)
+        elapsed = max(time.time() - start, 1e-9)
+
+        self.throughput = len(prediction) / elapsed
+        return prediction.ravel()
 
-    def forecast(self):
-        # Call the model to predict next 5 intervals based on historical data
+    @profiler.profiled('model.forecast', rows=True)
+    def forecast(self, seed_data, steps, target_index, batch_size=1024):
+        """
+        Call the model to predict the next :steps: intervals based on historical data. Each step's prediction is fed back
+        as the target feature of a new input row while the other features are carried forward from the last known row,
+        and all seeds are forecast together in batches
+        :seed_data: the most recent input for one or more forecasts. For the LSTM, (timesteps, features) or
+        (samples, timesteps, features); for the DNN, (features,) or (samples, features)
+        :steps: number of intervals to forecast, e.g. run_script's predict horizon
+        :target_index: column of the predicted target within the feature rows
+        If scalers are loaded, each prediction is converted from target scaling to the target column's feature scaling
+        before it is fed back
+        Returns a numpy array of shape (samples, steps)
+        """
         # TODO: A probability / confidence score would be very interesting...
-        pass
+        start = time.time()
+        forecasts = rolling_forecast(lambda window: self.model.predict(window, batch_size=batch_size), seed_data, steps,
+                                     target_index, isinstance(self.network, LSTM), self.feature_scaler, self.target_scaler)
+        elapsed = max(time.time() - start, 1e-9)
+
+        self.throughput = forecasts.size / elapsed # Samples x steps per second
+        return forecasts
 
 
 class LSTM:
     """
-    RNN using LSTM
+    RNN using LSTM. Takes (samples, timesteps, features) input as built by processor.generate_sequences
     """
-    def __init__(self, input_size, learning_rate):
+    def __init__(self, input_size, learning_rate, timesteps=None):
         self.input_size = input_size
         self.learning_rate = learning_rate
+        self.timesteps = timesteps
         self.build_model()
 
     def build_model(self):
         self.model = Sequential()
-        self.model.add(LSTM(
-            input_dim = self.input_size,
-            output_dim=64,
+        self.model.add(LSTM_layer(
+            64,
+            input_shape=(self.timesteps, self.input_size),
             return_sequences=True,
             stateful=False))
         self.model.add(Dropout(0.2))
-        self.model.add(LSTM(
-            output_dim=64,
-            return_sequences=True,
+        self.model.add(LSTM_layer(
+            64,
+            return_sequences=False, # One prediction per sequence
             stateful=False))
         self.model.add(Dropout(0.2))
         self.model.add(Dense(units=1, activation='linear'))
@@ -104,6 +198,12 @@ class LSTM:
         optimizer = optimizers.Adam(self.learning_rate)
         self.model.compile(optimizer=optimizer, loss='mse', metrics=['accuracy'])
 
+    def export(self, path, feature_scaler=None, target_scaler=None):
+        """
+        Writes the weights and layer configuration to an .npz file for the NumPy runtime
+        """
+        export_keras(self.model, path, feature_scaler, target_scaler)
+
 class Convnet:
     """
     TBD - Model using CNN to capture time series patterns
@@ -142,3 +242,9 @@ class DNN:
         # Define optimiser and compile
         optimizer = optimizers.Adam(self.learning_rate)
         self.model.compile(optimizer=optimizer, loss='mse', metrics=['accuracy'])
+
+    def export(self, path, feature_scaler=None, target_scaler=None):
+        """
+        Writes the weights and layer configuration to an .npz file for the NumPy runtime
+        """
+        export_keras(self.model, path, feature_scaler, target_scaler)
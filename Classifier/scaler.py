@@ -0,0 +1,123 @@
+"""
+Scaler
+Per-feature standardisation with statistics computed in a single streaming pass, so datasets larger than RAM can be
+scaled chunk by chunk. Scalers are saved next to the model weights so that training, validation and live prediction
+all apply the same scaling
+"""
+import os
+import numpy as np
+
+
+class Scaler:
+    """
+    Standardises features to zero mean and unit variance. Statistics are accumulated with Welford's algorithm in Chan et
+    al.'s parallel form, merging a whole chunk at a time, and NaNs are ignored
+    """
+    def __init__(self, count=None, mean=None, m2=None):
+        """
+        :count: :mean: :m2: per-feature running statistics (number of values, mean, sum of squared deviations), e.g.
+        from a dataset header. Leave empty to start a new scaler and call partial_fit
+        """
+        self.count = None if count is None else np.asarray(count, dtype=np.float64)
+        self.mean = None if mean is None else np.asarray(mean, dtype=np.float64)
+        self.m2 = None if m2 is None else np.asarray(m2, dtype=np.float64)
+
+    def partial_fit(self, values):
+        """
+        Merges a chunk into the statistics
+        :values: 2D array of (rows, features), or 1D for a single feature
+        Returns the scaler
+        """
+        values = np.asarray(values, dtype=np.float64).reshape(len(values), -1)
+        if self.count is None:
+            self.count, self.mean, self.m2 = (np.zeros(values.shape[1]) for _ in range(3))
+
+        valid = ~np.isnan(values)
+        chunk_count = valid.sum(axis=0)
+        chunk_mean = np.nansum(values, axis=0) / np.maximum(chunk_count, 1)
+        chunk_m2 = np.nansum(np.where(valid, values - chunk_mean, 0) ** 2, axis=0)
+
+        total = self.count + chunk_count
+        delta = chunk_mean - self.mean
+        safe_total = np.maximum(total, 1)
+        self.mean = self.mean + delta * chunk_count / safe_total
+        self.m2 = self.m2 + chunk_m2 + delta ** 2 * self.count * chunk_count / safe_total
+        self.count = total
+        return self
+
+    def fit(self, chunks):
+        """
+        Accumulates statistics over an iterable of chunks, e.g. the data of Dataset.chunks()
+        Returns the scaler
+        """
+        for chunk in chunks:
+            self.partial_fit(chunk)
+        return self
+
+    @property
+    def std(self):
+        """
+        Population standard deviation of each feature. Constant features get 1 so that they scale to 0 rather than NaN
+        """
+        std = np.sqrt(self.m2 / np.maximum(self.count, 1))
+        return np.where(std > 0, std, 1.0)
+
+    def transform(self, values, out=None):
+        """
+        Standardises :values: along their last axis. Pass out=values to scale a float array in place, e.g. a live model
+        input buffer, without allocating
+        Returns the scaled array
+        """
+        if out is None:
+            out = np.array(values, dtype=np.result_type(values, np.float32))
+        elif out is not values:
+            out[...] = values
+        out -= self.mean.astype(out.dtype)
+        out /= self.std.astype(out.dtype)
+        return out
+
+    def inverse_transform(self, values, out=None):
+        """
+        Undoes transform, e.g. to convert normalised model predictions back to target units
+        """
+        if out is None:
+            out = np.array(values, dtype=np.result_type(values, np.float32))
+        elif out is not values:
+            out[...] = values
+        out *= self.std.astype(out.dtype)
+        out += self.mean.astype(out.dtype)
+        return out
+
+    def state(self):
+        """
+        Running statistics as a dict of arrays, as saved by save_scalers
+        """
+        return {'count': self.count, 'mean': self.mean, 'm2': self.m2}
+
+
+def scaler_path(weights_file):
+    """
+    Path of the scalers saved next to a weights file, e.g. saved_models/weights.hdf5 -> saved_models/weights_scaler.npz
+    """
+    return os.path.splitext(weights_file)[0] + '_scaler.npz'
+
+
+def save_scalers(path, **scalers):
+    """
+    Saves named scalers to one .npz file, e.g. save_scalers(scaler_path(weights_file), features=..., targets=...)
+    """
+    arrays = {}
+    for name, scaler in scalers.items():
+        for key, value in scaler.state().items():
+            arrays['{}_{}'.format(name, key)] = value
+    np.savez(path, **arrays)
+
+
+def load_scalers(path):
+    """
+    Loads the scalers saved by save_scalers
+    Returns a dict of {name: Scaler}
+    """
+    with np.load(path) as arrays:
+        names = set(key.rsplit('_', 1)[0] for key in arrays.files)
+        return {name: Scaler(arrays[name + '_count'], arrays[name + '_mean'], arrays[name + '_m2']) for name in names}
@@ -0,0 +1,211 @@
+"""
+Hyperparameter Sweep
+Trains many Neural_Net configurations (architecture, learning rate, batch size, window length and interval) across a
+pool of worker processes, using successive halving: every trial trains for a few epochs, the best 1 / eta by validation
+loss carry on for eta times as many epochs and the rest are pruned.
+
+Training arrays are written once as float32 datasets (see Classifier.dataset) and memory-mapped read-only by every worker, so the OS page
+cache holds one copy however many workers run. Each worker builds its (samples, window, features) inputs as strided
+views on the mapped arrays, so no worker copies the dataset.
+"""
+import itertools
+import math
+import os
+import shutil
+import time
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from Classifier.data_processing import processor
+from Classifier.dataset import Dataset, DatasetWriter
+
+# Options swept over, with the values used by default
+DEFAULT_SPACE = {
+    'architecture': ['DNN', 'LSTM'],
+    'learning_rate': [0.0003, 0.001, 0.003],
+    'batch_size': [64, 256],
+    'window': [5, 20],
+}
+
+
+def configurations(space, intervals):
+    """
+    Every combination of the options in :space: for every interval
+    :space: dict of {option: list of values}, see DEFAULT_SPACE
+    :intervals: list of candle intervals in minutes that datasets were prepared for
+    Returns a list of configuration dicts
+    """
+    names = sorted(space)
+    return [dict(zip(names + ['interval'], values))
+            for values in itertools.product(*([space[name] for name in names] + [intervals]))]
+
+
+def prepare_arrays(directory, interval, train_data, train_targets, valid_data, valid_targets):
+    """
+    Writes one interval's training and validation arrays as float32 datasets (see Classifier.dataset) for the workers
+    to memory-map. Targets are normalised in each batch with the training dataset's statistics. Datasets written
+    directly with processor.save_dataset to the same paths work too
+    :directory: sweep directory, datasets go in {directory}/{interval}/train and {directory}/{interval}/valid
+    Returns the interval's directory
+    """
+    path = os.path.join(directory, str(interval))
+    for name, data, targets in (('train', train_data, train_targets), ('valid', valid_data, valid_targets)):
+        if os.path.isdir(os.path.join(path, name)):
+            shutil.rmtree(os.path.join(path, name))
+        columns = ['feature{}'.format(i) for i in range(np.shape(data)[1])]
+        with DatasetWriter(os.path.join(path, name), columns, interval) as writer:
+            writer.append(data, targets)
+    return path
+
+
+def load_arrays(path):
+    """
+    Opens an interval's datasets written by prepare_arrays. Nothing is read until batches are drawn
+    Returns a dict of {'train': Dataset, 'valid': Dataset}
+    """
+    return {name: Dataset(os.path.join(path, name)) for name in ('train', 'valid')}
+
+
+def batches(dataset, window, batch_size, architecture, shuffle=True, seed=None, target_stats=None, scaler=None):
+    """
+    Endless (inputs, targets) batch generator over a memory-mapped dataset. LSTM inputs are (batch, window, features)
+    sequences; DNN inputs are the same windows flattened to (batch, window * features). The dataset's targets are
+    already shifted to the next interval, so each window is labelled with the target of its last row
+    :target_stats: (mean, std) used to normalise targets, defaulting to the dataset's own
+    :scaler: feature Scaler applied to each batch as train_script.py does, defaulting to the dataset's own
+    """
+    mean, std = target_stats or (dataset.target_mean, dataset.target_std)
+    scaler = scaler or dataset.scaler
+    for inputs, labels in processor.sequence_generator(dataset.data, dataset.targets, window, forecast_range=0,
+                                                       batch_size=batch_size, shuffle=shuffle, seed=seed):
+        inputs = scaler.transform(inputs) # Copies, as unshuffled DNN batches can be views on the read-only mapping
+        yield (inputs.reshape(len(inputs), -1) if architecture != 'LSTM' else inputs), (labels - mean) / std
+
+
+def train_keras(config, arrays, weights, initial_epoch, epochs):
+    """
+    Trains one configuration with Keras from :initial_epoch: to :epochs:, resuming from :weights: if it exists
+    :config: configuration dict, see configurations
+    :arrays: memory-mapped datasets from load_arrays
+    :weights: path the model weights are loaded from and saved to between rungs
+    Returns the validation loss (mse)
+    """
+    # Imported in the worker so the parent never initialises TensorFlow
+    import tensorflow as tf
+    from keras import backend as K
+    from Classifier.prediction_model import Neural_Net
+
+    # One thread per worker process, so the pool uses every core without oversubscribing them. Clearing the session
+    # stops graphs from earlier trials in this worker accumulating
+    K.clear_session()
+    K.set_session(tf.Session(config=tf.ConfigProto(intra_op_parallelism_threads=1, inter_op_parallelism_threads=1)))
+
+    window, batch_size, architecture = config['window'], config['batch_size'], config['architecture']
+    train, valid = arrays['train'], arrays['valid']
+    features = len(train.columns)
+    if architecture == 'LSTM':
+        network = Neural_Net(features, 'LSTM', learning_rate=config['learning_rate'], timesteps=window)
+    else:
+        network = Neural_Net(features * window, architecture, learning_rate=config['learning_rate'])
+    if os.path.isfile(weights):
+        network.model.load_weights(weights)
+
+    network.model.fit_generator(
+        batches(train, window, batch_size, architecture, seed=initial_epoch),
+        steps_per_epoch=processor.sequence_steps(train.data, window, forecast_range=0, batch_size=batch_size),
+        initial_epoch=initial_epoch, epochs=epochs, verbose=0)
+    network.model.save_weights(weights)
+
+    return float(network.model.evaluate_generator(
+        batches(valid, window, 1024, architecture, shuffle=False, target_stats=(train.target_mean, train.target_std),
+                scaler=train.scaler),
+        steps=processor.sequence_steps(valid.data, window, forecast_range=0, batch_size=1024))[0])
+
+
+def run_trial(task):
+    """
+    Process pool worker: trains one trial for one rung
+    :task: tuple of (trial number, configuration, array directory, weights path, initial epoch, epochs, trainer)
+    Returns a tuple of (trial number, validation loss, seconds taken)
+    """
+    trial, config, path, weights, initial_epoch, epochs, trainer = task
+    start = time.time()
+    loss = trainer(config, load_arrays(path), weights, initial_epoch, epochs)
+    return trial, loss, time.time() - start
+
+
+class Sweep:
+    """
+    Successive halving over a list of configurations, run in a process pool
+    """
+    def __init__(self, directory, configs, min_epochs=1, max_epochs=27, eta=3, max_workers=None, trainer=train_keras):
+        """
+        :directory: sweep directory holding the arrays from prepare_arrays for each configuration's interval. Trial
+        weights and results.csv are written here
+        :configs: list of configuration dicts, see configurations
+        :min_epochs: epochs every trial is trained for in the first rung
+        :max_epochs: epochs the surviving trials are trained for in total
+        :eta: 1 / eta of the trials are kept at each rung, and trained for eta times as many epochs
+        :max_workers: number of worker processes, defaulting to one per CPU
+        :trainer: function f(config, arrays, weights, initial_epoch, epochs) returning the validation loss. Must be a
+        module level function so it can be sent to the workers
+        """
+        self.directory = directory
+        self.configs = configs
+        self.eta = eta
+        self.max_workers = max_workers or os.cpu_count()
+        self.trainer = trainer
+        rungs = int(math.floor(math.log(max_epochs / float(min_epochs), eta) + 1e-9))
+        self.rung_epochs = [min(int(min_epochs * eta ** rung), max_epochs) for rung in range(rungs + 1)]
+        self.results = []
+
+    def run(self):
+        """
+        Runs every rung, pruning between them, and writes the results table to {directory}/results.csv after each rung
+        Returns the results table, see table()
+        """
+        weights_directory = os.path.join(self.directory, 'weights')
+        if not os.path.isdir(weights_directory):
+            os.makedirs(weights_directory)
+
+        trials = list(range(len(self.configs)))
+        losses = {}
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            for rung, epochs in enumerate(self.rung_epochs):
+                initial_epoch = self.rung_epochs[rung - 1] if rung else 0
+                tasks = [(trial, self.configs[trial], os.path.join(self.directory, str(self.configs[trial]['interval'])),
+                          os.path.join(weights_directory, 'trial{}.hdf5'.format(trial)), initial_epoch, epochs, self.trainer)
+                         for trial in trials]
+                start = time.time()
+                for future in as_completed([executor.submit(run_trial, task) for task in tasks]):
+                    trial, loss, seconds = future.result()
+                    losses[trial] = loss
+                    self.results.append(dict(self.configs[trial], trial=trial, rung=rung, epochs=epochs,
+                                             valid_loss=loss, seconds=seconds))
+
+                # Keep the best 1 / eta for the next rung
+                trials = sorted(trials, key=lambda trial: losses[trial])
+                survivors = trials[:max(1, len(trials) // self.eta)]
+                print("rung {}: {} trials trained to {} epochs in {:.1f}s, best loss {:.5f}".format(
+                    rung, len(trials), epochs, time.time() - start, losses[trials[0]]))
+                trials = survivors
+                self.write_results()
+
+        return self.table()
+
+    def table(self):
+        """
+        Results as a dataframe with the last rung reached by each trial and whether it was pruned, best first: trials
+        that reached later rungs, then by validation loss
+        """
+        results = pd.DataFrame(self.results)
+        final = results.sort_values('rung').groupby('trial').tail(1).copy()
+        final['pruned'] = final['rung'] < len(self.rung_epochs) - 1
+        return final.sort_values(['rung', 'valid_loss'], ascending=[False, True]).reset_index(drop=True)
+
+    def write_results(self):
+        """
+        Writes the results table to {directory}/results.csv
+        """
+        self.table().to_csv(os.path.join(self.directory, 'results.csv'), index=False)
@@ -1,7 +1,40 @@
 """Generic base class for data preprocessing functions."""
+import numpy as np
+import pandas as pd
+
+from Preprocessing.profiling import profiler
 
 class Preprocessor:
 
+    # Each subclass declares how its output becomes feature columns: the source name it is registered under in
+    # config.FEATURE_SOURCES and a mapping of get_training_data output columns to feature name suffixes. Feature names
+    # are built as {feature prefix}_{source_name}_{suffix}, e.g. Ethusd_gdax_close
+    source_name = None
+    columns = {}
+
+    # Longest gap in minutes that processor.historical_download forward fills for this source. None uses the
+    # download's max_fill. Sources published less often than the candle interval, e.g. daily stats, raise it
+    fill_limit = None
+
+    # Whether the source downloads through the shared HTTPTransport resource. Preprocessing.replay records and replays
+    # these sources' raw API responses, and the whole get_training_data frames of all others
+    http_transport = False
+
+    # Methods of every subclass that are timed as profiler spans named {source_name}.{method}, with the length of their
+    # return value counted as {source_name}.{method}.rows. Subclasses can extend this with their own hot paths
+    profiled_methods = ('get_training_data', 'get_test_data', 'download', 'to_ohlc', 'to_features')
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        for method in cls.profiled_methods:
+            function = getattr(cls, method, None)
+            if function is None:
+                continue
+            function = getattr(function, 'unprofiled', function) # Don't double wrap methods inherited from a subclass
+            wrapper = profiler.profiled('{}.{}'.format(cls.source_name or cls.__name__.lower(), method), rows=True)(function)
+            wrapper.unprofiled = function
+            setattr(cls, method, wrapper)
+
     def __init__(self, interval, start_time, end_time):
         """
         Initialise shared parameters.
@@ -11,6 +44,15 @@ class Preprocessor:
         """
         pass
 
+    @classmethod
+    def create(cls, interval, start_time, end_time, resources):
+        """
+        Builds an instance for processor.historical_download from the resources shared by all sources
+        :resources: dict of shared objects such as 'store', 'transport' and 'rate_limiters' ({source_name: TokenBucket}).
+        Subclasses pick out what they need
+        """
+        return cls(interval, start_time, end_time)
+
     def get_training_data(self, topic):
         """
         Call API to collect target dataset over the defined time period. Returns fully formatted data as a
@@ -28,3 +70,30 @@ class Preprocessor:
         :topic: this will be the API specific target. E.g. a reddit subreddit or GDAX currency pair
         """
         raise NotImplementedError("{} must override step()".format(self.__class__.__name__))
+
+    def feature_names(self, prefix):
+        """
+        Returns the feature column names this source produces for a feature prefix, e.g. 'Ethusd'
+        """
+        return ['_'.join(part for part in (prefix, self.source_name, suffix) if part) for suffix in self.columns.values()]
+
+    def gap_feature(self, prefix):
+        """
+        Name of the gap mask feature marking the intervals this source has no data of its own for, e.g. Ethusd_gdax_gap
+        """
+        return '_'.join(part for part in (prefix, self.source_name, 'gap') if part)
+
+    def to_features(self, data, prefix):
+        """
+        Converts get_training_data output to feature columns with unique names and a datetime index
+        :data: dataframe returned by get_training_data. Sources differ in index type, e.g. GDAX candles are indexed by
+        unix seconds as the API returns them and Kraken candles by datetime; both are accepted here and by index_to_epoch
+        :prefix: feature prefix for this topic, e.g. 'Ethusd'
+        Returns a dataframe indexed by datetime with the columns given by feature_names
+        """
+        features = data[list(self.columns)]
+        features.columns = self.feature_names(prefix)
+        if not isinstance(features.index, pd.DatetimeIndex):
+            # Unix timestamps in seconds, converted in one vectorized call
+            features.index = pd.to_datetime(np.asarray(features.index, dtype=np.int64), unit='s')
+        return features
@@ -5,42 +5,161 @@ historical data, get_training_data() will only import and validate a manually cr
 """
 
 
+import os
 import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 
 from Preprocessing.helpers import date_to_datestring, date_to_iso8601, date_to_interval
 from Preprocessing.base_class import Preprocessor
+from Preprocessing.candle_store import datetime_to_epoch
+from Preprocessing.profiling import profiler
+
+STATS = ['Hashrate', 'Addresses', 'Supply', 'Trx_Fee', 'Daily_Trx']
+DTYPES = dict({'Timestamp': str}, **{stat: np.float64 for stat in STATS})
+
+# Date layouts used by the CSVs in Blockchain_Data, tried in order. The BTC file has full timestamps, the LTC file ISO
+# dates and the ETH file US style dates
+DATE_FORMATS = ['%Y-%m-%d %H:%M:%S', '%Y-%m-%d', '%m/%d/%Y']
+
+# Bumped when the cached arrays change meaning, so caches written by earlier versions are rebuilt
+CACHE_VERSION = 2
+
+
+def parse_dates(values):
+    """
+    Parses date strings in any of DATE_FORMATS. Each format is parsed in one vectorized call over the values that
+    haven't matched an earlier format, so a file with a single layout is parsed in one pass
+    :values: array-like of date strings
+    Returns an int64 numpy array of unix seconds
+    """
+    values = pd.Series(np.asarray(values, dtype=object))
+    parsed = pd.Series(pd.NaT, index=values.index, dtype='datetime64[ns]')
+    for date_format in DATE_FORMATS:
+        missing = parsed.isnull().values
+        if not missing.any():
+            break
+        parsed[missing] = pd.to_datetime(values[missing], format=date_format, errors='coerce')
+    if parsed.isnull().any():
+        raise ValueError("unrecognised date {!r}, expected one of the formats {}".format(values[parsed.isnull().values].iloc[0], DATE_FORMATS))
+    return parsed.values.astype('datetime64[s]').astype(np.int64)
+
+
+def fill_blanks(values):
+    """
+    Forward fills blank (NaN) stats in each column from the previous day's value, e.g. the days missing some stats in
+    ltc_blockchain.csv. Leading blanks stay NaN
+    :values: 2D array of (days, stats) in time order
+    Returns the filled array
+    """
+    rows = np.arange(len(values))[:, np.newaxis]
+    latest = np.maximum.accumulate(np.where(np.isnan(values), 0, rows), axis=0)
+    return values[latest, np.arange(values.shape[1])]
+
+
+def read_stats(csv_path, start=None, end=None, chunk_size=65536):
+    """
+    Reads a blockchain stats CSV in chunks with declared column types. Blank cells become NaN and scientific notation
+    (e.g. 1.03E+14) is parsed as usual. With :start: and :end: each chunk is filtered as it is read, so rows outside
+    the range are never accumulated
+    :start: :end: optional unix second bounds, keeping rows with start <= time < end
+    Returns a tuple of (times as int64 unix seconds, values of shape (days, len(STATS))), sorted by time
+    """
+    times, values = [], []
+    for chunk in pd.read_csv(csv_path, usecols=['Timestamp'] + STATS, dtype=DTYPES, chunksize=chunk_size):
+        chunk_times = parse_dates(chunk['Timestamp'].values)
+        keep = np.ones(len(chunk_times), dtype=bool)
+        if start is not None:
+            keep &= chunk_times >= start
+        if end is not None:
+            keep &= chunk_times < end
+        times.append(chunk_times[keep])
+        values.append(chunk[STATS].values[keep])
+    times = np.concatenate(times) if times else np.empty(0, dtype=np.int64)
+    values = np.concatenate(values) if values else np.empty((0, len(STATS)))
+    order = np.argsort(times, kind='mergesort')
+    return times[order], values[order]
+
 
 class Blockchain_Stats(Preprocessor):
 
-    def __init__(self, interval, start_time, end_time):
+    source_name = 'blockchain'
+    columns = {stat: stat.lower() for stat in STATS}
+    fill_limit = 24 * 60 # Daily stats
+
+    def __init__(self, interval, start_time, end_time, cache_directory='./blockchain_cache'):
         """
         Initialise shared parameters.
         :interval: The time interval at which the training data will be collected and batched
         :start_time: earliest point from which data will be collected, as a datetime object
         :end_time: final point at which data will be collected, as a datetime object
+        :cache_directory: where parsed CSVs are cached in binary form, or None to always parse the CSV
         """
 
         self.interval = interval
         self.start_time = start_time
         self.end_time = end_time
+        self.cache_directory = cache_directory
 
 
     def get_training_data(self, csv_path):
         """
-        Reads in manually compiled CSV data for blockchain stats
-        :csv_path: filepath to a CSV with format of []
-        Returns a dataframe of format []
+        Reads in manually compiled CSV data for blockchain stats, from the binary cache if the CSV hasn't changed since
+        it was cached. The last day before start_time is kept too, so that the first candles can be forward filled.
+        Blank stats are filled after the period is selected, so the output is the same with or without the cache
+        :csv_path: filepath to a CSV with columns [Timestamp, Hashrate, Addresses, Supply, Trx_Fee, Daily_Trx]
+        Returns a dataframe of [Timestamp, Hashrate, Addresses, Supply, Trx_Fee, Daily_Trx], one row per day
         """
-        data = pd.read_csv(csv_path)
-        data[['Hashrate', 'Addresses', 'Supply', 'Trx_Fee', 'Daily_Trx']] = data[['Hashrate', 'Addresses', 'Supply', 'Trx_Fee', 'Daily_Trx']].apply(pd.to_numeric)
-        data[['Timestamp']] = data[['Timestamp']].apply(pd.to_datetime)
-        data = data[data['Timestamp'] < self.end_time]
-        data = data[data['Timestamp'] > self.start_time]
+        start = datetime_to_epoch(self.start_time) - self.fill_limit * 60
+        end = datetime_to_epoch(self.end_time)
+        if self.cache_directory is None:
+            times, values = read_stats(csv_path, start, end)
+        else:
+            times, values = self.load_cached(csv_path)
+            first, last = np.searchsorted(times, [start, end])
+            times, values = times[first:last], values[first:last]
+        values = fill_blanks(values)
 
+        data = pd.DataFrame(values, columns=STATS)
+        data.insert(0, 'Timestamp', pd.to_datetime(times, unit='s'))
         return data
 
+    def load_cached(self, csv_path):
+        """
+        Loads the whole parsed CSV from the cache. The cache entry is keyed on the CSV's modification time and size
+        and CACHE_VERSION, and rebuilt if any has changed
+        Returns a tuple of (times, values) as returned by read_stats
+        """
+        stat = os.stat(csv_path)
+        key = np.array([stat.st_mtime_ns, stat.st_size, CACHE_VERSION], dtype=np.int64)
+        cache_path = os.path.join(self.cache_directory, os.path.splitext(os.path.basename(csv_path))[0] + '.npz')
+        if os.path.isfile(cache_path):
+            with np.load(cache_path) as cached:
+                if np.array_equal(cached['key'], key):
+                    return cached['times'], cached['values']
+
+        with profiler.span('blockchain.parse_csv'):
+            times, values = read_stats(csv_path)
+        if not os.path.isdir(self.cache_directory):
+            os.makedirs(self.cache_directory)
+        tmp_path = cache_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, key=key, times=times, values=values)
+        os.replace(tmp_path, cache_path)
+        return times, values
+
+
+    def feature_names(self, prefix):
+        """
+        Blockchain stat names are unambiguous, so the source name is left out, e.g. Eth_hashrate
+        """
+        return ['_'.join((prefix, suffix)) for suffix in self.columns.values()]
+
+    def to_features(self, data, prefix):
+        """
+        Blockchain stats carry their dates in the Timestamp column rather than the index
+        """
+        return super().to_features(data.set_index('Timestamp'), prefix)
 
     def get_test_data(self, topic):
         """
@@ -0,0 +1,188 @@
+"""
+Candle Store
+Local on-disk cache of OHLCV candles keyed by exchange / pair / interval. Candles are kept in flat binary column files that
+can be appended to in place and memory-mapped on load, alongside a small JSON header recording which time ranges have
+already been downloaded. Preprocessors use it to fetch only the time ranges they don't have yet
+"""
+import calendar
+import json
+import os
+import threading
+import time
+import numpy as np
+import pandas as pd
+from datetime import datetime
+
+from Preprocessing.profiling import profiler
+
+
+class CandleStore:
+
+    columns = ['low', 'high', 'open', 'close', 'volume']
+
+    def __init__(self, root='./candles'):
+        """
+        :root: directory the store lives in. Created on first write
+        """
+        self.root = root
+        self.lock = threading.Lock()
+
+    def missing_ranges(self, exchange, pair, interval, start_time, end_time):
+        """
+        Returns the parts of [start_time, end_time) that have not been downloaded yet, as a list of (start, end) datetime
+        tuples aligned to the candle interval
+        """
+        start, end = self.align(interval, start_time, end_time)
+        coverage = self.read_meta(exchange, pair, interval)['coverage']
+        missing = []
+        cursor = start
+        for covered_start, covered_end in coverage:
+            if covered_end <= cursor or covered_start >= end:
+                continue
+            if covered_start > cursor:
+                missing.append((cursor, covered_start))
+            cursor = max(cursor, covered_end)
+        if cursor < end:
+            missing.append((cursor, end))
+        return [(epoch_to_datetime(s), epoch_to_datetime(e)) for s, e in missing]
+
+    @profiler.profiled('candle_store.append')
+    def append(self, exchange, pair, interval, candles, start_time, end_time):
+        """
+        Adds downloaded candles to the store and marks [start_time, end_time) as covered. Candles still in progress
+        (ending after the current time) are not stored so that they are downloaded again once complete
+        :candles: dataframe with columns ['low', 'high', 'open', 'close', 'volume'], indexed by unix timestamp in seconds
+        or by datetime
+        :start_time: start of the downloaded range, as returned by missing_ranges
+        :end_time: end of the downloaded range, as returned by missing_ranges
+        """
+        step = interval * 60
+        start = datetime_to_epoch(start_time)
+        end = min(datetime_to_epoch(end_time), int(time.time()) // step * step)
+        if end <= start:
+            return
+
+        times = index_to_epoch(candles.index)
+        keep = (times >= start) & (times < end)
+        times = times[keep]
+        values = candles[self.columns].values[keep].astype(np.float64)
+        order = np.argsort(times, kind='mergesort')
+        times, values = times[order], values[order]
+
+        with self.lock:
+            path = self.path(exchange, pair, interval)
+            if not os.path.isdir(path):
+                os.makedirs(path)
+            meta = self.read_meta(exchange, pair, interval)
+            stored_times, stored_values = self.read_columns(exchange, pair, interval, meta['rows'])
+
+            if meta['rows'] == 0 or len(times) == 0 or times[0] > stored_times[-1]:
+                # Fast path: new candles follow the existing ones, so append to the column files in place
+                with open(os.path.join(path, 'time.i8'), 'ab') as f:
+                    f.write(times.tobytes())
+                with open(os.path.join(path, 'ohlcv.f8'), 'ab') as f:
+                    f.write(values.tobytes())
+                meta['rows'] += len(times)
+            else:
+                # Backfill or overlap: merge, preferring freshly downloaded candles, and rewrite
+                merged_times = np.concatenate([times, np.asarray(stored_times)])
+                merged_values = np.concatenate([values, np.asarray(stored_values)])
+                merged_times, first = np.unique(merged_times, return_index=True)
+                merged_values = merged_values[first]
+                del stored_times, stored_values # Release the memory maps before overwriting the files
+                with open(os.path.join(path, 'time.i8'), 'wb') as f:
+                    f.write(merged_times.tobytes())
+                with open(os.path.join(path, 'ohlcv.f8'), 'wb') as f:
+                    f.write(merged_values.tobytes())
+                meta['rows'] = len(merged_times)
+
+            meta['coverage'] = merge_ranges(meta['coverage'] + [[start, end]])
+            self.write_meta(exchange, pair, interval, meta)
+
+    @profiler.profiled('candle_store.load', rows=True)
+    def load(self, exchange, pair, interval, start_time, end_time):
+        """
+        Reads stored candles in [start_time, end_time) without parsing or copying the whole history
+        Returns a dataframe with columns ['low', 'high', 'open', 'close', 'volume'] indexed by unix timestamp in seconds
+        """
+        start, end = self.align(interval, start_time, end_time)
+        meta = self.read_meta(exchange, pair, interval)
+        times, values = self.read_columns(exchange, pair, interval, meta['rows'])
+        if meta['rows'] == 0:
+            return pd.DataFrame(index=pd.Index([], dtype=np.int64, name='time'), columns=self.columns, dtype=np.float64)
+        first, last = np.searchsorted(times, [start, end])
+        dataframe = pd.DataFrame(np.array(values[first:last]), index=np.array(times[first:last]), columns=self.columns)
+        dataframe.index.name = 'time'
+        return dataframe
+
+    def align(self, interval, start_time, end_time):
+        """
+        Widens [start_time, end_time) to whole candle intervals. Returns unix timestamps in seconds
+        """
+        step = interval * 60
+        start = datetime_to_epoch(start_time) // step * step
+        end = -(-datetime_to_epoch(end_time) // step) * step
+        return start, end
+
+    def path(self, exchange, pair, interval):
+        return os.path.join(self.root, exchange, pair.replace('/', '_'), '{}min'.format(interval))
+
+    def read_meta(self, exchange, pair, interval):
+        meta_path = os.path.join(self.path(exchange, pair, interval), 'meta.json')
+        if not os.path.isfile(meta_path):
+            return {'columns': self.columns, 'rows': 0, 'coverage': []}
+        with open(meta_path, 'r') as f:
+            return json.load(f)
+
+    def write_meta(self, exchange, pair, interval, meta):
+        meta_path = os.path.join(self.path(exchange, pair, interval), 'meta.json')
+        with open(meta_path + '.tmp', 'w') as f:
+            json.dump(meta, f)
+        os.replace(meta_path + '.tmp', meta_path)
+
+    def read_columns(self, exchange, pair, interval, rows):
+        """
+        Memory-maps the first :rows: stored candles. Returns a tuple of (times, values)
+        """
+        if rows == 0:
+            return np.empty(0, dtype=np.int64), np.empty((0, len(self.columns)), dtype=np.float64)
+        path = self.path(exchange, pair, interval)
+        times = np.memmap(os.path.join(path, 'time.i8'), dtype=np.int64, mode='r', shape=(rows,))
+        values = np.memmap(os.path.join(path, 'ohlcv.f8'), dtype=np.float64, mode='r', shape=(rows, len(self.columns)))
+        return times, values
+
+
+def datetime_to_epoch(dt):
+    """
+    Converts a naive UTC datetime to a unix timestamp in whole seconds
+    """
+    return calendar.timegm(dt.utctimetuple())
+
+
+def epoch_to_datetime(timestamp):
+    """
+    Converts a unix timestamp in seconds to a naive UTC datetime
+    """
+    return datetime.utcfromtimestamp(timestamp)
+
+
+def index_to_epoch(index):
+    """
+    Converts a datetime or unix-second index to an int64 array of unix seconds
+    """
+    if isinstance(index, pd.DatetimeIndex):
+        return index.values.astype('datetime64[s]').astype(np.int64)
+    return np.asarray(index, dtype=np.int64)
+
+
+def merge_ranges(ranges):
+    """
+    Merges overlapping or touching [start, end) ranges
+    """
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
@@ -4,40 +4,77 @@ For a selected crypto-fiat pair, Collect OHLC candlestick data at the specified
 """
 # Import packages
 import pandas as pd
-import time
-import requests
 from datetime import datetime, timedelta
 from Preprocessing.base_class import Preprocessor
 from Preprocessing.helpers import date_to_iso8601
+from Preprocessing.rate_limit import TokenBucket
+from Preprocessing.transport import HTTPTransport
 
 class GDAX(Preprocessor):
-    def __init__(self, interval, start_time, end_time):
+    source_name = 'gdax'
+    columns = {'low': 'low', 'high': 'high', 'open': 'open', 'close': 'close', 'volume': 'vol'}
+    http_transport = True
+
+    def __init__(self, interval, start_time, end_time, rate_limiter=None, api_url='https://api.gdax.com', store=None, transport=None):
         """
         Initialise shared parameters.
         :interval: the time interval at which the training data will be collected and batched
         :start_time: earliest point from which data will be collected, as a datetime object
         :end_time: final point at which data will be collected, as a datetime object
+        :rate_limiter: TokenBucket shared by all GDAX downloads. Defaults to 2 requests per second
+        :api_url: base URL of the GDAX API, e.g. to point at a local test server
+        :store: optional CandleStore. If set, only time ranges missing from the store are downloaded
+        :transport: HTTPTransport to send requests through, shared with other preprocessors to reuse connections
         """
         self.interval = interval
         self.start_time = start_time
         self.end_time = end_time
-        self.retries = 3 # For API rate-limiting
+        self.transport = transport or HTTPTransport()
+        self.rate_limiter = rate_limiter or TokenBucket(rate=2)
+        self.api_url = api_url
+        self.store = store
+
+    @classmethod
+    def create(cls, interval, start_time, end_time, resources):
+        """
+        Builds an instance sharing the candle store, HTTP transport and GDAX rate limiter of a historical_download run
+        """
+        return cls(interval, start_time, end_time, rate_limiter=resources.get('rate_limiters', {}).get(cls.source_name),
+                   store=resources.get('store'), transport=resources.get('transport'))
 
     def get_training_data(self, topic):
         """
-        Breaks up gdax trade data requests into chunks of 200 candlesticks to download in 1 second intervals, to comply with GDAX API rules
+        Collects candles for the whole period, downloading only the time ranges missing from the candle store if one is set
         :topic: this will be the API specific target. E.g. a reddit subreddit or GDAX currency pair
-        Returns an dataframe with rows of candlestick data in the following format: [time, low, high, open, close, volume]
+        Returns an dataframe with rows of candlestick data in the following format: [time, low, high, open, close, volume],
+        indexed by candle start time in unix seconds. Kraken indexes candles by datetime, see Preprocessor.to_features
+        """
+        if self.store is None:
+            return self.download(topic, self.start_time, self.end_time)
+
+        for slice_start, slice_end in self.store.missing_ranges('gdax', topic, self.interval, self.start_time, self.end_time):
+            candles = self.download(topic, slice_start, slice_end)
+            self.store.append('gdax', topic, self.interval, candles, slice_start, slice_end)
+        return self.store.load('gdax', topic, self.interval, self.start_time, self.end_time)
+
+    def download(self, topic, start_time, end_time):
+        """
+        Breaks up gdax trade data requests into chunks of 200 candlesticks, paced by the rate limiter to comply with GDAX API rules
+        :topic: GDAX currency pair
+        :start_time: start of the download, as a datetime object
+        :end_time: end of the download, as a datetime object
+        Returns an dataframe with rows of candlestick data in the following format: [time, low, high, open, close, volume],
+        indexed by candle start time in unix seconds. Kraken indexes candles by datetime, see Preprocessor.to_features
         """
 
         data = [] # Empty list to append data
         currency_pair = topic
-        url = 'https://api.gdax.com/products/{currency_pair}/candles'.format(currency_pair=currency_pair) # URL for candle
+        url = '{api_url}/products/{currency_pair}/candles'.format(api_url=self.api_url, currency_pair=currency_pair) # URL for candle
 
         delta = timedelta(minutes=self.interval * 200) # 200 intervals per request
-        slice_start = self.start_time
-        while slice_start != self.end_time:
-            slice_end = min(slice_start + delta, self.end_time)
+        slice_start = start_time
+        while slice_start != end_time:
+            slice_end = min(slice_start + delta, end_time)
             print("downloading {} data from {} to {}".format(currency_pair, slice_start, slice_end))
             data += self.request_trade_slice(
                     url=url,
@@ -45,7 +82,6 @@ class GDAX(Preprocessor):
                     end=slice_end,
             )
             slice_start = slice_end
-            time.sleep(0.5)
 
         dataframe = pd.DataFrame(data=data, columns=['time', 'low', 'high', 'open', 'close', 'volume'])
         dataframe.set_index('time', inplace=True)
@@ -63,7 +99,7 @@ class GDAX(Preprocessor):
 
     def request_trade_slice(self, url, start, end):
         """
-        Single HTTP request function with error catching and management for server error responses
+        Single HTTP request for one slice of candles. Raises TransportError if the request keeps failing
         Response is in the format: [[time, low, high, open, close, volume], ...]
         """
 
@@ -71,19 +107,13 @@ class GDAX(Preprocessor):
         iso_start = date_to_iso8601(start)
         iso_end = date_to_iso8601(end)
 
-        for retry_count in range(0, self.retries):
-            response = requests.get(url, {
-              'start': iso_start,
-              'end': iso_end,
-              'granularity': self.interval * 60 # Converting to seconds for API
-            })
-            if response.status_code != 200:
-                if retry_count + 1 == self.retries:
-                    raise Exception('Failed to get exchange data for ({}, {})! Error message: {}'.format(self.start_time, self.end_time, response.text))
-                else:
-                    # Exponential back-off.
-                    time.sleep(1.5 ** retry_count)
-            else:
-                # Sort the historic rates (in ascending order) based on the timestamp.
-                result = sorted(response.json(), key=lambda x: x[0])
-                return result
+        # Retries, backoff and rate limit headers are handled by the transport
+        response = self.transport.get(url, params={
+          'start': iso_start,
+          'end': iso_end,
+          'granularity': self.interval * 60 # Converting to seconds for API
+        }, rate_limiter=self.rate_limiter)
+
+        # Sort the historic rates (in ascending order) based on the timestamp.
+        result = sorted(response.json(), key=lambda x: x[0])
+        return result
@@ -1,23 +1,63 @@
-from pytrends.request import TrendReq
+import hashlib
+import json
+import os
+import threading
+import numpy as np
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
+import config
 from Preprocessing.helpers import date_to_datestring
 from Preprocessing.base_class import Preprocessor
+from Preprocessing.profiling import profiler
+from Preprocessing.rate_limit import TokenBucket
+
+
+def default_client():
+    from pytrends.request import TrendReq # Only needed for live downloads, so tests run against a stub without it
+    return TrendReq(hl='en-US', tz=0)
+
 
 class Searchtrends(Preprocessor):
 
-    def __init__(self, interval, start_time, end_time):
+    source_name = 'search'
+    profiled_methods = Preprocessor.profiled_methods + ('trend_downloader',)
+    columns = {region: region.lower() if region == 'Worldwide' else region for region, geo in config.SEARCH_REGIONS}
+    fill_limit = 24 * 60 # Daily search interest
+
+    def __init__(self, interval, start_time, end_time, regions=None, client_factory=None, rate_limiter=None, max_workers=4,
+                 cache_directory='./search_cache'):
         """
         Initialise shared parameters.
         :interval: the time interval at which the training data will be collected and batched
         :start_time: earliest point from which data will be collected, as a datetime object
         :end_time: final point at which data will be collected, as a datetime object
+        :regions: list of (column name, pytrends geo code) pairs to download, e.g. [('Worldwide', ''), ('US', 'US')].
+        Defaults to config.SEARCH_REGIONS
+        :client_factory: function returning a new pytrends client. Each download thread gets its own, since a client
+        keeps the payload of its last request. Defaults to TrendReq(hl='en-US', tz=0)
+        :rate_limiter: TokenBucket shared by all Google Trends requests. Defaults to 1 request per second
+        :max_workers: number of region requests in flight at once
+        :cache_directory: where responses are cached, keyed by topic, region and timeframe, or None to disable caching
         """
-        self.pytrends = TrendReq(hl='en-US', tz=0)
         self.interval = interval
         self.start_time = start_time
         self.end_time = end_time
+        self.regions = list(regions or config.SEARCH_REGIONS)
+        self.columns = {region: region.lower() if region == 'Worldwide' else region for region, geo in self.regions}
+        self.client_factory = client_factory or default_client
+        self.rate_limiter = rate_limiter or TokenBucket(rate=1)
+        self.max_workers = max_workers
+        self.cache_directory = cache_directory
+        self.clients = threading.local()
+
+    @classmethod
+    def create(cls, interval, start_time, end_time, resources):
+        """
+        Builds an instance sharing the Google Trends rate limiter of a historical_download run
+        """
+        return cls(interval, start_time, end_time, rate_limiter=resources.get('rate_limiters', {}).get(cls.source_name))
 
 
     def get_training_data(self, topic):
@@ -27,78 +67,83 @@ class Searchtrends(Preprocessor):
         Note that training data here has not yet been split into data vs. targets
         :topic: this will be the API specific target. E.g. a reddit subreddit or GDAX currency pair
         """
-        # Get topic suggestion
-        suggestion = self.pytrends.suggestions(topic)[0]['mid']
-
-        # For each time period chunk, call downloader
-        data = pd.DataFrame() # Empty list to append data
+        # For each time period chunk, call downloader. The region requests of each chunk run concurrently
+        slices = []
         delta = timedelta(days=180) # Keep to 6 month periods to ensure daily intervals
         slice_start = self.start_time
-        while slice_start != self.end_time:
-            slice_end = min(slice_start + delta, self.end_time)
-            print("downloading {} data from {} to {}".format(topic, slice_start, slice_end))
-            df = self.trend_downloader(
-                    topic=[topic],
-                    start=slice_start,
-                    end=slice_end,
-            )
-            slice_start = slice_end
-            data = data.append(df)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while slice_start != self.end_time:
+                slice_end = min(slice_start + delta, self.end_time)
+                print("downloading {} data from {} to {}".format(topic, slice_start, slice_end))
+                slices.append(self.trend_downloader(topic=[topic], start=slice_start, end=slice_end, pool=pool))
+                slice_start = slice_end
 
-        return data
+        return pd.concat(slices) if slices else pd.DataFrame(columns=list(self.columns))
 
 
-    def trend_downloader(self, topic, start, end):
+    def trend_downloader(self, topic, start, end, pool=None):
         """
         For a specific time slice, requests search trend data by region normalized to 100 and combines it
+        :topic: list of search terms, as for pytrends build_payload
         :start: in datetime format
         :end: in datetime format
+        :pool: executor to run the region requests on. A temporary one is used if not given
+        Returns a dataframe with one column per region
         """
         timeframe = date_to_datestring(start) + " " + date_to_datestring(end)
+        if pool is None:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                return self.trend_downloader(topic, start, end, pool)
+
+        futures = [pool.submit(self.region_interest, topic, region, geo, timeframe) for region, geo in self.regions]
+        return pd.concat([future.result() for future in futures], axis=1)
 
-        # Global data
-        self.pytrends.build_payload(topic, cat=0, timeframe=timeframe, geo='', gprop='')
-        WW_data = self.pytrends.interest_over_time()
-        WW_data.columns= ['Worldwide', 'isPartial']
-        data = WW_data['Worldwide'].to_frame()
-
-        # US Data
-        self.pytrends.build_payload(topic, cat=0, timeframe=timeframe, geo='US', gprop='')
-        US_data = self.pytrends.interest_over_time()
-        US_data.columns= ['US', 'isPartial']
-        data = data.join(US_data['US'])
-
-        # UK Data
-        self.pytrends.build_payload(topic, cat=0, timeframe=timeframe, geo='GB', gprop='')
-        GB_data = self.pytrends.interest_over_time()
-        GB_data.columns= ['GB', 'isPartial']
-        data = data.join(GB_data['GB'])
-
-        # UK Data
-        self.pytrends.build_payload(topic, cat=0, timeframe=timeframe, geo='FR', gprop='')
-        FR_data = self.pytrends.interest_over_time()
-        FR_data.columns= ['FR', 'isPartial']
-        data = data.join(FR_data['FR'])
-
-        # Germany Data
-        self.pytrends.build_payload(topic, cat=0, timeframe=timeframe, geo='DE', gprop='')
-        DE_data = self.pytrends.interest_over_time()
-        DE_data.columns= ['DE', 'isPartial']
-        data = data.join(DE_data['DE'])
-
-        # Russia Data
-        self.pytrends.build_payload(topic, cat=0, timeframe=timeframe, geo='RU', gprop='')
-        RU_data = self.pytrends.interest_over_time()
-        RU_data.columns= ['RU', 'isPartial']
-        data = data.join(RU_data['RU'])
-
-        # Korea Data
-        self.pytrends.build_payload(topic, cat=0, timeframe=timeframe, geo='KR', gprop='')
-        KR_data = self.pytrends.interest_over_time()
-        KR_data.columns= ['KR', 'isPartial']
-        data = data.join(KR_data['KR'])
-
-        return data
+    def region_interest(self, topic, region, geo, timeframe):
+        """
+        Search interest over :timeframe: in one region, from the cache if it has been downloaded before
+        :region: column name for the region
+        :geo: pytrends geo code, '' for worldwide
+        Returns a series named :region: indexed by date
+        """
+        cache_path = self.cache_path(topic, geo, timeframe)
+        if cache_path is not None and os.path.isfile(cache_path):
+            with np.load(cache_path) as cached:
+                profiler.count('search.cache_hits')
+                return pd.Series(cached['values'], index=pd.to_datetime(cached['times']), name=region)
+
+        client = getattr(self.clients, 'client', None)
+        if client is None:
+            client = self.clients.client = self.client_factory()
+        self.rate_limiter.acquire()
+        with profiler.span('search.request'):
+            client.build_payload(topic, cat=0, timeframe=timeframe, geo=geo, gprop='')
+            response = client.interest_over_time()
+
+        if len(response):
+            interest = response[response.columns[0]].astype(np.float64).rename(region)
+            partial = response['isPartial'].astype(bool).any() if 'isPartial' in response else False
+        else:
+            interest = pd.Series([], index=pd.DatetimeIndex([]), name=region, dtype=np.float64)
+            partial = True # Nothing to cache, e.g. a timeframe that hasn't happened yet
+
+        # Responses that include today's still changing numbers aren't cached
+        if cache_path is not None and not partial:
+            if not os.path.isdir(self.cache_directory):
+                os.makedirs(self.cache_directory)
+            tmp_path = cache_path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, times=interest.index.values.astype('datetime64[ns]'), values=interest.values)
+            os.replace(tmp_path, cache_path)
+        return interest
+
+    def cache_path(self, topic, geo, timeframe):
+        """
+        Path of the cached response for one (topic, region, timeframe) request, or None if caching is disabled
+        """
+        if self.cache_directory is None:
+            return None
+        key = hashlib.sha1(json.dumps([topic, geo, timeframe]).encode()).hexdigest()
+        return os.path.join(self.cache_directory, key + '.npz')
 
     def get_test_data(self, topic):
         """
@@ -6,48 +6,86 @@ For a selected crypto-fiat pair, Collect OHLC candlestick data at the specified
 # Import packages
 import numpy as np
 import pandas as pd
-import time
-import requests
 from datetime import datetime, timedelta
-import krakenex
 import pytz
-from pykrakenapi import KrakenAPI
 from Preprocessing.base_class import Preprocessor
-from Preprocessing.helpers import date_to_iso8601, date_to_interval
+from Preprocessing.helpers import date_to_iso8601
+from Preprocessing.rate_limit import TokenBucket
+from Preprocessing.resample import trades_to_ohlc
+from Preprocessing.transport import HTTPTransport, TransportError
 
 class Kraken(Preprocessor):
-    def __init__(self, interval, start_time, end_time):
+    source_name = 'kraken'
+    columns = {'low': 'low', 'high': 'high', 'open': 'open', 'close': 'close', 'volume': 'vol'}
+    http_transport = True
+
+    def __init__(self, interval, start_time, end_time, rate_limiter=None, api_url='https://api.kraken.com', store=None, transport=None):
         """
         Initialise shared parameters.
         :interval: the time interval at which the training data will be collected and batched
         :start_time: earliest point from which data will be collected, as a datetime object
         :end_time: final point at which data will be collected, as a datetime object
+        :rate_limiter: TokenBucket shared by all Kraken downloads. Defaults to 1 request per second
+        :api_url: base URL of the Kraken API, e.g. to point at a local test server
+        :store: optional CandleStore. If set, only time ranges missing from the store are downloaded
+        :transport: HTTPTransport to send requests through, shared with other preprocessors to reuse connections
         """
         self.interval = interval
         self.start_time = start_time
         self.end_time = end_time
-        # Initialise krakenex library
-        api = krakenex.API()
-        self.k = KrakenAPI(api)
+        self.rate_limiter = rate_limiter or TokenBucket(rate=1)
+        self.api_url = api_url
+        self.store = store
+        self.transport = transport or HTTPTransport()
+
+
+    @classmethod
+    def create(cls, interval, start_time, end_time, resources):
+        """
+        Builds an instance sharing the candle store, HTTP transport and Kraken rate limiter of a historical_download run
+        """
+        return cls(interval, start_time, end_time, rate_limiter=resources.get('rate_limiters', {}).get(cls.source_name),
+                   store=resources.get('store'), transport=resources.get('transport'))
 
 
     def get_training_data(self, topic):
         """
-        Loops through Kraken data requests over the whole period. Kraken API only takes a start date and ends
+        Collects candles for the whole period, downloading only the time ranges missing from the candle store if one is set
         :topic: this will be the API specific target. E.g. a reddit subreddit or GDAX currency pair
-        Returns an dataframe with rows of candlestick data in the following format: [timestamp, low, high, open, close, volume]
+        Returns an dataframe with rows of candlestick data in the following format: [low, high, open, close, volume], indexed
+        by candle start time as a datetime. GDAX indexes candles by unix seconds, see Preprocessor.to_features
+        """
+        if self.store is None:
+            return self.download(topic, self.start_time, self.end_time)
+
+        for slice_start, slice_end in self.store.missing_ranges('kraken', topic, self.interval, self.start_time, self.end_time):
+            candles = self.download(topic, slice_start, slice_end)
+            self.store.append('kraken', topic, self.interval, candles, slice_start, slice_end)
+        dataframe = self.store.load('kraken', topic, self.interval, self.start_time, self.end_time)
+        dataframe.index = pd.to_datetime(dataframe.index, unit='s')
+        return dataframe
+
+
+    def download(self, topic, start_time, end_time):
+        """
+        Loops through Kraken data requests over the period. Kraken API only takes a start date and ends
+        :topic: Kraken currency pair
+        :start_time: start of the download, as a datetime object
+        :end_time: end of the download, as a datetime object
+        Returns an dataframe with rows of candlestick data in the following format: [low, high, open, close, volume], indexed
+        by candle start time as a datetime. GDAX indexes candles by unix seconds, see Preprocessor.to_features
         """
         currency_pair = topic
-        slice_start = self.start_time
-        end_timestamp = self.end_time.replace(tzinfo=pytz.utc).timestamp() # last is returned a an epoch timestamp so end_time needs to be reformatted
+        slice_start = start_time
+        end_timestamp = end_time.replace(tzinfo=pytz.utc).timestamp() # last is returned a an epoch timestamp so end_time needs to be reformatted
         trades, last = self.request_trade_slice(currency_pair, slice_start)
-        while last < end_timestamp:
-            slice_start = datetime.fromtimestamp(last)
+        trades = [trades]
+        while last < end_timestamp and len(trades[-1]):
+            slice_start = datetime.utcfromtimestamp(last)
             new_data, last = self.request_trade_slice(currency_pair, slice_start)
-            trades = trades.append(new_data)
-            time.sleep(1)
+            trades.append(new_data)
             print("time period from {} to {}".format(slice_start, last))
-        dataframe = self.to_ohlc(trades)
+        dataframe = self.to_ohlc(pd.concat(trades))
         return dataframe
 
 
@@ -63,47 +101,42 @@ class Kraken(Preprocessor):
 
     def request_trade_slice(self, currency_pair, start):
         """
-        Calls krakenex get_trade function to get line-by-line trade data for an individual time slice
+        Calls the Kraken public Trades endpoint to get line-by-line trade data for an individual time slice
         :start: start of API request time period
         Returns a tuple of (trades, last). Last = last trade timestamp. Used to set timestamp for next request
-        trades is a list of trades with format of [time, price, volume]
+        trades is a dataframe of trades with columns [price, volume, time]
         """
         timestamp = int(start.replace(tzinfo=pytz.utc).timestamp()) * 1000000000
-        trades, last = self.k.get_recent_trades(currency_pair, since=timestamp, ascending=True)
+        response = self.transport.get('{}/0/public/Trades'.format(self.api_url),
+                                      params={'pair': currency_pair, 'since': timestamp},
+                                      rate_limiter=self.rate_limiter, retry_if=self.is_throttled)
+        content = response.json()
+        if content['error']:
+            raise TransportError('Failed to get Kraken trades for {}: {}'.format(currency_pair, content['error']), response)
+
+        result = content['result']
+        last = int(result.pop('last'))
+        rows = next(iter(result.values())) # Result is keyed by Kraken's name for the pair: [[price, volume, time, buy/sell, market/limit, misc], ...]
+        trades = pd.DataFrame([row[:3] for row in rows], columns=['price', 'volume', 'time'], dtype=np.float64)
         return trades, last/1000000000
 
+    def is_throttled(self, response):
+        """
+        Kraken reports rate limiting in the JSON error list of a 200 response
+        """
+        try:
+            errors = response.json().get('error', [])
+        except ValueError:
+            return False
+        return any('Rate limit' in error or 'Too many requests' in error for error in errors)
+
 
     def to_ohlc(self, trades):
         """
         Groups and processes individual trade data to return OHLC (candle) data
         :trades: trades pandas dataframe as returned by request_trade_slice function
-        Returns an array with rows of candlestick data in the following format: ['time', 'low', 'high', 'open', 'close', 'volume']
-        """
-        # Converts unix timestamp data into candle interval periods. Period time corresponds to beginning of period
-        trades['datetime'] = pd.to_datetime(trades['time'], unit='s') # Reformat unix timestamp as datetime
-        trades['period'] = trades['datetime'].map(lambda x: date_to_interval(x, self.interval))
-
-        # Group trades into periods to aggregate volume and get low/high price
-        trade_agg = trades.groupby('period')
-        trade_agg = trade_agg.agg({
-            'price': {'low': np.min, 'high': np.max},
-            'volume': np.sum
-        })
-
-        # Create a fresh pandas dataframe and copies data from aggregated trades dataframe above
-        ohlc = pd.DataFrame(index=trade_agg.index.values, columns=['low', 'high', 'open', 'close', 'volume'])
-        ohlc['low'] = trade_agg['price']['low']
-        ohlc['high'] = trade_agg['price']['high']
-        ohlc['volume'] = trade_agg['volume']['sum']
-
-        # Iterate through each candle period and searches original trades dataframe for the first and last price, then set that
-        for i, row in ohlc.iterrows():
-            selection = trades.loc[trades['period'] == i] # Return all rows for the current period
-            first_trade_index = selection['time'].idxmax()
-            first_trade_price = selection.loc[first_trade_index]['price']
-            ohlc.at[i, 'open'] = first_trade_price
-            last_trade_index = selection['time'].idxmin()
-            last_trade_price = selection.loc[last_trade_index]['price']
-            ohlc.at[i, 'close'] = last_trade_price
-
-        return ohlc
+        Returns a dataframe indexed by period start (datetime) with rows of candlestick data in the following format: ['low', 'high', 'open', 'close', 'volume']
+        """
+        # Period time corresponds to beginning of period. Aggregation is fully vectorized, see Preprocessing.resample.
+        # Open and close are the first and last trade of each period; the original per-candle loop had them swapped
+        return trades_to_ohlc(trades['time'].values, trades['price'].values, trades['volume'].values, self.interval)
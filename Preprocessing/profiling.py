@@ -0,0 +1,172 @@
+"""
+Profiling
+Lightweight instrumentation for the data pipeline: span timers per stage, counters for rows, bytes and requests, and
+optional cProfile and tracemalloc capture. Everything records into the shared module level `profiler`, which is
+thread safe so concurrent downloads can report into it, and which writes a JSON per-stage report at the end of a run.
+
+Spans cost a couple of microseconds, so they are left on permanently. cProfile and tracemalloc are much more expensive
+and are only used when enabled with profiler.configure()
+"""
+import atexit
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+
+class Profiler:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.cprofile = False
+        self.memory = False
+        self.reset()
+
+    def reset(self):
+        """
+        Clears every recorded span, counter and capture
+        """
+        with self.lock:
+            self.spans = {}
+            self.counters = {}
+            self.profiles = {}
+            self.started = time.time()
+
+    def configure(self, cprofile=False, memory=False):
+        """
+        Turns the expensive captures on or off
+        :cprofile: run cProfile inside spans opened with capture=True and keep their slowest functions in the report
+        :memory: trace allocations with tracemalloc, recording each span's net allocation and the run's peak
+        """
+        self.cprofile = cprofile
+        self.memory = memory
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        elif not memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    @contextmanager
+    def span(self, name, capture=False):
+        """
+        Times a block as one call of stage :name:, e.g. `with profiler.span('kraken.to_ohlc'):`. Spans opened inside
+        another span on the same thread are also recorded under the outer span's name, e.g. 'processor.historical_download/gdax.download'
+        :capture: profile the block with cProfile if enabled by configure(). Use on outer stages only, since cProfile
+        only sees the calling thread and cannot be nested
+        """
+        stack = getattr(self.local, 'stack', None)
+        if stack is None:
+            stack = self.local.stack = []
+        path = '/'.join(stack + [name])
+        stack.append(name)
+
+        profile = None
+        if capture and self.cprofile and not getattr(self.local, 'profiling', False):
+            profile = cProfile.Profile()
+            self.local.profiling = True
+            profile.enable()
+        memory_start = tracemalloc.get_traced_memory()[0] if self.memory else 0
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            allocated = tracemalloc.get_traced_memory()[0] - memory_start if self.memory else None
+            if profile is not None:
+                profile.disable()
+                self.local.profiling = False
+                self.add_profile(path, profile)
+            stack.pop()
+            self.record(name, elapsed, allocated)
+            if path != name:
+                self.record(path, elapsed, allocated)
+
+    def profiled(self, name, rows=False, capture=False):
+        """
+        Decorator version of span for functions and methods
+        :rows: count len() of the return value under '{name}.rows', e.g. for functions returning dataframes
+        :capture: see span
+        """
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.span(name, capture):
+                    result = function(*args, **kwargs)
+                if rows and hasattr(result, '__len__'):
+                    self.count(name + '.rows', len(result))
+                return result
+            return wrapper
+        return decorator
+
+    def record(self, name, seconds, allocated=None):
+        """
+        Adds one timed call to stage :name:. Use directly for durations that were measured elsewhere
+        """
+        with self.lock:
+            stage = self.spans.get(name)
+            if stage is None:
+                stage = self.spans[name] = {'calls': 0, 'total_seconds': 0.0, 'max_seconds': 0.0}
+            stage['calls'] += 1
+            stage['total_seconds'] += seconds
+            stage['max_seconds'] = max(stage['max_seconds'], seconds)
+            if allocated is not None:
+                stage['allocated_bytes'] = stage.get('allocated_bytes', 0) + allocated
+
+    def count(self, name, value=1):
+        """
+        Adds :value: to counter :name:, e.g. profiler.count('http.bytes', len(response.content))
+        """
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def add_profile(self, name, profile, limit=25):
+        """
+        Keeps the :limit: functions with the highest cumulative time from a cProfile run
+        """
+        stream = io.StringIO()
+        pstats.Stats(profile, stream=stream).sort_stats('cumulative').print_stats(limit)
+        with self.lock:
+            self.profiles[name] = stream.getvalue()
+
+    def report(self):
+        """
+        Returns the per-stage report as a dict, with stages sorted by total time
+        """
+        with self.lock:
+            stages = {name: dict(stage, mean_seconds=stage['total_seconds'] / stage['calls']) for name, stage in self.spans.items()}
+            report = {
+                'wall_seconds': time.time() - self.started,
+                'stages': dict(sorted(stages.items(), key=lambda item: -item[1]['total_seconds'])),
+                'counters': dict(self.counters),
+            }
+            if self.profiles:
+                report['profiles'] = dict(self.profiles)
+        if self.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            report['memory'] = {'current_bytes': current, 'peak_bytes': peak}
+        return report
+
+    def write_report(self, path):
+        """
+        Writes the report as JSON to :path:, creating its directory if needed
+        """
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+
+    def report_at_exit(self, path):
+        """
+        Writes the report to :path: when the interpreter exits, including after an interrupt, for long running scripts
+        """
+        atexit.register(self.write_report, path)
+
+
+profiler = Profiler()
@@ -0,0 +1,41 @@
+"""
+Rate limiting
+Thread-safe token bucket used to keep concurrent API requests within each exchange's published limits
+"""
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter. Tokens refill continuously at :rate: per second up to :capacity:, and each request
+    consumes one token. A single bucket should be shared by every thread that talks to the same API
+    """
+
+    def __init__(self, rate, capacity=1):
+        """
+        :rate: sustained number of requests allowed per second
+        :capacity: maximum burst size, in requests
+        """
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """
+        Blocks until :tokens: are available and consumes them. Returns the time spent waiting in seconds
+        """
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return waited
+                delay = (tokens - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
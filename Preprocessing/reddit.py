@@ -9,27 +9,51 @@ score for each time period.
 import os
 from urllib.request import urlretrieve, urlopen
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 import pytz
-import tqdm
 
 # Import data science packages
 import numpy as np
 import pandas as pd
 
-# Import reddit related packages
-import praw
-import pdb
 import re
 
-# Import Google NLP API
-from google.cloud import language
-from google.cloud.language import enums
-from google.cloud.language import types
-from google.oauth2 import service_account
-
 from Preprocessing.base_class import Preprocessor
-from Preprocessing.helpers import date_to_iso8601, date_to_interval
+from Preprocessing.helpers import date_to_iso8601
+from Preprocessing.resample import floor_timestamps
+from Preprocessing.sentiment import SentimentBackend, LexiconSentiment, GoogleNLPSentiment, CachedSentiment
+
+# Coin synonyms that are normalized to their ticker in comment text. Matched as whole tokens, case-insensitively
+DEFAULT_SYNONYMS = {
+    'ETH': ["ethereum", "ethereum's", "eth's", "ether's", "ether", "ethers", "etherium", "eth/usd", "eth/eur", "eth/cny"],
+    'BTC': ["bitcoin", "bitcoin's", "btc's", "bitc", "bitcoins", "btc/usd", "btc/eur", "btc/cny"],
+    'LTC': ["litecoin", "litcoin", "litecoin's", "litcoin's", "ltc's", "ltc/usd", "ltc/eur", "ltc/cny"],
+}
+
+def trie_pattern(words):
+    """
+    Builds a regex matching any of :words: as a prefix trie, e.g. ['ether', 'ethereum'] -> 'ether(?:eum)?', which is
+    much faster to match than a flat alternation of every word. Longer words are preferred over their prefixes
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for character in word:
+            node = node.setdefault(character, {})
+        node[''] = None # End of word marker
+
+    def build(node):
+        branches = [re.escape(character) + build(child) for character, child in sorted(node.items()) if character]
+        if not branches:
+            return ''
+        pattern = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if '' in node:
+            pattern = '(?:' + pattern + ')?'
+        return pattern
+
+    return build(trie)
 
 # Define
 class Reddit_Scanner(Preprocessor):
@@ -41,29 +65,77 @@ class Reddit_Scanner(Preprocessor):
     the number of comments being made (magnitude/vocality)
     """
 
-    def __init__(self, interval, start_time, end_time):
+    source_name = 'reddit'
+    profiled_methods = Preprocessor.profiled_methods + ('get_raw_comments', 'scrub_reddit_comments')
+    columns = {'Volume': 'volume', 'Sentiment_Score': 'sentiment_score', 'Sentiment_Magnitude': 'sentiment_magnitude',
+               'BTC_Score': 'btc_score', 'BTC_Magnitude': 'btc_magnitude', 'ETH_Score': 'eth_score',
+               'ETH_Magnitude': 'eth_magnitude', 'LTC_Score': 'ltc_score', 'LTC_Magnitude': 'ltc_magnitude'}
+
+    def __init__(self, interval, start_time, end_time, synonyms=None):
         """
         :interval: Interval in minutes
         :start_time: How far back to collect data, as a datetime object
         :end_time: Latest datapoint, as a datetime object
+        :synonyms: dict of {ticker: [synonyms]} to normalize in comment text. Defaults to DEFAULT_SYNONYMS
         """
         self.interval = interval
         self.start_time = start_time
         self.end_time = end_time
+        self.set_synonyms(synonyms or DEFAULT_SYNONYMS)
+
+    @classmethod
+    def create(cls, interval, start_time, end_time, resources):
+        """
+        Builds an authenticated instance from the 'reddit_credentials' (client ID, client secret) and
+        'include_sentiment_analysis' resources of a historical_download run
+        """
+        scanner = cls(interval, start_time, end_time)
+        client_ID, client_secret = resources['reddit_credentials']
+        scanner.authenticate(client_ID, client_secret, include_sentiment_analysis=resources.get('include_sentiment_analysis', False))
+        return scanner
 
-    def authenticate(self, client_ID, client_secret, include_sentiment_analysis=False):
+    def set_synonyms(self, synonyms):
         """
-        Authenticate with Reddit and Google Cloud
+        Compiles the synonym map into a single regex so all synonyms are replaced in one pass over each comment
+        :synonyms: dict of {ticker: [synonyms]}
         """
+        self.synonyms = {alias.lower(): ticker for ticker, aliases in synonyms.items() for alias in aliases}
+        # Synonyms are matched as whole tokens, so "ether" doesn't match inside "ethers" or "ether/usd". The leading
+        # character class lets the regex engine skip most positions without trying the alternatives
+        first_characters = ''.join(sorted(set(alias[0] for alias in self.synonyms)))
+        self.synonym_pattern = re.compile(r"(?=[{}])(?<![\w/]){}(?![\w/])".format(re.escape(first_characters), trie_pattern(self.synonyms)))
+
+    def authenticate(self, client_ID, client_secret, include_sentiment_analysis=False, sentiment_backend='lexicon',
+                     sentiment_cache='./sentiment_cache.sqlite'):
+        """
+        Authenticate with Reddit and set up sentiment analysis
+        :sentiment_backend: 'lexicon' for the fast offline scorer, 'google' for the Google Cloud NLP API, or any
+        SentimentBackend instance
+        :sentiment_cache: path of the on-disk sentiment cache for remote backends, or None to disable caching
+        """
+        import praw # Only needed for live downloads, so tests and replays run without it
         self.reddit = praw.Reddit(user_agent='Comment Extraction (by /u/kibbl3)',
              client_id=client_ID, client_secret=client_secret)
 
-        # Initialize Google NLP API credentials
         self.include_sentiment_analysis = include_sentiment_analysis
         if self.include_sentiment_analysis:
-            creds = service_account.Credentials.from_service_account_file(
-            './Traderbot-5d2e0a1af0a9.json')
-            self.NLP_client = language.LanguageServiceClient(credentials=creds)
+            if sentiment_backend == 'lexicon':
+                backend = LexiconSentiment()
+            elif sentiment_backend == 'google':
+                # Initialize Google NLP API credentials
+                from google.cloud import language
+                from google.oauth2 import service_account
+                creds = service_account.Credentials.from_service_account_file(
+                './Traderbot-5d2e0a1af0a9.json')
+                backend = GoogleNLPSentiment(language.LanguageServiceClient(credentials=creds))
+            elif isinstance(sentiment_backend, SentimentBackend):
+                backend = sentiment_backend
+            else:
+                raise ValueError("sentiment backend {} not recognised".format(sentiment_backend))
+            # The lexicon scorer is cheaper than a cache lookup, so only remote backends are cached
+            if sentiment_cache and not isinstance(backend, LexiconSentiment):
+                backend = CachedSentiment(backend, sentiment_cache)
+            self.sentiment = backend
 
     def get_training_data(self, topic):
         """
@@ -78,16 +150,11 @@ class Reddit_Scanner(Preprocessor):
         raw_comments = self.get_raw_comments(topic)
         raw_comments = self.scrub_reddit_comments(raw_comments, start_timestamp, end_timestamp)
 
-        # Calls GCloud NLP API for sentiment analysis
+        # Score all comments in one call to the sentiment backend and assign the results column-wise
         if self.include_sentiment_analysis:
-            for i, row in raw_comments.iterrows():
-                text = row['Comment_Text']
-                document = types.Document(
-                    content=text,
-                    type=enums.Document.Type.PLAIN_TEXT)
-                sentiment = self.NLP_client.analyze_sentiment(document=document)
-                row['Sentiment_Score'] = sentiment.document_sentiment.score
-                row['Sentiment_Magnitude'] = sentiment.document_sentiment.magnitude
+            sentiment = self.sentiment.score(raw_comments['Comment_Text'].tolist())
+            raw_comments['Sentiment_Score'] = sentiment[:, 0]
+            raw_comments['Sentiment_Magnitude'] = sentiment[:, 1]
 
         # Convert dataframe from objects to float for numerical analysis
         raw_comments[['Sentiment_Score','Sentiment_Magnitude', "ETH_Score", "ETH_Magnitude","BTC_Score", "BTC_Magnitude", "LTC_Score", "LTC_Magnitude"]] = raw_comments[['Sentiment_Score','Sentiment_Magnitude',"ETH_Score", "ETH_Magnitude", "BTC_Score", "BTC_Magnitude", "LTC_Score", "LTC_Magnitude"]].apply(pd.to_numeric)
@@ -119,9 +186,13 @@ class Reddit_Scanner(Preprocessor):
         # Get all comments for rising or controversial posts
         raise NotImplementedError("{} must override step()".format(self.__class__.__name__))
 
-    def get_raw_comments(self, subreddit):
+    def get_raw_comments(self, subreddit, limit=5000, max_workers=8):
         """
-        Creates and populates a dataframe of raw_comments for a given subreddit
+        Creates and populates a dataframe of raw_comments for a given subreddit. Posts' comment trees are fetched
+        concurrently by a bounded pool of workers, and comments are collected column by column so the dataframe is only
+        built once. self.reddit can be replaced by a fake praw client, see tests/test_reddit.py
+        :limit: number of hot posts to scan
+        :max_workers: number of posts fetched at once
         """
 
         subreddit = self.reddit.subreddit(subreddit)
@@ -134,24 +205,48 @@ class Reddit_Scanner(Preprocessor):
             "ETH_Score", "ETH_Magnitude",
             "BTC_Score", "BTC_Magnitude",
             "LTC_Score", "LTC_Magnitude"]
-        raw_comments = pd.DataFrame([], columns=columns, dtype=float)
+        comment_columns = columns[:8]
+        data = {column: [] for column in comment_columns}
 
-        all_posts = subreddit.hot(limit=5000)
+        all_posts = subreddit.hot(limit=limit)
         counter = 0
-        for post in all_posts:
-            post.comments.replace_more(limit=None)
-            for comment in post.comments.list():
-                #print(datetime.fromtimestamp(comment.created_utc))
-                new_line = [[
-                    post.id, post.created_utc, post.score,
-                    comment.id, comment.body, comment.created_utc,
-                    comment.score, comment.parent_id,
-                    0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0]] # 0.0 placeholders until NLP results returned
-                raw_comments = raw_comments.append(pd.DataFrame(new_line, columns=columns),ignore_index=True)
-            counter += 1
-            print('post {}'.format(counter))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # At most max_workers * 2 posts are in flight, so memory stays bounded however many posts are scanned
+            pending = deque()
+            for post in all_posts:
+                pending.append(executor.submit(self.get_post_comments, post))
+                if len(pending) >= max_workers * 2:
+                    counter = self.collect_post_comments(pending.popleft(), data, comment_columns, counter)
+            while pending:
+                counter = self.collect_post_comments(pending.popleft(), data, comment_columns, counter)
+
+        raw_comments = pd.DataFrame(data, columns=columns)
+        raw_comments[columns[8:]] = 0.0 # 0.0 placeholders until NLP results returned
         return raw_comments
 
+    def get_post_comments(self, post):
+        """
+        Expands and flattens the full comment tree of a post
+        Returns a list of comment rows in the format [Post_ID, Post_Date, Post_Score, Comment_ID, Comment_Text, Comment_Date, Comment_Score, Replying_to_ID]
+        """
+        post.comments.replace_more(limit=None)
+        return [(post.id, post.created_utc, post.score,
+                 comment.id, comment.body, comment.created_utc,
+                 comment.score, comment.parent_id) for comment in post.comments.list()]
+
+    def collect_post_comments(self, future, data, columns, counter):
+        """
+        Appends the comment rows returned by a get_post_comments future to the column lists in :data:
+        Returns the updated post counter
+        """
+        rows = future.result()
+        if rows:
+            for column, values in zip(columns, zip(*rows)):
+                data[column].extend(values)
+        counter += 1
+        print('post {}'.format(counter))
+        return counter
+
     def scrub_reddit_comments(self, raw_comments, start_timestamp, end_timestamp):
         """
         Scrubs a reddit dataframe defined by get_raw_comments to only the time period, and also cleans up naming, time periods, etc
@@ -163,42 +258,21 @@ class Reddit_Scanner(Preprocessor):
         #print("shape after removing comments before start date is ", raw_comments.shape)
         raw_comments = raw_comments[raw_comments['Comment_Date'] < end_timestamp]
         #print("shape after removing comments after end date is ", raw_comments.shape)
-        discarded_comments = raw_comments[raw_comments['Comment_Text'].map(len) < 100]
-        raw_comments = raw_comments[raw_comments['Comment_Text'].map(len) >= 100]
+        comment_length = raw_comments['Comment_Text'].str.len()
+        discarded_comments = raw_comments[comment_length < 100]
+        raw_comments = raw_comments[comment_length >= 100]
         #print("final shape is ", raw_comments.shape)
         #print(discarded_comments[:50]['Comment_Text']) # Check what's being discarded_comments
 
         # Add periods for later aggregation
+        raw_comments = raw_comments.copy()
         raw_comments['datetime'] = pd.to_datetime(raw_comments['Comment_Date'], unit='s') # Reformat unix timestamp as datetime
-        raw_comments['period'] = raw_comments['datetime'].map(lambda x: date_to_interval(x, self.interval))
-
-        # Replace synonyms for ETH, BTC, and LTC. If multiple terms comes up (e.g. ETH and ether)
-        raw_comments = raw_comments.apply(lambda x: x.astype(str).str.lower())
-        raw_comments = raw_comments.replace("ethereum", "ETH")
-        raw_comments = raw_comments.replace("ethereum's", "ETH")
-        raw_comments = raw_comments.replace("eth's", "ETH")
-        raw_comments = raw_comments.replace("ether's", "ETH")
-        raw_comments = raw_comments.replace("ether", "ETH")
-        raw_comments = raw_comments.replace("ethers", "ETH")
-        raw_comments = raw_comments.replace("etherium", "ETH")
-        raw_comments = raw_comments.replace("eth/usd", "ETH")
-        raw_comments = raw_comments.replace("eth/eur", "ETH")
-        raw_comments = raw_comments.replace("eth/cny", "ETH")
-        raw_comments = raw_comments.replace("bitcoin", "BTC")
-        raw_comments = raw_comments.replace("bitcoin's", "BTC")
-        raw_comments = raw_comments.replace("btc's", "BTC")
-        raw_comments = raw_comments.replace("bitc", "BTC")
-        raw_comments = raw_comments.replace("bitcoins", "BTC")
-        raw_comments = raw_comments.replace("btc/usd", "BTC")
-        raw_comments = raw_comments.replace("btc/eur", "BTC")
-        raw_comments = raw_comments.replace("btc/cny", "BTC")
-        raw_comments = raw_comments.replace("litecoin", "LTC")
-        raw_comments = raw_comments.replace("litcoin", "LTC")
-        raw_comments = raw_comments.replace("litecoin's", "LTC")
-        raw_comments = raw_comments.replace("litcoin's", "LTC")
-        raw_comments = raw_comments.replace("ltc's", "LTC")
-        raw_comments = raw_comments.replace("ltc/usd", "LTC")
-        raw_comments = raw_comments.replace("ltc/eur", "LTC")
-        raw_comments = raw_comments.replace("ltc/cny", "LTC")
+        raw_comments['period'] = pd.to_datetime(floor_timestamps(raw_comments['Comment_Date'].values, self.interval), unit='s')
+
+        # Lowercase the comment text and replace synonyms for ETH, BTC, and LTC with their ticker in a single regex pass.
+        # Other columns keep their dtypes
+        lookup = self.synonyms
+        replace = lambda match: lookup[match.group(0)]
+        raw_comments['Comment_Text'] = [self.synonym_pattern.sub(replace, text) for text in raw_comments['Comment_Text'].str.lower()]
 
         return raw_comments
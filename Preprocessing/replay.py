@@ -0,0 +1,262 @@
+"""
+Record / Replay
+Captures what the data sources download into one compressed local archive (a zip file), then serves later runs from it
+at disk speed without touching the network. Sources that download through the shared HTTPTransport (GDAX and Kraken)
+are recorded at the transport level: each raw API response is stored keyed by its request, and on replay the unchanged
+preprocessor parses the same responses, so the output is identical. Sources using their own clients (reddit, Google
+Trends) or local files are recorded as whole get_training_data frames by ReplaySource.
+The candle store is bypassed while recording or replaying, so the archive always holds the whole period.
+Replay can add a simulated latency per request, and honour the sources' rate limiters, to benchmark the download
+scheduler offline.
+
+    replay = Replay('./replay/2017.zip', record=True)   # First run, downloads and records
+    replay = Replay('./replay/2017.zip', latency=0.2)   # Later runs
+    processor.historical_download(start, end, 5, replay=replay)
+"""
+import hashlib
+import json
+import os
+import pickle
+import threading
+import time
+import zipfile
+from urllib.parse import urlparse
+
+from Preprocessing.base_class import Preprocessor
+from Preprocessing.profiling import profiler
+from Preprocessing.transport import HTTPTransport, TransportError
+
+
+class ReplayArchive:
+    """
+    Zip archive of recorded responses and frames, safe to share between download threads
+    """
+    def __init__(self, path, record=False):
+        """
+        :path: archive file. Recording adds to an existing archive
+        :record: open for recording rather than replay
+        """
+        self.path = path
+        self.record = record
+        directory = os.path.dirname(path)
+        if record and directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        if not record and not os.path.exists(path):
+            raise IOError("no replay archive at {}. Record one first with Replay(path, record=True)".format(path))
+        self.zip = zipfile.ZipFile(path, 'a' if record else 'r', compression=zipfile.ZIP_DEFLATED)
+        self.names = set(self.zip.namelist())
+        self.lock = threading.Lock()
+
+    def key(self, kind, *parts):
+        """
+        Entry name for a request or frame, e.g. http/{sha1 of the method, url and parameters}
+        """
+        return '{}/{}'.format(kind, hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest())
+
+    def read(self, name):
+        """
+        Returns the bytes stored under :name:, or None if it wasn't recorded
+        """
+        if name not in self.names:
+            return None
+        with self.lock:
+            return self.zip.read(name)
+
+    def write(self, name, content, description=''):
+        """
+        Stores :content: bytes under :name:, unless already recorded
+        :description: readable note stored as the entry's comment, e.g. the request URL
+        """
+        with self.lock:
+            if name in self.names:
+                return
+            info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            info.comment = description.encode()[:65535]
+            self.zip.writestr(info, content)
+            self.names.add(name)
+
+    def close(self):
+        with self.lock:
+            self.zip.close()
+
+
+class ReplayResponse:
+    """
+    Recorded response with the parts of requests.Response the preprocessors use
+    """
+    status_code = 200
+
+    def __init__(self, url, content):
+        self.url = url
+        self.content = content
+        self.headers = {}
+
+    @property
+    def text(self):
+        return self.content.decode()
+
+    def json(self):
+        return json.loads(self.text)
+
+
+def request_key(archive, method, url, params, data):
+    return archive.key('http', method, url, sorted((params or {}).items()), data)
+
+
+def request_description(method, url, params):
+    return '{} {} {}'.format(method, url, json.dumps(params or {}, sort_keys=True, default=str))
+
+
+class RecordingTransport(HTTPTransport):
+    """
+    HTTPTransport that stores every successful response in the archive
+    """
+    def __init__(self, archive, **options):
+        """
+        :options: see HTTPTransport
+        """
+        super().__init__(**options)
+        self.archive = archive
+
+    def request(self, method, url, params=None, data=None, headers=None, rate_limiter=None, retry_if=None):
+        response = super().request(method, url, params=params, data=data, headers=headers, rate_limiter=rate_limiter, retry_if=retry_if)
+        self.archive.write(request_key(self.archive, method, url, params, data), response.content,
+                           request_description(method, url, params))
+        return response
+
+
+class ReplayTransport(HTTPTransport):
+    """
+    HTTPTransport that answers from the archive instead of the network, keeping the same per-host metrics
+    """
+    def __init__(self, archive, latency=0.0, rate_limits=False, **options):
+        """
+        :latency: simulated seconds per request
+        :rate_limits: acquire the sources' rate limiters as a live download would
+        """
+        super().__init__(**options)
+        self.archive = archive
+        self.latency = latency
+        self.rate_limits = rate_limits
+
+    def request(self, method, url, params=None, data=None, headers=None, rate_limiter=None, retry_if=None):
+        """
+        Returns the recorded response for the request. Raises TransportError if it wasn't recorded, e.g. because the
+        time period or sources differ from the recording run
+        """
+        if self.rate_limits and rate_limiter is not None:
+            with profiler.span('http.rate_limit_wait'):
+                rate_limiter.acquire()
+        start = time.time()
+        if self.latency:
+            time.sleep(self.latency)
+        content = self.archive.read(request_key(self.archive, method, url, params, data))
+        host = urlparse(url).netloc
+        if content is None:
+            self.record(host, time.time() - start, error=True)
+            raise TransportError('No recorded response in {} for {}'.format(self.archive.path, request_description(method, url, params)))
+        self.record(host, time.time() - start, size=len(content))
+        return ReplayResponse(url, content)
+
+
+class ReplaySource(Preprocessor):
+    """
+    Wraps a preprocessor that doesn't download through the HTTPTransport, recording or replaying its get_training_data
+    and get_test_data frames. Feature naming is left to the wrapped preprocessor
+    """
+    source_name = 'replay'
+
+    def __init__(self, source, archive, latency=0.0):
+        """
+        :source: the Preprocessor instance to record, or on replay an unauthenticated instance for the same period
+        :latency: simulated seconds per frame
+        """
+        self.source = source
+        self.archive = archive
+        self.latency = latency
+        self.columns = source.columns
+        self.fill_limit = source.fill_limit
+
+    def get_training_data(self, topic):
+        return self.frame('get_training_data', topic)
+
+    def get_test_data(self, topic):
+        return self.frame('get_test_data', topic)
+
+    def frame(self, method, topic):
+        source = self.source
+        name = self.archive.key('frame', source.source_name, method, topic, source.interval, source.start_time, source.end_time)
+        if self.archive.record:
+            frame = getattr(source, method)(topic)
+            self.archive.write(name, pickle.dumps(frame, protocol=pickle.HIGHEST_PROTOCOL),
+                               '{} {} {} {} {}'.format(source.source_name, method, topic, source.start_time, source.end_time))
+            return frame
+        if self.latency:
+            time.sleep(self.latency)
+        content = self.archive.read(name)
+        if content is None:
+            raise KeyError("no recorded {} {} frame for {} from {} to {} in {}".format(
+                source.source_name, method, topic, source.start_time, source.end_time, self.archive.path))
+        return pickle.loads(content)
+
+    def feature_names(self, prefix):
+        return self.source.feature_names(prefix)
+
+    def gap_feature(self, prefix):
+        return self.source.gap_feature(prefix)
+
+    def to_features(self, data, prefix):
+        return self.source.to_features(data, prefix)
+
+
+class Replay:
+    """
+    Record or replay settings for a processor.historical_download run
+    """
+    def __init__(self, path, record=False, latency=0.0, rate_limits=False):
+        """
+        :path: archive file, e.g. ./replay/2017.zip
+        :record: download as usual and record everything into the archive. Otherwise serve everything from it
+        :latency: simulated seconds per API request, and per frame for sources recorded as frames
+        :rate_limits: on replay, still wait on the sources' rate limiters
+        """
+        self.archive = ReplayArchive(path, record)
+        self.record = record
+        self.latency = latency
+        self.rate_limits = rate_limits
+
+    def transport(self, **options):
+        """
+        Returns the HTTPTransport for the run's resources
+        :options: see HTTPTransport
+        """
+        if self.record:
+            return RecordingTransport(self.archive, **options)
+        return ReplayTransport(self.archive, self.latency, self.rate_limits, **options)
+
+    def create(self, source_type, interval, start_time, end_time, resources):
+        """
+        Builds a preprocessor like source_type.create, wrapped in a ReplaySource unless it downloads through the
+        HTTPTransport in :resources:. Replayed frame sources aren't created with create(), so e.g. reddit needs no
+        credentials
+        """
+        if source_type.http_transport:
+            return source_type.create(interval, start_time, end_time, resources)
+        if self.record:
+            source = source_type.create(interval, start_time, end_time, resources)
+        else:
+            source = source_type(interval, start_time, end_time)
+        return ReplaySource(source, self.archive, self.latency)
+
+    def close(self):
+        """
+        Closes the archive. Needed after recording to write the zip directory
+        """
+        self.archive.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,109 @@
+"""
+Resampling helpers
+Vectorized conversion of raw trade / timestamp data onto fixed candle intervals
+"""
+import numpy as np
+import pandas as pd
+
+from Preprocessing.profiling import profiler
+
+
+def floor_timestamps(timestamps, interval):
+    """
+    Rounds unix timestamps DOWN to the start of their candle interval
+    :timestamps: array-like of unix timestamps in seconds (int or float)
+    :interval: candle interval in minutes. Any whole number of minutes is supported
+    Returns an int64 numpy array of period start times in unix seconds
+    """
+    step = int(interval * 60)
+    seconds = np.floor(np.asarray(timestamps, dtype=np.float64)).astype(np.int64)
+    return seconds - np.mod(seconds, step)
+
+
+@profiler.profiled('resample.trades_to_ohlc', rows=True)
+def trades_to_ohlc(times, prices, volumes, interval):
+    """
+    Aggregates individual trades into OHLC candles in a single sorted pass
+    :times: array-like of trade unix timestamps in seconds
+    :prices: array-like of trade prices
+    :volumes: array-like of trade volumes
+    :interval: candle interval in minutes
+    Returns a dataframe indexed by period start (datetime) with columns ['low', 'high', 'open', 'close', 'volume']
+    """
+    times = np.asarray(times, dtype=np.float64)
+    prices = np.asarray(prices, dtype=np.float64)
+    volumes = np.asarray(volumes, dtype=np.float64)
+    columns = ['low', 'high', 'open', 'close', 'volume']
+    if len(times) == 0:
+        return pd.DataFrame(index=pd.DatetimeIndex([]), columns=columns, dtype=np.float64)
+
+    # Stable sort on trade time so that the first / last trade of each period are the open / close
+    order = np.argsort(times, kind='mergesort')
+    times = times[order]
+    prices = prices[order]
+    volumes = volumes[order]
+
+    # Periods are monotonic after sorting, so each candle is a contiguous run of trades
+    periods = floor_timestamps(times, interval)
+    starts = np.flatnonzero(np.r_[True, periods[1:] != periods[:-1]])
+    ends = np.r_[starts[1:], len(periods)] - 1
+
+    ohlc = pd.DataFrame({
+        'low': np.minimum.reduceat(prices, starts),
+        'high': np.maximum.reduceat(prices, starts),
+        'open': prices[starts],
+        'close': prices[ends],
+        'volume': np.add.reduceat(volumes, starts),
+    }, index=pd.to_datetime(periods[starts], unit='s'), columns=columns)
+    return ohlc
+
+
+def candle_grid(start_time, end_time, interval):
+    """
+    Start times of every candle strictly between :start_time: and :end_time:, the common time grid all feature sources
+    are aligned onto
+    :start_time: :end_time: unix timestamps in seconds
+    :interval: candle interval in minutes
+    Returns an int64 numpy array of unix seconds
+    """
+    step = int(interval * 60)
+    first = floor_timestamps([start_time], interval)[0] + step
+    return np.arange(first, int(np.ceil(end_time)), step, dtype=np.int64)
+
+
+def align_to_grid(times, values, grid, interval, max_fill=None):
+    """
+    Aligns one source's observations onto a candle grid. Observations are snapped to the start of their interval (the
+    last one wins if several fall in the same interval), and intervals without an observation are forward filled from
+    the latest earlier observation, but only up to :max_fill: minutes old. Longer gaps, e.g. an exchange outage, are
+    left as NaN rather than filled over
+    :times: array-like of observation unix timestamps in seconds, in any order
+    :values: 2D array of (observations, columns)
+    :grid: int64 array of candle start times from candle_grid
+    :interval: candle interval in minutes
+    :max_fill: maximum age in minutes of a forward filled value. None fills gaps of any length, 0 disables filling
+    Returns a tuple of (aligned values of shape (len(grid), columns), boolean gap mask that is True for every grid row
+    without an observation of its own)
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if values.ndim == 1:
+        values = values[:, np.newaxis]
+    aligned = np.full((len(grid), values.shape[1]), np.nan)
+    if len(times) == 0:
+        return aligned, np.ones(len(grid), dtype=bool)
+
+    periods = floor_timestamps(times, interval)
+    order = np.argsort(periods, kind='mergesort')
+    periods = periods[order]
+    last = np.r_[periods[1:] != periods[:-1], True] # Keep the last observation of each interval
+    periods = periods[last]
+    values = values[order][last]
+
+    # Latest observation at or before each grid time, and how old it is
+    latest = np.searchsorted(periods, grid, side='right') - 1
+    observed = latest >= 0
+    age = np.where(observed, grid - periods[np.maximum(latest, 0)], -1)
+    if max_fill is not None:
+        observed &= age <= max_fill * 60
+    aligned[observed] = values[latest[observed]]
+    return aligned, age != 0
@@ -0,0 +1,46 @@
+"""
+Download scheduler
+Runs get_training_data calls for many (preprocessor, topic) pairs concurrently. Throughput against each API is governed
+by the rate limiter the preprocessors share, so total time approaches that of the slowest single exchange rather than the
+sum of all downloads
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+
+class DownloadScheduler:
+
+    def __init__(self, max_workers=8):
+        """
+        :max_workers: maximum number of downloads in flight at once
+        """
+        self.max_workers = max_workers
+        self.jobs = []
+
+    def add(self, name, preprocessor, topic):
+        """
+        Queues a download
+        :name: key under which the result will be returned
+        :preprocessor: a Preprocessor instance (e.g. GDAX or Kraken) configured for the time period
+        :topic: argument passed to the preprocessor's get_training_data, e.g. the currency pair
+        """
+        self.jobs.append((name, preprocessor, topic))
+
+    def run(self):
+        """
+        Runs all queued downloads and waits for them to finish. If any download fails, the first error is raised once
+        the others have completed
+        Returns a dict of {name: dataframe}
+        """
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [(name, executor.submit(preprocessor.get_training_data, topic)) for name, preprocessor, topic in self.jobs]
+            errors = []
+            for name, future in futures:
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    errors.append(e)
+        self.jobs = []
+        if errors:
+            raise errors[0]
+        return results
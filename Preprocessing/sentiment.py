@@ -0,0 +1,183 @@
+"""
+Sentiment Scoring
+Pluggable sentiment backends for scoring comment text. Every backend scores a list of texts at once and returns an array
+of [score, magnitude] rows, where score is in [-1, 1] and magnitude is the non-negative strength of emotion, as in the
+Google Natural Language API. Backends can be wrapped in CachedSentiment so that the same text is never scored twice
+"""
+import hashlib
+import math
+import os
+import re
+import sqlite3
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+from Preprocessing.profiling import profiler
+
+# Small general purpose and crypto-specific lexicon used by the offline scorer. Valences roughly follow the VADER scale
+DEFAULT_LEXICON = {
+    'good': 1.9, 'great': 3.1, 'excellent': 3.2, 'amazing': 2.8, 'awesome': 3.1, 'love': 3.2, 'like': 1.5, 'best': 3.2,
+    'better': 1.9, 'happy': 2.7, 'win': 2.8, 'winning': 2.4, 'profit': 1.9, 'profits': 1.9, 'gain': 2.0, 'gains': 2.0,
+    'strong': 2.3, 'safe': 1.9, 'secure': 1.4, 'promising': 1.7, 'exciting': 2.2, 'optimistic': 1.8, 'confident': 2.2,
+    'support': 1.7, 'adoption': 1.2, 'up': 0.6, 'rise': 1.0, 'rising': 1.0, 'rally': 1.8, 'recover': 1.2, 'recovery': 1.2,
+    'bull': 1.5, 'bullish': 2.2, 'moon': 2.0, 'mooning': 2.4, 'hodl': 1.0, 'undervalued': 1.3, 'breakout': 1.5, 'ath': 1.8,
+    'bad': -2.5, 'terrible': -2.1, 'awful': -2.0, 'worst': -3.1, 'worse': -2.1, 'hate': -2.7, 'sad': -2.1, 'fear': -2.2,
+    'scared': -1.9, 'panic': -2.3, 'lose': -1.8, 'losing': -1.6, 'loss': -1.3, 'losses': -1.7, 'lost': -1.3, 'weak': -1.9,
+    'risk': -1.1, 'risky': -1.4, 'down': -0.9, 'drop': -1.1, 'dropping': -1.2, 'fall': -1.3, 'falling': -1.4,
+    'crash': -2.6, 'crashing': -2.6, 'dump': -1.6, 'dumping': -1.8, 'bear': -1.2, 'bearish': -2.0, 'scam': -2.8,
+    'fraud': -2.8, 'ponzi': -2.5, 'bubble': -1.5, 'fud': -1.6, 'rekt': -2.2, 'hack': -2.0, 'hacked': -2.4, 'stolen': -2.2,
+    'overvalued': -1.3, 'manipulation': -1.9, 'ban': -2.0, 'banned': -2.1, 'regulation': -0.6, 'sell': -0.5,
+}
+NEGATIONS = {'not', 'no', 'never', "don't", "doesn't", "isn't", "wasn't", "aren't", "won't", "can't", 'cannot', 'nothing'}
+TOKEN_PATTERN = re.compile(r"[a-z']+")
+
+
+class SentimentBackend:
+    """
+    Base class for sentiment backends
+    """
+    name = 'base'
+
+    def score(self, texts):
+        """
+        Scores a list of texts. Returns a float numpy array of shape (len(texts), 2) with [score, magnitude] rows
+        """
+        raise NotImplementedError("{} must override score()".format(self.__class__.__name__))
+
+
+class LexiconSentiment(SentimentBackend):
+    """
+    Fast offline scorer summing word valences from a lexicon, with simple negation handling. Needs no network access,
+    so it can score millions of comments quickly
+    """
+    name = 'lexicon'
+
+    def __init__(self, lexicon=None, alpha=15.0):
+        """
+        :lexicon: dict of {word: valence} or path to a tab separated word/valence file such as the VADER lexicon.
+        Defaults to DEFAULT_LEXICON
+        :alpha: normalization constant mapping the summed valence into [-1, 1]
+        """
+        if isinstance(lexicon, str):
+            lexicon = load_lexicon(lexicon)
+        self.lexicon = lexicon or DEFAULT_LEXICON
+        self.alpha = alpha
+
+    @profiler.profiled('sentiment.lexicon', rows=True)
+    def score(self, texts):
+        lexicon = self.lexicon
+        results = np.zeros((len(texts), 2))
+        for i, text in enumerate(texts):
+            total = 0.0
+            magnitude = 0.0
+            negate = False
+            for token in TOKEN_PATTERN.findall(text.lower()):
+                valence = lexicon.get(token)
+                if valence is not None:
+                    if negate:
+                        valence = -0.74 * valence
+                    total += valence
+                    magnitude += abs(valence)
+                negate = token in NEGATIONS
+            results[i, 0] = total / math.sqrt(total * total + self.alpha)
+            results[i, 1] = magnitude
+        return results
+
+
+class GoogleNLPSentiment(SentimentBackend):
+    """
+    Google Cloud Natural Language API document sentiment, with requests issued concurrently in batches
+    """
+    name = 'google'
+
+    def __init__(self, client, max_workers=16, batch_size=50, rate_limiter=None):
+        """
+        :client: an authenticated google.cloud.language.LanguageServiceClient
+        :max_workers: number of requests in flight at once
+        :batch_size: number of texts each worker scores per task
+        :rate_limiter: optional TokenBucket to stay under the API quota
+        """
+        from google.cloud.language import enums, types
+        self.enums = enums
+        self.types = types
+        self.client = client
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        self.rate_limiter = rate_limiter
+
+    @profiler.profiled('sentiment.google', rows=True)
+    def score(self, texts):
+        results = np.zeros((len(texts), 2))
+        batches = [(start, texts[start:start + self.batch_size]) for start in range(0, len(texts), self.batch_size)]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for start, scores in executor.map(self.score_batch, batches):
+                results[start:start + len(scores)] = scores
+        return results
+
+    def score_batch(self, batch):
+        start, texts = batch
+        scores = []
+        for text in texts:
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            document = self.types.Document(content=text, type=self.enums.Document.Type.PLAIN_TEXT)
+            sentiment = self.client.analyze_sentiment(document=document).document_sentiment
+            scores.append((sentiment.score, sentiment.magnitude))
+        return start, scores
+
+
+class CachedSentiment(SentimentBackend):
+    """
+    Wraps another backend with an on-disk cache keyed by a hash of the backend name and text content, so re-runs never
+    score the same text again. Duplicate texts within a call are only scored once
+    """
+
+    def __init__(self, backend, path='./sentiment_cache.sqlite'):
+        """
+        :backend: the SentimentBackend to cache
+        :path: SQLite file the cache is kept in
+        """
+        self.backend = backend
+        self.name = backend.name
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        with sqlite3.connect(self.path) as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS sentiment (key TEXT PRIMARY KEY, score REAL, magnitude REAL)')
+
+    @profiler.profiled('sentiment.cache', rows=True)
+    def score(self, texts):
+        keys = [hashlib.sha1((self.name + '\0' + text).encode('utf-8')).hexdigest() for text in texts]
+        cached = {}
+        with sqlite3.connect(self.path) as connection:
+            unique_keys = list(set(keys))
+            for start in range(0, len(unique_keys), 500): # Stay under SQLite's limit on query parameters
+                chunk = unique_keys[start:start + 500]
+                rows = connection.execute('SELECT key, score, magnitude FROM sentiment WHERE key IN ({})'.format(','.join('?' * len(chunk))), chunk)
+                cached.update((key, (score, magnitude)) for key, score, magnitude in rows)
+
+            missing = {}
+            for key, text in zip(keys, texts):
+                if key not in cached and key not in missing:
+                    missing[key] = text
+            if missing:
+                scores = self.backend.score(list(missing.values()))
+                new_rows = [(key, float(score), float(magnitude)) for key, (score, magnitude) in zip(missing, scores)]
+                connection.executemany('INSERT OR REPLACE INTO sentiment VALUES (?, ?, ?)', new_rows)
+                cached.update((key, (score, magnitude)) for key, score, magnitude in new_rows)
+
+        return np.array([cached[key] for key in keys], dtype=np.float64).reshape(len(keys), 2)
+
+
+def load_lexicon(path):
+    """
+    Reads a tab separated lexicon file with a word and its valence in the first two columns, e.g. vader_lexicon.txt
+    """
+    lexicon = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            fields = line.rstrip('\n').split('\t')
+            if len(fields) >= 2:
+                lexicon[fields[0]] = float(fields[1])
+    return lexicon
@@ -0,0 +1,164 @@
+"""
+HTTP Transport
+Shared HTTP client for all preprocessors that call REST APIs. Keeps connections alive in a pooled session, retries
+throttled and failed requests with jittered exponential backoff while honouring Retry-After / rate limit headers, and
+keeps per-host request metrics
+"""
+import random
+import threading
+import time
+import requests
+from email.utils import parsedate_to_datetime
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlparse
+
+from Preprocessing.profiling import profiler
+
+
+class TransportError(Exception):
+    """
+    Raised when a request fails permanently or runs out of retries
+    """
+    def __init__(self, message, response=None):
+        super().__init__(message)
+        self.response = response
+
+
+class HTTPTransport:
+
+    retry_statuses = (429, 500, 502, 503, 504)
+
+    def __init__(self, retries=5, backoff=1.0, max_backoff=60.0, timeout=30, pool_size=16):
+        """
+        :retries: maximum attempts per request
+        :backoff: base delay in seconds for exponential backoff
+        :max_backoff: cap on a single backoff delay in seconds
+        :timeout: per-request timeout in seconds
+        :pool_size: keep-alive connections kept per host. Should be at least the number of threads using the transport
+        """
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def get(self, url, params=None, **kwargs):
+        return self.request('GET', url, params=params, **kwargs)
+
+    def post(self, url, data=None, **kwargs):
+        return self.request('POST', url, data=data, **kwargs)
+
+    def request(self, method, url, params=None, data=None, headers=None, rate_limiter=None, retry_if=None):
+        """
+        Sends a request, retrying connection errors, throttling and server errors
+        :rate_limiter: optional TokenBucket acquired before every attempt
+        :retry_if: optional function f(response) returning True if a 200 response should be treated as throttled, for
+        APIs that report rate limiting in the response body
+        Returns the successful requests.Response. Raises TransportError otherwise
+        """
+        host = urlparse(url).netloc
+        for attempt in range(self.retries):
+            if rate_limiter is not None:
+                with profiler.span('http.rate_limit_wait'):
+                    rate_limiter.acquire()
+            start = time.time()
+            try:
+                response = self.session.request(method, url, params=params, data=data, headers=headers, timeout=self.timeout)
+            except requests.RequestException as e:
+                self.record(host, time.time() - start, error=True)
+                if attempt + 1 == self.retries:
+                    raise TransportError('Request to {} failed: {}'.format(url, e))
+                self.wait(host, self.backoff_delay(attempt))
+                continue
+
+            throttled = response.status_code in self.retry_statuses or (
+                response.status_code == 200 and retry_if is not None and retry_if(response))
+            self.record(host, time.time() - start, size=len(response.content), error=response.status_code != 200,
+                        throttled=throttled)
+            if response.status_code == 200 and not throttled:
+                self.respect_rate_limit_headers(host, response)
+                return response
+            if not throttled or attempt + 1 == self.retries:
+                raise TransportError('Request to {} failed with status {}: {}'.format(url, response.status_code, response.text), response)
+            self.wait(host, max(self.retry_after(response), self.backoff_delay(attempt)))
+
+    def backoff_delay(self, attempt):
+        """
+        Exponential backoff with full jitter, so that concurrent clients don't retry in lockstep
+        """
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def retry_after(self, response):
+        """
+        Seconds to wait according to the response's Retry-After header, or 0 if there isn't one
+        """
+        value = response.headers.get('Retry-After')
+        if value is None:
+            return 0.0
+        try:
+            return float(value)
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+            except (TypeError, ValueError):
+                return 0.0
+
+    def respect_rate_limit_headers(self, host, response):
+        """
+        Pauses until the rate limit window resets if the API reports no requests remaining in it
+        """
+        remaining = response.headers.get('X-RateLimit-Remaining')
+        reset = response.headers.get('X-RateLimit-Reset')
+        if remaining is None or reset is None:
+            return
+        try:
+            if float(remaining) > 0:
+                return
+            reset = float(reset)
+        except ValueError:
+            return
+        # Reset is either seconds until the window resets or the epoch time it resets at
+        delay = reset - time.time() if reset > 1e9 else reset
+        if delay > 0:
+            self.wait(host, min(delay, self.max_backoff))
+
+    def wait(self, host, delay):
+        with self.lock:
+            self.host_metrics(host)['retry_wait_seconds'] += delay
+        profiler.record('http.backoff_wait', delay)
+        time.sleep(delay)
+
+    def record(self, host, seconds, size=0, error=False, throttled=False):
+        with self.lock:
+            metrics = self.host_metrics(host)
+            metrics['requests'] += 1
+            metrics['errors'] += int(error)
+            metrics['throttled'] += int(throttled)
+            metrics['bytes'] += size
+            metrics['request_seconds'] += seconds
+        profiler.record('http.request', seconds)
+        profiler.count('http.requests')
+        profiler.count('http.bytes', size)
+        if error or throttled:
+            profiler.count('http.throttled' if throttled else 'http.errors')
+
+    def host_metrics(self, host):
+        if host not in self.metrics:
+            self.metrics[host] = {'requests': 0, 'errors': 0, 'throttled': 0, 'bytes': 0,
+                                  'request_seconds': 0.0, 'retry_wait_seconds': 0.0}
+        return self.metrics[host]
+
+    def report(self):
+        """
+        Returns a copy of the per-host metrics, including mean request latency
+        """
+        with self.lock:
+            report = {host: dict(metrics) for host, metrics in self.metrics.items()}
+        for metrics in report.values():
+            metrics['mean_latency_seconds'] = metrics['request_seconds'] / metrics['requests'] if metrics['requests'] else 0.0
+        return report
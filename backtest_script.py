@@ -0,0 +1,44 @@
+"""
+Run a walk-forward backtest of a saved model
+"""
+import os
+from datetime import datetime
+
+import config
+from Classifier.backtest import parameter_grid, walk_forward
+from Classifier.data_processing import processor
+from Classifier.prediction_model import Neural_Net
+from Preprocessing.candle_store import CandleStore
+from Preprocessing.profiling import profiler
+
+interval = 5 # Candle interval in minutes
+start_time = datetime(2017, 1, 1)
+end_time = datetime(2018, 1, 1)
+weights_file = './saved_models/DNN_weights.hdf5'
+month = 30 * 24 * 60 // interval # Bars per month
+
+if __name__ == '__main__':
+    profiler.configure(cprofile=config.PROFILE_CPROFILE, memory=config.PROFILE_MEMORY)
+    profiler.report_at_exit(os.path.join(config.PROFILE_DIRECTORY, 'backtest_profile.json'))
+
+    # Candles already in the local store are not downloaded again
+    data = processor.historical_download(start_time, end_time, interval, store=CandleStore('./candles'))
+    test_data, test_targets, target_actuals = processor.generate_x_y(data)
+
+    network = Neural_Net(test_data.shape[1], 'DNN')
+    network.load(weights_file)
+
+    # The network predicts normalised % changes. Use the scalers saved with the weights if there are any, otherwise
+    # the test set's own statistics
+    if network.feature_scaler is not None:
+        network.feature_scaler.transform(test_data, out=test_data)
+        predictions = network.target_scaler.inverse_transform(network.predict(test_data))
+    else:
+        predictions = network.predict(test_data) * test_targets.std() + test_targets.mean()
+
+    params = parameter_grid(threshold=[0, 0.0005, 0.001, 0.002, 0.004], allow_short=[True, False], leverage=[0.5, 1.0])
+    stats, selected, returns = walk_forward(predictions, target_actuals, params, train_size=3 * month, test_size=month,
+                                            interval=interval)
+    print(selected.to_string())
+    print("out of sample total return: {:.2%}".format((1 + returns).prod() - 1))
+    stats.to_csv('backtest_results.csv', index=False)
@@ -1,3 +1,51 @@
 # TODO: Reddit credentials
 # TODO: Google API credentials
 # TODO: Twitter credentials
+
+# Feature sources joined by processor.historical_download, in column order. Each entry is
+# (feature prefix, source name, topic), where source name is the source_name of a Preprocessor subclass and topic is
+# passed to its get_training_data. Uncomment or add entries to include more pairs or data sources
+FEATURE_SOURCES = [
+    ('Ethusd', 'gdax', 'ETH-USD'),
+    ('Etheur', 'gdax', 'ETH-EUR'),
+    ('Ethusd', 'kraken', 'XETHZUSD'),
+    ('Etheur', 'kraken', 'XETHZEUR'),
+    #('Eth', 'reddit', 'Ethereum'),
+    #('Eth', 'search', 'Ethereum'),
+    #('Eth', 'blockchain', 'Blockchain_Data/Blockchain Stats - ETH_Clean.csv'),
+
+    ('Btcusd', 'gdax', 'BTC-USD'),
+    ('Btceur', 'gdax', 'BTC-EUR'),
+    ('Btcusd', 'kraken', 'XXBTZUSD'),
+    ('Btceur', 'kraken', 'XXBTZEUR'),
+    #('Btc', 'reddit', 'Bitcoin'),
+    #('Btc', 'search', 'Bitcoin'),
+    #('Btc', 'blockchain', 'Blockchain_Data/Blockchain Stats - BTC_Clean.csv'),
+
+    #('Ltcusd', 'gdax', 'LTC-USD'),
+    #('Ltceur', 'gdax', 'LTC-EUR'),
+    #('Ltcusd', 'kraken', 'XLTCZUSD'),
+    #('Ltceur', 'kraken', 'XLTCZEUR'),
+    #('Ltc', 'reddit', 'Litecoin'),
+    #('Ltc', 'search', 'Litecoin'),
+    #('Ltc', 'blockchain', 'Blockchain_Data/ltc_blockchain.csv'),
+]
+
+# Regions downloaded by the Google search trends source, as (column name, pytrends geo code). '' is worldwide
+SEARCH_REGIONS = [('Worldwide', ''), ('US', 'US'), ('GB', 'GB'), ('FR', 'FR'), ('DE', 'DE'), ('RU', 'RU'), ('KR', 'KR')]
+
+# Longest gap in minutes that historical_download forward fills in a source's data, e.g. minutes without trades.
+# Intervals in longer gaps (exchange outages) are interpolated, or dropped with historical_download(drop_gaps=True)
+MAX_FILL_MINUTES = 60
+
+# Model trained by train_script.py and used for live prediction by run_script.py. Training checkpoints the best weights
+# to WEIGHTS_FILE and saves the feature and target scalers next to it; run_script.py exports both to an .npz alongside.
+# train_script.py feeds the model one interval per sample, as the DNN takes
+MODEL_ARCHITECTURE = 'DNN'
+WEIGHTS_FILE = './saved_models/weights1.hdf5'
+
+# Profiling. Every script writes a JSON per-stage timing report to PROFILE_DIRECTORY when it exits. cProfile and
+# tracemalloc capture are slow, so they are off unless enabled here
+PROFILE_DIRECTORY = './reports'
+PROFILE_CPROFILE = False
+PROFILE_MEMORY = False
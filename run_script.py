@@ -2,29 +2,47 @@
 Run live prediction model
 """
 
+import os
+
 import config
-import h5py
-from data_processing import processor
-from prediction_model import Neural_Net
+from Classifier.data_processing import processor
+from Classifier.live import LiveFeatures, LivePredictor, PollingFeed
+from Classifier.numpy_runtime import NumpyModel
+from Preprocessing.profiling import profiler
 
-# Download datasets
+interval = 5 # Candle interval in minutes
 window = 5 # Prime the model with the last 5 intervals
 predict = 6 # Predict the next 6 time periods (30 min)
-seed_data = processor.live_download(config, window)
-
-# Initialize Neural Net
-weights_file = #
-learning_rate = #
-batch_size = #
-network = Neural_Net()
-network.model.load_weights(weights_file)
-
-# Start predicting
-prediction = network.predict(seed_data)
-Wait 1 interval
-while True: # Need to think through how to deal with the loop, data seeding, and LSTM data feed
-    data_feed = processor.live_download(config, 1)
-    prediction = network.predict(data_feed)
-    Wait 1 interval
+
+profiler.configure(cprofile=config.PROFILE_CPROFILE, memory=config.PROFILE_MEMORY)
+profiler.report_at_exit(os.path.join(config.PROFILE_DIRECTORY, 'run_profile.json'))
+
+# Initialize Neural Net. The trained Keras model is exported once to a NumPy model, which loads in well under a second
+# and predicts without importing TensorFlow. Both use the architecture and weights of train_script.py
+weights_file = config.WEIGHTS_FILE
+model_file = os.path.splitext(weights_file)[0] + '.npz'
+sources = processor.live_sources(interval)
+pairs = [pair for pair, preprocessor, topic in sources]
+if not os.path.isfile(model_file) or (os.path.isfile(weights_file) and os.path.getmtime(model_file) < os.path.getmtime(weights_file)):
+    from Classifier.prediction_model import Neural_Net
+    keras_network = Neural_Net(len(pairs) * 5, config.MODEL_ARCHITECTURE, timesteps=window)
+    keras_network.load(weights_file) # Also loads the scalers saved with the weights during training
+    keras_network.export(model_file)
+network = NumpyModel.load(model_file)
+
+# Seed the candle buffers with the most recent intervals
+features = LiveFeatures(pairs, window, sequence=config.MODEL_ARCHITECTURE == 'LSTM', scaler=network.feature_scaler)
+features.seed(processor.live_download(interval, window))
+
+# Start predicting. Features are updated incrementally as each candle closes, then the next `predict` intervals are
+# forecast autoregressively
+target_index = pairs.index('Btcusd_kraken') * 5 + 3 # Kraken BTC/USD close
+def report(timestamp, prediction):
+    if network.target_scaler is not None:
+        prediction = network.target_scaler.inverse_transform(prediction.ravel()) # Back to % change
+    print("{}: {}".format(timestamp, prediction.ravel()))
+
+predictor = LivePredictor(network, features, on_prediction=report, steps=predict, target_index=target_index)
+predictor.run(PollingFeed(sources, interval))
 
 # Save prediction data for analysis and future training
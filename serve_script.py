@@ -0,0 +1,28 @@
+"""
+Run the local model server
+"""
+import os
+
+import config
+from Classifier.model_server import ModelRegistry, ModelServer
+from Preprocessing.profiling import profiler
+
+model_directory = './saved_models' # Models exported with Neural_Net.export (*.npz), e.g. by run_script.py
+host = '127.0.0.1'
+port = 8765
+max_batch = 256 # Samples per micro-batch
+max_wait = 0.002 # Seconds a request waits for others to batch with
+
+if __name__ == '__main__':
+    profiler.configure(cprofile=config.PROFILE_CPROFILE, memory=config.PROFILE_MEMORY)
+    profiler.report_at_exit(os.path.join(config.PROFILE_DIRECTORY, 'serve_profile.json'))
+
+    registry = ModelRegistry.load(model_directory, max_batch=max_batch, max_wait=max_wait)
+    if not registry.models:
+        raise SystemExit("no exported models in {}. Export trained models with Neural_Net.export".format(model_directory))
+    server = ModelServer(registry, host, port)
+    print("serving {} on {}".format(sorted(registry.models), server.url))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
@@ -0,0 +1,35 @@
+"""
+Run a hyperparameter sweep
+"""
+import os
+from datetime import datetime
+
+import config
+from Classifier.chunked import build_dataset
+from Classifier.dataset import read_meta
+from Classifier.sweep import DEFAULT_SPACE, Sweep, configurations
+from Preprocessing.candle_store import CandleStore
+from Preprocessing.profiling import profiler
+
+start_time = datetime(2017, 1, 1)
+split_time = datetime(2017, 10, 1) # Training data before, validation data after
+end_time = datetime(2018, 1, 1)
+intervals = [5, 15, 60] # Candle intervals in minutes
+sweep_directory = './sweep'
+
+if __name__ == '__main__':
+    profiler.configure(cprofile=config.PROFILE_CPROFILE, memory=config.PROFILE_MEMORY)
+    profiler.report_at_exit(os.path.join(config.PROFILE_DIRECTORY, 'sweep_profile.json'))
+
+    # Write each interval's datasets once for the workers to memory-map. Candles already in the local store are not
+    # downloaded again
+    store = CandleStore('./candles')
+    for interval in intervals:
+        for name, (period_start, period_end) in (('train', (start_time, split_time)), ('valid', (split_time, end_time))):
+            path = os.path.join(sweep_directory, str(interval), name)
+            if read_meta(path) is None:
+                build_dataset(path, period_start, period_end, interval, store=store)
+
+    sweep = Sweep(sweep_directory, configurations(DEFAULT_SPACE, intervals), min_epochs=1, max_epochs=27, eta=3)
+    results = sweep.run()
+    print(results.head(10).to_string())
@@ -0,0 +1,84 @@
+"""
+Runs Searchtrends.get_training_data against a stub pytrends client and checks the merged output, response cache hits and
+the rate limit shared by concurrent region requests
+Run from the repository root: python -m pytest tests
+"""
+import shutil
+import tempfile
+import time
+import unittest
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+
+from Benchmarks.synthetic import stub_factory, synthetic_interest
+from Preprocessing.google_search import Searchtrends
+from Preprocessing.rate_limit import TokenBucket
+
+REGIONS = [('Worldwide', ''), ('US', 'US'), ('GB', 'GB'), ('DE', 'DE')]
+
+
+class SearchtrendsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_directory = tempfile.mkdtemp()
+        self.start_time = datetime(2017, 1, 1)
+        self.end_time = self.start_time + timedelta(days=400) # 3 slices of up to 180 days
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_directory)
+
+    def trends(self, client_factory, rate_limiter=None, max_workers=4, cache_directory=None):
+        return Searchtrends(5, self.start_time, self.end_time, regions=REGIONS, client_factory=client_factory,
+                            rate_limiter=rate_limiter or TokenBucket(rate=1000, capacity=10), max_workers=max_workers,
+                            cache_directory=cache_directory)
+
+    def test_merged_output(self):
+        factory, calls = stub_factory()
+        data = self.trends(factory).get_training_data('Bitcoin')
+        self.assertEqual(len(calls), 3 * len(REGIONS))
+        self.assertEqual(list(data.columns), [region for region, geo in REGIONS])
+        self.assertTrue(data.index.is_monotonic_increasing)
+        # Slices are concatenated in time order, each with one column per region. Adjacent slices share their boundary day
+        expected = []
+        for start in (self.start_time, self.start_time + timedelta(days=180), self.start_time + timedelta(days=360)):
+            dates = pd.date_range(start, min(start + timedelta(days=180), self.end_time), freq='D')
+            expected.append(pd.DataFrame({region: synthetic_interest('Bitcoin', geo, dates) for region, geo in REGIONS},
+                                         index=dates, columns=[region for region, geo in REGIONS]))
+        expected = pd.concat(expected).astype(np.float64)
+        self.assertTrue((data.index == expected.index).all())
+        self.assertTrue(np.array_equal(data.values, expected.values))
+
+        sequential_factory, calls = stub_factory()
+        self.assertTrue(data.equals(self.trends(sequential_factory, max_workers=1).get_training_data('Bitcoin')))
+
+    def test_cache_hits(self):
+        factory, calls = stub_factory()
+        first = self.trends(factory, cache_directory=self.cache_directory).get_training_data('Bitcoin')
+        self.assertEqual(len(calls), 3 * len(REGIONS))
+        second = self.trends(factory, cache_directory=self.cache_directory).get_training_data('Bitcoin')
+        self.assertEqual(len(calls), 3 * len(REGIONS)) # Served entirely from the cache
+        self.assertTrue(np.allclose(first.values, second.values))
+        self.assertTrue((first.index == second.index).all())
+        self.assertEqual(list(first.columns), list(second.columns))
+
+        # Other topics aren't served from the cache
+        self.trends(factory, cache_directory=self.cache_directory).get_training_data('Ethereum')
+        self.assertEqual(len(calls), 6 * len(REGIONS))
+
+    def test_shared_rate_limit(self):
+        rate, latency = 20, 0.1
+        factory, calls = stub_factory(latency)
+        start = time.monotonic()
+        self.trends(factory, rate_limiter=TokenBucket(rate=rate), max_workers=4).get_training_data('Bitcoin')
+        elapsed = time.monotonic() - start
+
+        # Regions are requested concurrently, faster than one request at a time
+        self.assertLess(elapsed, 0.75 * len(calls) * latency)
+        # but all requests, whichever thread made them, are paced by the one token bucket
+        arrivals = np.sort([arrival for arrival, topic, geo, timeframe in calls])
+        self.assertGreaterEqual(np.diff(arrivals).min(), 0.8 / rate)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+"""
+Runs Reddit_Scanner.get_raw_comments against a fake praw client and checks that every comment is collected in listing
+order while the worker pool stays within its limits
+Run from the repository root: python -m pytest tests
+"""
+import threading
+import time
+import unittest
+from datetime import datetime
+
+from Preprocessing.reddit import Reddit_Scanner
+
+
+class FakeComment:
+    def __init__(self, post, index):
+        self.id = '{}_c{}'.format(post.id, index)
+        self.body = 'comment {} on {} about bitcoin'.format(index, post.id)
+        self.created_utc = post.created_utc + 60 * index
+        self.score = index
+        self.parent_id = post.id if index == 0 else '{}_c{}'.format(post.id, index - 1)
+
+
+class FakeCommentForest:
+    """
+    Stands in for praw's CommentForest. Expanding the tree takes a little while, as the API call would, and the number
+    of expansions running at once is tracked
+    """
+    def __init__(self, post, count, tracker):
+        self.post = post
+        self.comments = [FakeComment(post, index) for index in range(count)]
+        self.tracker = tracker
+
+    def replace_more(self, limit=None):
+        self.tracker.enter()
+        time.sleep(0.01)
+        self.tracker.exit()
+
+    def list(self):
+        return self.comments
+
+
+class FakePost:
+    def __init__(self, index, tracker):
+        self.id = 'p{}'.format(index)
+        self.created_utc = 1500000000 + 3600 * index
+        self.score = index * 10
+        self.comments = FakeCommentForest(self, index % 5, tracker) # Includes posts without comments
+
+
+class Tracker:
+    """
+    Counts concurrent comment expansions and posts taken from the listing but not yet expanded
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active = self.max_active = 0
+        self.listed = self.expanded = self.max_outstanding = 0
+
+    def enter(self):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+
+    def exit(self):
+        with self.lock:
+            self.active -= 1
+            self.expanded += 1
+
+    def list(self):
+        with self.lock:
+            self.listed += 1
+            self.max_outstanding = max(self.max_outstanding, self.listed - self.expanded)
+
+
+class FakeSubreddit:
+    def __init__(self, posts, tracker):
+        self.posts = posts
+        self.tracker = tracker
+
+    def hot(self, limit=None):
+        for post in self.posts[:limit]:
+            self.tracker.list()
+            yield post
+
+
+class FakeReddit:
+    """
+    Stands in for praw.Reddit, serving one subreddit of :posts: posts
+    """
+    def __init__(self, posts):
+        self.tracker = Tracker()
+        self.posts = [FakePost(index, self.tracker) for index in range(posts)]
+        self.requested = []
+
+    def subreddit(self, name):
+        self.requested.append(name)
+        return FakeSubreddit(self.posts, self.tracker)
+
+
+class GetRawCommentsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.scanner = Reddit_Scanner(60, datetime(2017, 7, 1), datetime(2017, 8, 1))
+        self.scanner.reddit = FakeReddit(posts=120)
+
+    def test_collects_every_comment_in_order(self):
+        comments = self.scanner.get_raw_comments('Bitcoin', limit=100, max_workers=4)
+        self.assertEqual(self.scanner.reddit.requested, ['Bitcoin'])
+
+        expected = [comment for post in self.scanner.reddit.posts[:100] for comment in post.comments.list()]
+        self.assertEqual(list(comments['Comment_ID']), [comment.id for comment in expected])
+        self.assertEqual(list(comments['Comment_Text']), [comment.body for comment in expected])
+        self.assertEqual(list(comments['Replying_to_ID']), [comment.parent_id for comment in expected])
+        self.assertEqual(list(comments['Post_ID']), [comment.id.split('_')[0] for comment in expected])
+        self.assertTrue((comments['Sentiment_Score'] == 0.0).all())
+
+    def test_worker_pool_is_bounded(self):
+        max_workers = 4
+        self.scanner.get_raw_comments('Bitcoin', limit=120, max_workers=max_workers)
+        tracker = self.scanner.reddit.tracker
+        self.assertEqual(tracker.expanded, 120)
+        self.assertGreater(tracker.max_active, 1) # Posts are fetched concurrently
+        self.assertLessEqual(tracker.max_active, max_workers)
+        self.assertLessEqual(tracker.max_outstanding, 2 * max_workers) # The listing isn't read far ahead of the workers
+
+    def test_no_posts(self):
+        self.scanner.reddit = FakeReddit(posts=0)
+        comments = self.scanner.get_raw_comments('Bitcoin')
+        self.assertEqual(len(comments), 0)
+        self.assertIn('Comment_Text', comments.columns)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+"""
+Records a processor.historical_download run against a local fake exchange, including one with a warm candle store, then
+replays the archive with the exchange shut down and checks the output is identical
+Run from the repository root: python -m pytest tests
+"""
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from datetime import datetime
+from unittest import mock
+
+from Classifier.data_processing import SOURCE_TYPES, processor
+from Preprocessing.candle_store import CandleStore
+from Preprocessing.gdax import GDAX
+from Preprocessing.kraken import Kraken
+from Preprocessing.replay import Replay
+from test_scheduler import FakeExchange
+
+START_TIME = datetime(2017, 3, 1)
+END_TIME = datetime(2017, 3, 2)
+SOURCES = [('Ethusd', 'gdax', 'ETH-USD'), ('Btcusd', 'kraken', 'XXBTZUSD')]
+
+
+def local_sources(url):
+    """
+    SOURCE_TYPES entries for GDAX and Kraken pointed at the fake exchange at :url:
+    """
+    class LocalGDAX(GDAX):
+        @classmethod
+        def create(cls, interval, start_time, end_time, resources):
+            return cls(interval, start_time, end_time, rate_limiter=resources['rate_limiters']['gdax'],
+                       api_url=url, store=resources['store'], transport=resources['transport'])
+
+    class LocalKraken(Kraken):
+        @classmethod
+        def create(cls, interval, start_time, end_time, resources):
+            return cls(interval, start_time, end_time, rate_limiter=resources['rate_limiters']['kraken'],
+                       api_url=url, store=resources['store'], transport=resources['transport'])
+
+    return {'gdax': LocalGDAX, 'kraken': LocalKraken}
+
+
+class ReplayTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.archive = os.path.join(self.directory, 'replay.zip')
+        self.server = FakeExchange(throttle=False)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.sources = mock.patch.dict(SOURCE_TYPES, local_sources(self.server.url))
+        self.sources.start()
+
+    def tearDown(self):
+        self.sources.stop()
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.directory)
+
+    def download(self, **options):
+        return processor.historical_download(START_TIME, END_TIME, 5, sources=SOURCES, max_workers=2, **options)
+
+    def test_record_with_warm_store_then_replay_offline(self):
+        store = CandleStore(os.path.join(self.directory, 'candles'))
+        live = self.download(store=store)
+        requests = len(self.server.requests)
+        self.assertGreater(requests, 2)
+
+        # The store already holds the whole period, but the recording run still downloads and records all of it
+        with Replay(self.archive, record=True) as replay:
+            recorded = self.download(store=store, replay=replay)
+        self.assertEqual(len(self.server.requests), 2 * requests)
+        self.assertTrue(recorded.equals(live))
+
+        self.server.shutdown()
+        self.server.server_close()
+        for replay_store in (None, CandleStore(os.path.join(self.directory, 'empty')), store):
+            with Replay(self.archive) as replay:
+                self.assertTrue(self.download(store=replay_store, replay=replay).equals(live))
+        self.assertEqual(len(self.server.requests), 2 * requests)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,163 @@
+"""
+Runs concurrent GDAX and Kraken downloads through DownloadScheduler against a local fake exchange server, which
+throttles the first attempt of every request, and checks retries, candle ordering and rate limiter pacing
+Run from the repository root: python -m pytest tests
+"""
+import json
+import threading
+import time
+import unittest
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs, urlparse
+import numpy as np
+
+from Preprocessing.gdax import GDAX
+from Preprocessing.kraken import Kraken
+from Preprocessing.rate_limit import TokenBucket
+from Preprocessing.scheduler import DownloadScheduler
+from Preprocessing.transport import HTTPTransport, TransportError
+
+START_TIME = datetime(2017, 3, 1)
+END_TIME = datetime(2017, 3, 3)
+EPOCH = datetime(1970, 1, 1)
+TRADES_PER_RESPONSE = 500
+TRADE_SPACING = 60 # Seconds between fake Kraken trades
+
+
+def pair_price(pair):
+    return float(sum(map(ord, pair)))
+
+
+class FakeExchangeHandler(BaseHTTPRequestHandler):
+    """
+    Serves GDAX candles and Kraken trades. The first attempt of each distinct request is throttled, GDAX with a 429 and
+    Kraken with a rate limit error in a 200 response as the real APIs do, unless the server's throttle is off. Unknown
+    pairs get a 404
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        first_attempt = self.server.log(url.path, self.path)
+        if url.path.endswith('/0/public/Trades'):
+            if first_attempt:
+                return self.send(200, {'error': ['EAPI:Rate limit exceeded'], 'result': {}})
+            since = int(query['since']) // 10**9
+            price = pair_price(query['pair'])
+            trades = [[str(price + i % 7), '0.5', since + i * TRADE_SPACING, 'b', 'l', ''] for i in range(TRADES_PER_RESPONSE)]
+            return self.send(200, {'error': [], 'result': {query['pair']: trades, 'last': str((since + TRADES_PER_RESPONSE * TRADE_SPACING) * 10**9)}})
+
+        pair = url.path.split('/')[2]
+        if pair == 'BAD-PAIR':
+            return self.send(404, {'message': 'NotFound'})
+        if first_attempt:
+            return self.send(429, {'message': 'Slow rate limit exceeded'}, {'Retry-After': '0'})
+        start = int((datetime.strptime(query['start'], '%Y-%m-%dT%H:%M:%S') - EPOCH).total_seconds())
+        end = int((datetime.strptime(query['end'], '%Y-%m-%dT%H:%M:%S') - EPOCH).total_seconds())
+        granularity = int(query['granularity'])
+        price = pair_price(pair)
+        candles = [[time, price - 1, price + 1, price, price, 10] for time in range(start, end, granularity)]
+        self.send(200, candles[::-1]) # GDAX returns the newest candle first
+
+    def send(self, code, data, headers={}):
+        body = json.dumps(data).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeExchange(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, throttle=True):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), FakeExchangeHandler)
+        self.throttle = throttle
+        self.lock = threading.Lock()
+        self.requests = [] # (arrival time, path)
+        self.seen = set()
+
+    def log(self, path, request):
+        """
+        Records a request. Returns True if it is the first attempt at this request and should be throttled
+        """
+        with self.lock:
+            self.requests.append((time.monotonic(), path))
+            first = request not in self.seen
+            self.seen.add(request)
+            return first and self.throttle
+
+    @property
+    def url(self):
+        return 'http://{}:{}'.format(*self.server_address[:2])
+
+
+class DownloadSchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeExchange()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.transport = HTTPTransport(backoff=0.01, max_backoff=0.05)
+        self.rate_limiters = {'gdax': TokenBucket(rate=20), 'kraken': TokenBucket(rate=10)}
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def source(self, source_type):
+        return source_type(5, START_TIME, END_TIME, rate_limiter=self.rate_limiters[source_type.source_name],
+                           api_url=self.server.url, transport=self.transport)
+
+    def download(self, jobs):
+        scheduler = DownloadScheduler(max_workers=4)
+        for name, source_type, topic in jobs:
+            scheduler.add(name, self.source(source_type), topic)
+        return scheduler.run()
+
+    def test_concurrent_downloads(self):
+        jobs = [('Ethusd_gdax', GDAX, 'ETH-USD'), ('Btcusd_gdax', GDAX, 'BTC-USD'),
+                ('Ethusd_kraken', Kraken, 'XETHZUSD'), ('Btcusd_kraken', Kraken, 'XXBTZUSD')]
+        results = self.download(jobs)
+        self.assertEqual(sorted(results), sorted(name for name, source_type, topic in jobs))
+
+        # Every request was throttled once and retried
+        metrics = self.transport.report()[urlparse(self.server.url).netloc]
+        self.assertEqual(metrics['throttled'] * 2, metrics['requests'])
+        self.assertEqual(metrics['requests'], len(self.server.requests))
+
+        # GDAX slices are stitched together in time order, one candle per interval, and each pair has its own data
+        expected = np.arange((START_TIME - EPOCH).total_seconds(), (END_TIME - EPOCH).total_seconds(), 300, dtype=np.int64)
+        for name, topic in (('Ethusd_gdax', 'ETH-USD'), ('Btcusd_gdax', 'BTC-USD')):
+            self.assertTrue(np.array_equal(results[name].index.values.astype(np.int64), expected))
+            self.assertTrue((results[name]['close'] == pair_price(topic)).all())
+
+        # Kraken trades are aggregated into increasing candles covering the period
+        for name in ('Ethusd_kraken', 'Btcusd_kraken'):
+            times = results[name].index
+            self.assertTrue(times.is_monotonic_increasing and times.is_unique)
+            self.assertLessEqual(times[0], START_TIME)
+            self.assertGreaterEqual(times[-1], END_TIME)
+
+        # Each exchange's requests, including retries, are paced by its shared token bucket
+        for exchange, rate in (('candles', 20), ('Trades', 10)):
+            arrivals = np.array([time for time, path in self.server.requests if path.endswith(exchange)])
+            self.assertGreater(len(arrivals), 4)
+            self.assertGreaterEqual(np.diff(np.sort(arrivals)).min(), 0.8 / rate)
+            self.assertGreaterEqual(arrivals.max() - arrivals.min(), 0.9 * (len(arrivals) - 1) / rate)
+
+    def test_failed_download_is_raised(self):
+        with self.assertRaises(TransportError):
+            self.download([('Ethusd_gdax', GDAX, 'ETH-USD'), ('Bad_gdax', GDAX, 'BAD-PAIR')])
+
+
+if __name__ == '__main__':
+    unittest.main()
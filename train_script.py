@@ -1,51 +1,59 @@
 """
 Run training script
 """
+import os
+import shutil
+import numpy as np
+from datetime import datetime
 
 import config
-from data_processing import processor
-from prediction_model import Neural_Net
-
-# Set parameters from command line arguments
-redownload = redownload
-
-# Download datasets
-if redownload or not os.path.isfile(pickle_filepath):
-    train_data = processor.historical_download(config, start_time, end_time)
-    valid_data = processor.historical_download(config, start_time, end_time)
-    test_data = processor.historical_download(config, start_time, end_time)
-
-    # Split train, valid, and test data and targets and convert to numpy arrays
-    train_data, train_targets = processor.generate_x_y(training_data)
-    valid_data, valid_targets = processor.generate_x_y(valid_data)
-    test_data, test_targets = processor.generate_x_y(test_data)
-
-    # Save data in pickle format
-    with open('training.pickle', 'a') as f:
-        pickle.dump((train_data, train_targets), f)
-
-    with open('valid.pickle', 'a') as f:
-        pickle.dump((valid_data, valid_targets), f)
-
-    with open('test.pickle', 'a') as f:
-        pickle.dump((test_data, test_targets), f)
-
-else:
-    with open('training.pickle', 'rb') as f:
-        train_data, train_targets = pickle.load(f)
-
-    with open('valid.pickle', 'rb') as f:
-        valid_data, valid_targets = pickle.load(f)
-
-    with open('test.pickle', 'rb') as f:
-        test_data, test_targets = pickle.load(f)
+from Classifier.chunked import build_dataset
+from Classifier.dataset import Dataset, read_meta
+from Classifier.prediction_model import Neural_Net
+from Preprocessing.candle_store import CandleStore
+from Preprocessing.profiling import profiler
+
+interval = 5 # Candle interval in minutes
+periods = {
+    'train': (datetime(2017, 1, 1), datetime(2017, 9, 1)),
+    'valid': (datetime(2017, 9, 1), datetime(2017, 11, 1)),
+    'test': (datetime(2017, 11, 1), datetime(2018, 1, 1)),
+}
+redownload = False
+dataset_directory = './datasets'
+learning_rate = 0.001 # See sweep_script.py for tuning
+batch_size = 64
+epochs = 20
+
+profiler.configure(cprofile=config.PROFILE_CPROFILE, memory=config.PROFILE_MEMORY)
+profiler.report_at_exit(os.path.join(config.PROFILE_DIRECTORY, 'train_profile.json'))
+
+# Download datasets a block at a time, writing each block straight to disk. Candles already in the local store are not
+# downloaded again, and datasets already written are memory-mapped instead of being rebuilt
+store = CandleStore('./candles')
+datasets = {}
+for name, (start_time, end_time) in periods.items():
+    path = os.path.join(dataset_directory, name)
+    if redownload and os.path.isdir(path):
+        shutil.rmtree(path)
+    if read_meta(path) is None:
+        datasets[name] = build_dataset(path, start_time, end_time, interval, store=store)
+    else:
+        datasets[name] = Dataset(path)
+train_data, valid_data = datasets['train'], datasets['valid']
 
 # Initialize Neural Net
-learning_rate = #
-batch_size = #
-network = Neural_Net(learning_rate, batch_size)
-
-# Start training
-network.train()
-
-# Print training logs and charts
+network = Neural_Net(len(train_data.columns), config.MODEL_ARCHITECTURE, learning_rate=learning_rate)
+
+# Scale with the training set's statistics, which were accumulated while the dataset was written, and save them with
+# the weights so run_script.py applies the same scaling
+feature_scaler, target_scaler = train_data.scaler, train_data.target_scaler
+network.save_scalers(config.WEIGHTS_FILE, feature_scaler, target_scaler)
+
+# Start training. Training batches are read from the memory-mapped dataset a chunk at a time and scaled in place
+valid_inputs = np.array(valid_data.data)
+feature_scaler.transform(valid_inputs, out=valid_inputs)
+valid_labels = target_scaler.transform(np.array(valid_data.targets))
+network.train(train_data.batch_generator(batch_size, scaler=feature_scaler), None, train_data.target_mean, train_data.target_std,
+              valid_inputs, valid_labels, epochs, batch_size=batch_size, steps_per_epoch=train_data.steps(batch_size),
+              weights_file=config.WEIGHTS_FILE)